@@ -0,0 +1,77 @@
+from asgiref.sync import sync_to_async
+
+from django.core.exceptions import ValidationError
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts.models import CustomUser as User
+from accounts.tokens import ROLE_FIELDS, ROLE_VERSION_CLAIM, aget_role, get_role
+
+
+def get_lazy_user(user_id, role):
+    """
+        A CustomUser built from the role claims without a query. The other
+        fields are deferred: each one is loaded from the database on first
+        access, like the fields left out of QuerySet.only().
+    """
+    values = {'id': user_id, **{field: role[field] for field in ROLE_FIELDS}}
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(
+        router.db_for_read(User),
+        field_names,
+        [values[field_name] for field_name in field_names],
+    )
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+        JWTAuthentication without the user query. The role claims of the
+        token (accounts.tokens) are checked against the cached role of the
+        user, which revokes the tokens issued before a password or permission
+        change, and request.user is a lazy CustomUser built from them.
+
+        Tokens issued without the role claims go through JWTAuthentication.
+    """
+
+    def get_user(self, validated_token):
+        if ROLE_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        user_id = self.get_user_id(validated_token)
+        return self.get_user_from_role(validated_token, user_id, get_role(user_id))
+
+    async def aauthenticate(self, request):
+        """ authenticate() for the async views, see api.mixins.helpers.AsyncAPIViewMixin """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if ROLE_VERSION_CLAIM not in validated_token:
+            return await sync_to_async(super().get_user)(validated_token)
+        user_id = self.get_user_id(validated_token)
+        return self.get_user_from_role(validated_token, user_id, await aget_role(user_id))
+
+    def get_user_id(self, validated_token):
+        try:
+            # the claim is a string, see RefreshToken.for_user
+            return User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, ValidationError):
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def get_user_from_role(self, validated_token, user_id, role):
+        if role is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if role[ROLE_VERSION_CLAIM] != validated_token[ROLE_VERSION_CLAIM]:
+            raise AuthenticationFailed(_('Token is no longer valid'), code='token_not_valid')
+        if not role['is_active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return get_lazy_user(user_id, role)
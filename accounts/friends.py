@@ -0,0 +1,125 @@
+"""
+    Friend graph operations on CustomUser.friends.
+
+    The relation isn't symmetrical: the friends of a user are the
+    to_customuser of the through rows whose from_customuser is the user.
+
+    Mutual friends and suggestions are cached. The keys embed a version
+    token per user that changes whenever the friends of the user change, so
+    the entries of every pair involving the user are dropped at once.
+"""
+from collections import namedtuple
+from functools import partial
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+
+from accounts.models import CustomUser as User
+
+
+Friendship = User.friends.through
+FriendshipChange = namedtuple('FriendshipChange', ['changed', 'unchanged', 'not_found'])
+Suggestion = namedtuple('Suggestion', ['user_id', 'mutual_friends'])
+
+
+def get_cache():
+    return caches[settings.FRIENDS_CACHE]
+
+
+def version_key(user_id):
+    return f'friends-version:{user_id}'
+
+
+def get_versions(user_ids):
+    cache = get_cache()
+    keys = [version_key(user_id) for user_id in user_ids]
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate_friends(user_ids):
+    """ Drops the cached mutual friends and suggestions of the users """
+    get_cache().set_many({version_key(user_id): uuid4().hex for user_id in user_ids}, None)
+
+
+def invalidate_on_commit(user_ids):
+    invalidate_friends(user_ids)
+    transaction.on_commit(partial(invalidate_friends, user_ids))
+
+
+def friend_ids(user_id):
+    return Friendship.objects.filter(from_customuser=user_id).values('to_customuser')
+
+
+def change_friends(user, user_ids, add):
+    """
+        Adds or removes friends in bulk with one query on the users and one
+        INSERT or DELETE on the through table. The user itself is ignored.
+    """
+    users = User.objects.filter(pk__in=user_ids).exclude(pk=user.pk).annotate(
+        is_friend = Exists(Friendship.objects.filter(from_customuser=user, to_customuser=OuterRef('pk'))),
+    )
+    found, changed, unchanged = {user.pk}, [], []
+    for pk, is_friend in users.values_list('pk', 'is_friend'):
+        found.add(pk)
+        (unchanged if is_friend == add else changed).append(pk)
+    not_found = [pk for pk in dict.fromkeys(user_ids) if pk not in found]
+
+    if changed:
+        if add:
+            Friendship.objects.bulk_create(
+                [Friendship(from_customuser_id=user.pk, to_customuser_id=pk) for pk in changed],
+                ignore_conflicts = True,
+            )
+        else:
+            Friendship.objects.filter(from_customuser=user, to_customuser__in=changed).delete()
+        invalidate_on_commit([user.pk, *changed])
+    return FriendshipChange(sorted(changed), sorted(unchanged), not_found)
+
+
+def get_mutual_friend_ids(user_id, other_id):
+    """ The ids of the users who are friends of both, computed with an SQL INTERSECT """
+    first, second = sorted([user_id, other_id])
+    versions = get_versions([first, second])
+    key = f'mutual-friends:{first}:{second}:{":".join(versions)}'
+    cache = get_cache()
+    ids = cache.get(key)
+    if ids is None:
+        ids = sorted(
+            friend_ids(first).intersection(friend_ids(second)).values_list('to_customuser', flat=True)
+        )
+        cache.set(key, ids, settings.FRIENDS_CACHE_TIMEOUT)
+    return ids
+
+
+def get_friend_suggestions(user_id, limit):
+    """
+        Friends of friends who aren't friends of the user yet, ranked by the
+        number of friends of the user listing them. Cached until the friends
+        of the user change, or for FRIENDS_CACHE_TIMEOUT when the friends of a
+        friend change.
+    """
+    version, = get_versions([user_id])
+    key = f'friend-suggestions:{user_id}:{limit}:{version}'
+    cache = get_cache()
+    suggestions = cache.get(key)
+    if suggestions is None:
+        rows = (
+            Friendship.objects.filter(from_customuser__in=friend_ids(user_id))
+            .exclude(to_customuser=user_id)
+            .exclude(to_customuser__in=friend_ids(user_id))
+            .values('to_customuser')
+            .annotate(mutual_friends=Count('from_customuser'))
+            .order_by('-mutual_friends', 'to_customuser')
+            .values_list('to_customuser', 'mutual_friends')[:limit]
+        )
+        suggestions = [tuple(row) for row in rows]
+        cache.set(key, suggestions, settings.FRIENDS_CACHE_TIMEOUT)
+    return [Suggestion(*row) for row in suggestions]
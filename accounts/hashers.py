@@ -0,0 +1,76 @@
+"""
+    Password hashing with a tunable cost and a bounded concurrency.
+
+    PBKDF2PasswordHasher runs PASSWORD_HASH_ITERATIONS iterations, Django's
+    default when unset. Changing the setting rehashes the stored passwords
+    on the next successful login, like any Django hasher upgrade.
+
+    Hashes are computed by a pool of PASSWORD_HASHING_WORKERS threads (the
+    OpenSSL PBKDF2 releases the GIL). At most PASSWORD_HASHING_BACKLOG more
+    hashes wait for a worker, beyond that HashingUnavailable (503) is raised
+    right away instead of queueing, so a login storm can't take every CPU
+    of the server.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many password checks in progress, try again later.'
+    default_code = 'hashing_unavailable'
+
+
+class HashingPool:
+
+    def __init__(self, workers, backlog):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        self.slots = BoundedSemaphore(workers + backlog)
+
+    def run(self, function, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingUnavailable()
+        try:
+            return self.executor.submit(function, *args).result()
+        finally:
+            self.slots.release()
+
+
+_pool = None
+_pool_lock = Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = settings.PASSWORD_HASHING_WORKERS or os.cpu_count() or 1
+            _pool = HashingPool(workers, settings.PASSWORD_HASHING_BACKLOG)
+        return _pool
+
+
+@receiver(setting_changed)
+def reset_hashing_pool(setting, **kwargs):
+    global _pool
+    if setting in ('PASSWORD_HASHING_WORKERS', 'PASSWORD_HASHING_BACKLOG'):
+        with _pool_lock:
+            _pool = None
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or hashers.PBKDF2PasswordHasher.iterations
+
+    def encode(self, password, salt, iterations=None):
+        return get_hashing_pool().run(super().encode, password, salt, iterations)
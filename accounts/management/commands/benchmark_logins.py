@@ -0,0 +1,100 @@
+import os
+from threading import Thread
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from accounts.models import CustomUser as User
+from accounts.tokens import TokenObtainPairSerializer, TokenRefreshSerializer
+
+
+BENCHMARK_USERNAME = 'benchmark-login'
+BENCHMARK_PASSWORD = 'benchmark-login-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the logins per second (and per core) of api/token/login/ for '
+        'several PBKDF2 iteration counts, and the refreshes per second of '
+        'api/token/refresh/ for comparison. Logins rejected by the hashing pool '
+        '(PASSWORD_HASHING_BACKLOG) are counted as failures.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, nargs='+',
+            help='PBKDF2 iteration counts to compare, the configured one by default.',
+        )
+        parser.add_argument('--logins', type=int, default=200, help='Logins per iteration count.')
+        parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='Concurrent clients.')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        cores = min(threads, settings.PASSWORD_HASHING_WORKERS or os.cpu_count() or 1)
+        configured = settings.PASSWORD_HASH_ITERATIONS
+        user = User.objects.create(username=BENCHMARK_USERNAME)
+        try:
+            for iterations in options['iterations'] or [configured or hashers.PBKDF2PasswordHasher.iterations]:
+                settings.PASSWORD_HASH_ITERATIONS = iterations
+                user.set_password(BENCHMARK_PASSWORD)
+                user.save()
+                rate, failures = self.run_clients(self.login, options['logins'], threads)
+                self.stdout.write(
+                    f'{iterations} iterations: {rate:.1f} logins/s, {rate / cores:.1f} logins/s per core'
+                    + (f', {failures} rejected' if failures else '')
+                )
+            # every client logs in once before the clock starts
+            sessions = [self.login(None) for _ in range(threads)]
+            rate, failures = self.run_clients(self.refresh, options['logins'], threads, sessions)
+            self.stdout.write(f'refresh: {rate:.1f} refreshes/s, {rate / cores:.1f} refreshes/s per core')
+        finally:
+            settings.PASSWORD_HASH_ITERATIONS = configured
+            OutstandingToken.objects.filter(user=user).delete()
+            user.delete()
+
+    def run_clients(self, client, count, threads, states=None):
+        """
+            Runs count calls of client split over the threads, returns (calls per
+            second, failures). Each call gets the result of the previous call of
+            its thread, starting from states[thread].
+        """
+        failures = []
+        states = states if states is not None else [None] * threads
+
+        def run(calls, state):
+            try:
+                for _ in range(calls):
+                    try:
+                        state = client(state)
+                    except APIException:
+                        failures.append(1)
+            finally:
+                connection.close()
+
+        workers = [
+            Thread(target=run, args=(count // threads + (index < count % threads), states[index]))
+            for index in range(threads)
+        ]
+        start = perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return count / (perf_counter() - start), len(failures)
+
+    def login(self, state):
+        serializer = TokenObtainPairSerializer(data={'username': BENCHMARK_USERNAME, 'password': BENCHMARK_PASSWORD})
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def refresh(self, state):
+        """ Rotated refresh tokens are single use, every client refreshes the last one it got """
+        serializer = TokenRefreshSerializer(data={'refresh': state['refresh']})
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
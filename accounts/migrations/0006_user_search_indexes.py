@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+# Fields matched by the user directory search (accounts.search) when this
+# migration was written
+SEARCH_FIELDS = ('username', 'first_name', 'last_name', 'email')
+
+# PostgreSQL only uses an index for LIKE 'prefix%' with a pattern operator
+# class, the other backends get a plain functional index
+CREATE_POSTGRESQL_INDEX = (
+    'CREATE INDEX "accounts_user_{field}_lower" ON "accounts_customuser" '
+    '((LOWER("{field}")) text_pattern_ops)'
+)
+CREATE_INDEX = 'CREATE INDEX "accounts_user_{field}_lower" ON "accounts_customuser" ((LOWER("{field}")))'
+DROP_INDEX = 'DROP INDEX "accounts_user_{field}_lower"'
+
+
+def add_search_indexes(apps, schema_editor):
+    sql = CREATE_POSTGRESQL_INDEX if schema_editor.connection.vendor == 'postgresql' else CREATE_INDEX
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(sql.format(field=field))
+
+
+def remove_search_indexes(apps, schema_editor):
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(DROP_INDEX.format(field=field))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_customuser_friends'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Lower
+
+
+# Fields matched by the user directory search, each one backed by an index
+# on its lowercased value (migration 0006)
+SEARCH_FIELDS = ('username', 'first_name', 'last_name', 'email')
+
+
+def search_users(queryset, query, limit=None):
+    """
+        Returns the users whose username, first name, last name or email starts
+        with the query, case insensitively. Exact username matches rank first,
+        then username prefixes, then names and finally emails. 'limit' is
+        clamped to 1..USER_SEARCH_MAX_RESULTS.
+
+        Prefix matches on lower(<field>) are answered by the indexes of
+        migration 0006, unlike the __icontains filters that scan the table.
+    """
+    term = query.strip().lower()
+    limit = max(1, min(limit or settings.USER_SEARCH_MAX_RESULTS, settings.USER_SEARCH_MAX_RESULTS))
+    lowered = {f'{field}_lower': Lower(field) for field in SEARCH_FIELDS}
+
+    condition = Q()
+    for name in lowered:
+        condition |= Q(**{f'{name}__startswith': term})
+
+    return queryset.annotate(**lowered).filter(condition).annotate(
+        rank = Case(
+            When(username_lower=term, then=Value(4)),
+            When(username_lower__startswith=term, then=Value(3)),
+            When(Q(first_name_lower__startswith=term) | Q(last_name_lower__startswith=term), then=Value(2)),
+            default = Value(1),
+            output_field = IntegerField(),
+        ),
+    ).order_by('-rank', 'username_lower', 'pk')[:limit]
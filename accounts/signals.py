@@ -0,0 +1,23 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.friends import Friendship, invalidate_on_commit
+from accounts.models import CustomUser as User
+from accounts.tokens import invalidate_role_on_commit
+
+
+@receiver(m2m_changed, sender=Friendship)
+def invalidate_friend_graph(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        invalidate_on_commit([instance.pk, *pk_set])
+    elif action == 'pre_clear':
+        # reverse: the users who list the instance as a friend
+        rows = Friendship.objects.filter(**{'to_customuser' if reverse else 'from_customuser': instance})
+        user_ids = rows.values_list('from_customuser' if reverse else 'to_customuser', flat=True)
+        invalidate_on_commit([instance.pk, *user_ids])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_role(sender, instance, **kwargs):
+    invalidate_role_on_commit(instance.pk)
@@ -1,6 +1,16 @@
-from django.test import TestCase
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+
+from accounts.authentication import StatelessJWTAuthentication
+from accounts.hashers import HashingUnavailable, get_hashing_pool
 from accounts.models import CustomUser as User
+from accounts.tokens import RefreshToken
 
 class CreateUserMixin:
 
@@ -35,3 +45,101 @@ class TestUser(CreateUserMixin, TestCase):
     def test_user_friends(self):
         self.assertTrue(User.objects.get(username=self.user.username).friends.count() > 0)
         self.assertFalse(User.objects.get(username=self.user.username).friends.filter(pk=self.user.pk).exists())
+
+
+class TestStatelessJWTAuthentication(CreateUserMixin, TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = self.create_user()
+        self.refresh = RefreshToken.for_user(self.user)
+
+    def authenticate(self, token=None):
+        token = token if token is not None else self.refresh.access_token
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'JWT {token}')
+        return StatelessJWTAuthentication().authenticate(request)[0]
+
+    def test_authenticate_without_queries(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertIsInstance(user, User)
+        self.assertEqual((user.pk, user.username, user.is_staff), (self.user.pk, 'test-user', False))
+        # the other fields are loaded on access
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)
+
+    def test_role_change_revokes_tokens(self):
+        token = self.refresh.access_token
+        self.authenticate(token)
+        self.user.is_staff = True
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        # a refreshed access token carries the new role
+        self.assertTrue(self.authenticate(self.refresh.access_token).is_staff)
+
+    def test_password_change_revokes_tokens(self):
+        token = self.refresh.access_token
+        self.user.set_password('new$psswd')
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_deleted_user(self):
+        token = self.refresh.access_token
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+
+@override_settings(PASSWORD_HASHERS=['accounts.hashers.PBKDF2PasswordHasher'], PASSWORD_HASH_ITERATIONS=1000)
+class TestPasswordHashing(CreateUserMixin, TestCase):
+
+    def test_iterations(self):
+        self.assertEqual(make_password('test$psswd').split('$')[1], '1000')
+
+    def test_iterations_change_rehashes_on_login(self):
+        user = self.create_user()
+        user.set_password('test$psswd')
+        user.save()
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertTrue(user.check_password('test$psswd'))
+        self.assertEqual(User.objects.get(pk=user.pk).password.split('$')[1], '2000')
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_BACKLOG=0)
+    def test_full_pool(self):
+        pool = get_hashing_pool()
+        pool.slots.acquire()
+        try:
+            with self.assertRaises(HashingUnavailable):
+                make_password('test$psswd')
+        finally:
+            pool.slots.release()
+        self.assertTrue(make_password('test$psswd'))
+
+
+class TestTokenRefresh(CreateUserMixin, TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = self.create_user()
+        self.user.set_password('test$psswd')
+        self.user.save()
+        self.refresh = str(RefreshToken.for_user(self.user))
+
+    def post_refresh(self, refresh):
+        return self.client.post(reverse('token_refresh'), {'refresh': refresh})
+
+    def test_refresh_rotates(self):
+        response = self.post_refresh(self.refresh)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['refresh'], self.refresh)
+        self.assertEqual(self.post_refresh(response.data['refresh']).status_code, status.HTTP_200_OK)
+        # the rotated token is blacklisted
+        self.assertEqual(self.post_refresh(self.refresh).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_revokes_refresh_tokens(self):
+        self.user.set_password('new$psswd')
+        self.user.save()
+        self.assertEqual(self.post_refresh(self.refresh).status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,139 @@
+"""
+    JWT claims describing the role of a user.
+
+    Access tokens carry the username, the is_active, is_staff and
+    is_superuser flags and a role version, an HMAC of those flags and of the
+    password hash. The role version changes whenever one of them changes, so
+    tokens issued before a password or permission change are rejected by
+    accounts.authentication.StatelessJWTAuthentication.
+
+    Refresh tokens carry a password version, an HMAC of the password hash
+    only: a refresh token outlives permission changes, the access tokens it
+    issues get the new role, but not a password change.
+
+    The current role of a user is cached for AUTH_ROLE_CACHE_TIMEOUT seconds
+    and dropped when the user is saved or deleted (accounts.signals). Only
+    the cache of the process saving the user is cleared, the other processes
+    keep accepting the revoked tokens until the timeout unless AUTH_ROLE_CACHE
+    is shared.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.crypto import salted_hmac
+
+from rest_framework_simplejwt import serializers, tokens
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts.models import CustomUser as User
+
+
+ROLE_FIELDS = ('username', 'is_active', 'is_staff', 'is_superuser')
+ROLE_VERSION_CLAIM = 'role_version'
+PASSWORD_VERSION_CLAIM = 'password_version'
+
+
+def get_cache():
+    return caches[settings.AUTH_ROLE_CACHE]
+
+
+def role_key(user_id):
+    return f'user-role:{user_id}'
+
+
+def get_role_version(is_active, is_staff, is_superuser, password):
+    value = f'{is_active}:{is_staff}:{is_superuser}:{password}'
+    return salted_hmac('accounts.tokens.role_version', value).hexdigest()[:16]
+
+
+def get_password_version(password):
+    return salted_hmac('accounts.tokens.password_version', password).hexdigest()[:16]
+
+
+def get_user_role(user):
+    """ The role claims of a user instance """
+    role = {field: getattr(user, field) for field in ROLE_FIELDS}
+    role[ROLE_VERSION_CLAIM] = get_role_version(user.is_active, user.is_staff, user.is_superuser, user.password)
+    role[PASSWORD_VERSION_CLAIM] = get_password_version(user.password)
+    return role
+
+
+def get_role(user_id):
+    """ The current role claims of the user, or None when the user doesn't exist """
+    cache = get_cache()
+    role = cache.get(role_key(user_id))
+    if role is None:
+        row = User.objects.filter(pk=user_id).values(*ROLE_FIELDS, 'password').first()
+        # a missing user is cached as well, as an empty role
+        role = get_user_role(User(**row)) if row is not None else {}
+        cache.set(role_key(user_id), role, settings.AUTH_ROLE_CACHE_TIMEOUT)
+    return role or None
+
+
+async def aget_role(user_id):
+    """ get_role for the async views """
+    cache = get_cache()
+    role = await cache.aget(role_key(user_id))
+    if role is None:
+        row = await User.objects.filter(pk=user_id).values(*ROLE_FIELDS, 'password').afirst()
+        role = get_user_role(User(**row)) if row is not None else {}
+        await cache.aset(role_key(user_id), role, settings.AUTH_ROLE_CACHE_TIMEOUT)
+    return role or None
+
+
+def invalidate_role(user_id):
+    get_cache().delete(role_key(user_id))
+
+
+def invalidate_role_on_commit(user_id):
+    invalidate_role(user_id)
+    transaction.on_commit(partial(invalidate_role, user_id))
+
+
+def set_role_claims(token, role):
+    for claim, value in role.items():
+        token[claim] = value
+
+
+class RefreshToken(tokens.RefreshToken):
+    """ Refresh token whose access tokens carry the current role of the user """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        set_role_claims(token, get_user_role(user))
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        # the role may have changed since the refresh token was issued
+        role = get_role(self[api_settings.USER_ID_CLAIM])
+        if role is not None:
+            set_role_claims(access, role)
+        return access
+
+
+class TokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    """ Rejects the refresh tokens issued before a password change """
+    token_class = RefreshToken
+    default_error_messages = {
+        **serializers.TokenRefreshSerializer.default_error_messages,
+        'password_changed': "The user's password has been changed.",
+    }
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        # tokens issued before the claim existed expire on their own
+        if PASSWORD_VERSION_CLAIM in refresh:
+            role = get_role(refresh[api_settings.USER_ID_CLAIM])
+            if role is None or role[PASSWORD_VERSION_CLAIM] != refresh[PASSWORD_VERSION_CLAIM]:
+                raise AuthenticationFailed(self.error_messages['password_changed'], 'password_changed')
+        return super().validate(attrs)
@@ -0,0 +1,74 @@
+from functools import lru_cache
+from itertools import count
+from threading import Lock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class BaseBroker:
+    """
+        Fan-out layer between the views that create messages and the clients
+        waiting for them (WebSocket connections, long-polling requests...).
+
+        Subscribers register a callback for a chatroom. The callback is called
+        with the serialized message, in the publisher's thread, so it must not
+        block: hand the message over to a queue or an event and return.
+    """
+
+    def subscribe(self, chatroom_id, callback):
+        """ Returns a subscription that must be passed to unsubscribe """
+        raise NotImplementedError('subscribe() must be implemented.')
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError('unsubscribe() must be implemented.')
+
+    def publish(self, chatroom_id, message):
+        raise NotImplementedError('publish() must be implemented.')
+
+    async def apublish(self, chatroom_id, message):
+        """ publish() for the async views, in a worker thread unless overridden """
+        await sync_to_async(self.publish, thread_sensitive=False)(chatroom_id, message)
+
+
+class InMemoryBroker(BaseBroker):
+    """
+        Delivers messages to the subscribers living in the current process.
+        Suitable for a single server process and for the test suite.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counter = count()
+        self.subscribers = {}
+
+    def subscribe(self, chatroom_id, callback):
+        subscription = (int(chatroom_id), next(self.counter))
+        with self.lock:
+            self.subscribers.setdefault(subscription[0], {})[subscription[1]] = callback
+        return subscription
+
+    def unsubscribe(self, subscription):
+        chatroom_id, key = subscription
+        with self.lock:
+            callbacks = self.subscribers.get(chatroom_id, {})
+            callbacks.pop(key, None)
+            if not callbacks:
+                self.subscribers.pop(chatroom_id, None)
+
+    def publish(self, chatroom_id, message):
+        with self.lock:
+            callbacks = list(self.subscribers.get(int(chatroom_id), {}).values())
+        for callback in callbacks:
+            callback(message)
+
+    async def apublish(self, chatroom_id, message):
+        # the callbacks don't block, see BaseBroker
+        self.publish(chatroom_id, message)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """ Returns the broker configured by the CHATROOM_BROKER_BACKEND setting """
+    return import_string(settings.CHATROOM_BROKER_BACKEND)()
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+from django.utils.module_loading import import_string
+
+from api.broadcast import InMemoryBroker
+
+
+LOCAL_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+# Settings naming the caches that must be shared by all the processes, their
+# entries are only invalidated in the cache of the process making the change
+SHARED_CACHE_SETTINGS = (
+    'AUTH_ROLE_CACHE',
+    'CHATROOM_MEMBERSHIP_CACHE',
+    'FRIENDS_CACHE',
+    'RESPONSE_CACHE',
+    'UNREAD_COUNTS_CACHE',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    return [
+        Warning(
+            f'{name} uses a cache local to each process.',
+            hint=(
+                'Invalidations made by one process are not seen by the others until the entries '
+                'expire. Set CACHE_URL to a shared cache (Redis, Memcached) when running more '
+                'than one process.'
+            ),
+            obj=getattr(settings, name),
+            id='api.W001',
+        )
+        for name in SHARED_CACHE_SETTINGS
+        if settings.CACHES[getattr(settings, name)]['BACKEND'] == LOCAL_CACHE_BACKEND
+    ]
+
+
+@register(deploy=True)
+def check_shared_broker(app_configs, **kwargs):
+    if not issubclass(import_string(settings.CHATROOM_BROKER_BACKEND), InMemoryBroker):
+        return []
+    return [
+        Warning(
+            'CHATROOM_BROKER_BACKEND only delivers messages within each process.',
+            hint=(
+                'WebSocket and long-polling clients served by another process than the one '
+                'creating the message never receive it. Use a broker shared by all the processes '
+                '(e.g. Redis pub/sub) when running more than one process.'
+            ),
+            obj=settings.CHATROOM_BROKER_BACKEND,
+            id='api.W002',
+        )
+    ]
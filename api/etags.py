@@ -0,0 +1,84 @@
+"""
+    Versioned resources for conditional GETs.
+
+    Every cacheable resource ('user' or 'chatroom', with its pk) has a version
+    token in RESPONSE_CACHE. The write paths change the token: the signals of
+    api.signals and the bulk membership changes, which don't send signals.
+
+    The ETag of a response is a hash of the versions of the resources it is
+    made of and of the request variant (path with the query string, host and
+    format), so clients polling an unchanged resource get a 304 after a single
+    cache read. The data of 200 responses is cached under their ETag as well.
+
+    A version only changes in the cache of the process making the write, so
+    RESPONSE_CACHE must be shared by all the processes. Versions expire after
+    RESPONSE_VERSION_TIMEOUT, which bounds how long a per-process cache keeps
+    answering 304 for a resource changed by another process.
+"""
+from functools import partial
+from hashlib import sha1
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE]
+
+
+def version_key(resource, pk):
+    return f'resource-version:{resource}:{pk}'
+
+
+def get_versions(resources):
+    cache = get_cache()
+    keys = [version_key(resource, pk) for resource, pk in resources]
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, settings.RESPONSE_VERSION_TIMEOUT)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(resources):
+    get_cache().set_many(
+        {version_key(resource, pk): uuid4().hex for resource, pk in resources},
+        settings.RESPONSE_VERSION_TIMEOUT,
+    )
+
+
+def bump_on_commit(resources):
+    """
+        Bumps right away and again on commit, so a response rendered from the
+        old rows during the transaction isn't cached under the new version.
+    """
+    resources = list(resources)
+    if resources:
+        bump_versions(resources)
+        transaction.on_commit(partial(bump_versions, resources))
+
+
+def get_etag(request, versions):
+    variant = [request.get_host(), request.get_full_path(), request.accepted_renderer.format]
+    return '"%s"' % sha1(':'.join(variant + list(versions)).encode()).hexdigest()
+
+
+def etag_matches(request, etag):
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    return etag in etags or '*' in etags
+
+
+def response_key(etag):
+    return f'response:{etag}'
+
+
+def get_cached_data(etag):
+    return get_cache().get(response_key(etag))
+
+
+def set_cached_data(etag, data):
+    get_cache().set(response_key(etag), data, settings.RESPONSE_CACHE_TIMEOUT)
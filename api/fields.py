@@ -0,0 +1,36 @@
+from rest_framework.relations import (
+    HyperlinkedIdentityField,
+    HyperlinkedRelatedField,
+    PKOnlyObject,
+)
+
+
+class URLTemplateMixin:
+    """
+        Resolves the URL of a view once per field and fills in the pk of every
+        object, instead of running the URL resolver for each object. Only
+        meant for views whose single URL kwarg is the looked up pk.
+    """
+    # an integer the path converters accept and that doesn't appear in URLs
+    placeholder = 9876543210123
+
+    def get_url(self, obj, view_name, request, format):
+        if hasattr(obj, 'pk') and obj.pk in (None, ''):
+            return None
+        template = self.get_url_template(view_name, request, format)
+        return template.replace(str(self.placeholder), str(getattr(obj, self.lookup_field)))
+
+    def get_url_template(self, view_name, request, format):
+        templates = self.__dict__.setdefault('url_templates', {})
+        key = (view_name, format)
+        if key not in templates:
+            templates[key] = super().get_url(PKOnlyObject(self.placeholder), view_name, request, format)
+        return templates[key]
+
+
+class TemplatedHyperlinkedRelatedField(URLTemplateMixin, HyperlinkedRelatedField):
+    pass
+
+
+class TemplatedHyperlinkedIdentityField(URLTemplateMixin, HyperlinkedIdentityField):
+    pass
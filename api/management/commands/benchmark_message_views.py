@@ -0,0 +1,200 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from json import dumps
+from statistics import mean, quantiles
+from time import perf_counter, sleep
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from accounts.models import CustomUser as User
+from accounts.tokens import RefreshToken
+from chatrooms.models import Chatroom, Message
+from config.asgi import django_application
+
+
+BENCHMARK_PREFIX = 'benchmark-views'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the concurrency of the chatroom message endpoints served by WSGI '
+        '(config.wsgi, sync view on a pool of worker threads) and by ASGI (config.asgi, '
+        'async view), with clients that take --client-delay seconds to read each '
+        'response. A WSGI worker thread is busy until its client has read the '
+        'response, an ASGI server only holds a coroutine.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per server.')
+        parser.add_argument('--clients', type=int, default=100, help='Concurrent clients.')
+        parser.add_argument('--threads', type=int, default=4, help='WSGI worker threads, like gunicorn --threads.')
+        parser.add_argument('--client-delay', type=float, default=0.5, help='Seconds a client takes to read a response.')
+        parser.add_argument('--send', action='store_true', help='POST messages instead of reading the timeline.')
+        parser.add_argument('--host', help='Host header, the first of ALLOWED_HOSTS by default.')
+
+    def handle(self, *args, **options):
+        user = User.objects.create(username=BENCHMARK_PREFIX)
+        chatroom = Chatroom.objects.create(name=BENCHMARK_PREFIX)
+        try:
+            chatroom.participants.add(user)
+            Message.objects.bulk_create([
+                Message(chatroom=chatroom, sender=user, body=f'benchmark message {index}')
+                for index in range(50)
+            ])
+            self.token = str(RefreshToken.for_user(user).access_token)
+            self.host = options['host'] or self.get_host()
+            self.method = 'POST' if options['send'] else 'GET'
+            self.body = dumps({'body': 'benchmark message'}).encode() if options['send'] else b''
+            self.path = reverse('api:chatroom-messages', kwargs={'pk': chatroom.pk})
+            self.delay = options['client_delay']
+
+            self.stdout.write(
+                f'{options["requests"]} {self.method} requests, {options["clients"]} clients reading each '
+                f'response in {self.delay * 1000:.0f} ms, {options["threads"]} WSGI worker threads'
+            )
+            runs = [
+                ('WSGI, sync view', lambda: self.run_wsgi(options['requests'], options['clients'], options['threads'])),
+                ('ASGI, sync view', lambda: asyncio.run(
+                    self.run_asgi(ASGIHandler(), options['requests'], options['clients']),
+                )),
+                ('ASGI, async view', lambda: asyncio.run(
+                    self.run_asgi(django_application, options['requests'], options['clients']),
+                )),
+            ]
+            # the requests don't go through a proxy checking the host
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, self.host]):
+                for name, run in runs:
+                    start = perf_counter()
+                    results = run()
+                    self.report(name, results, perf_counter() - start)
+        finally:
+            OutstandingToken.objects.filter(user=user).delete()
+            chatroom.delete()
+            user.delete()
+
+    def get_host(self):
+        hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+        return hosts[0] if hosts else 'localhost'
+
+    def split(self, count, clients):
+        return [count // clients + (index < count % clients) for index in range(clients)]
+
+    def report(self, name, results, elapsed):
+        latencies = [latency for _, latency in results]
+        errors = sum(1 for status, _ in results if status >= 400)
+        self.stdout.write(
+            f'{name}: {len(results) / elapsed:.1f} requests/s, '
+            f'{mean(latencies) * 1000:.0f} ms mean latency, '
+            f'{quantiles(latencies, n=20)[-1] * 1000:.0f} ms p95'
+            + (f', {errors} errors' if errors else '')
+        )
+
+    def run_wsgi(self, count, clients, threads):
+        """ Every client waits for a worker thread, which then serves the request and sends the response """
+        application = WSGIHandler()
+        results = []
+
+        def serve():
+            statuses = []
+            response = application(self.get_environ(), lambda status, headers, exc_info=None: statuses.append(status))
+            b''.join(response)
+            response.close()
+            # the worker writes the response as fast as the client reads it
+            sleep(self.delay)
+            return int(statuses[0].split()[0])
+
+        def client(calls, workers):
+            for _ in range(calls):
+                start = perf_counter()
+                status = workers.submit(serve).result()
+                results.append((status, perf_counter() - start))
+
+        with ThreadPoolExecutor(threads) as workers, ThreadPoolExecutor(clients) as client_threads:
+            for calls in self.split(count, clients):
+                client_threads.submit(client, calls, workers)
+        return results
+
+    def get_environ(self):
+        return {
+            'REQUEST_METHOD': self.method,
+            'PATH_INFO': self.path,
+            'SCRIPT_NAME': '',
+            'QUERY_STRING': '',
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': self.host,
+            'HTTP_AUTHORIZATION': f'JWT {self.token}',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(self.body)),
+            'wsgi.input': BytesIO(self.body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+    async def run_asgi(self, application, count, clients):
+        results = []
+
+        async def client(calls):
+            for _ in range(calls):
+                start = perf_counter()
+                status = await self.asgi_request(application)
+                results.append((status, perf_counter() - start))
+
+        await asyncio.gather(*(client(calls) for calls in self.split(count, clients)))
+        return results
+
+    async def asgi_request(self, application):
+        received = False
+        statuses = []
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': self.body, 'more_body': False}
+            # the client stays connected until the response is sent
+            await asyncio.Future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+            elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                await asyncio.sleep(self.delay)
+
+        await application(self.get_scope(), receive, send)
+        return statuses[0]
+
+    def get_scope(self):
+        return {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': self.method,
+            'scheme': 'http',
+            'path': self.path,
+            'raw_path': self.path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (b'host', self.host.encode()),
+                (b'authorization', f'JWT {self.token}'.encode()),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(self.body)).encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': (self.host, 80),
+        }
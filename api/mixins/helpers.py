@@ -1,4 +1,181 @@
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+
+from accounts.models import CustomUser as User
+from accounts.search import search_users
+from chatrooms.membership import (
+    Membership,
+    aget_cached_membership,
+    annotate_membership,
+    aset_membership,
+    change_members,
+    get_cached_membership,
+    set_membership,
+)
 from chatrooms.models import Message, Chatroom
+from chatrooms.search import get_message_search
+
+from api.etags import (
+    bump_on_commit,
+    etag_matches,
+    get_cached_data,
+    get_etag,
+    get_versions,
+    set_cached_data,
+)
+from api.pagination import KeysetPagination
+from api.serializers import (
+    ChatroomSummarySerializer,
+    CompactChatroomSerializer,
+    MemberIdsSerializer,
+    UserSerializer,
+    get_requested_fields,
+)
+
+
+def get_selected_model_fields(serializer):
+    """
+        The names of the model fields read by the serializer, or None when one
+        of its fields isn't a plain model field (method fields, nested
+        serializers, dotted sources...).
+    """
+    opts = serializer.Meta.model._meta
+    names = {opts.pk.name}
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if isinstance(field, BaseSerializer) or field.source == '*' or '.' in field.source:
+            return None
+        try:
+            names.add(opts.get_field(field.source).name)
+        except FieldDoesNotExist:
+            return None
+    return names
+
+
+class SparseFieldsQuerysetMixin:
+    """ Narrows the SELECT of a list to the columns of the fields requested with ?fields= """
+
+    def select_requested_fields(self, queryset, serializer, *required):
+        """ 'required' are the extra columns read by the view, e.g. the pagination ordering """
+        if get_requested_fields(self.request) is None:
+            return queryset
+        names = get_selected_model_fields(serializer)
+        if names is None:
+            return queryset
+        opts = queryset.model._meta
+        columns = [name for name in names if opts.get_field(name).concrete and not opts.get_field(name).many_to_many]
+        return queryset.only(*columns, *required)
+
+
+class ConditionalGetMixin:
+    """
+        ETag and If-None-Match support for GET responses that only depend on
+        the resources of get_etag_resources (see api.etags). The permissions
+        are checked before, as for any request.
+    """
+    etag_resource = None
+
+    def get_etag_resources(self, request):
+        return [(self.etag_resource, self.kwargs['pk'])]
+
+    def get_etag_versions(self, request):
+        return get_versions(self.get_etag_resources(request))
+
+    def conditional_get(self, request, handler, *args, **kwargs):
+        etag = get_etag(request, self.get_etag_versions(request))
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        data = get_cached_data(etag)
+        if data is not None:
+            response = Response(data, status=status.HTTP_200_OK)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            set_cached_data(etag, response.data)
+        response['ETag'] = etag
+        return response
+
+
+class AsyncAPIViewMixin:
+    """
+        APIView.dispatch as a coroutine, for views with async handlers served
+        by config.asgi. The authenticators with an aauthenticate() method and
+        the acheck_permissions() of the view run on the event loop, the other
+        ones in a thread. Content negotiation and throttling don't do I/O with
+        the project settings and stay synchronous.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            # OPTIONS is handled by the synchronous APIView.options
+            response = handler(request, *args, **kwargs)
+            if isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+        await self.aperform_authentication(request)
+        await self.acheck_permissions(request)
+        self.check_throttles(request)
+
+    async def aperform_authentication(self, request):
+        """ Request._authenticate, request.user is set before the permissions read it """
+        for authenticator in request.authenticators:
+            authenticate = getattr(authenticator, 'aauthenticate', None) or sync_to_async(authenticator.authenticate)
+            try:
+                user_auth_tuple = await authenticate(request)
+            except APIException:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    async def acheck_permissions(self, request):
+        await sync_to_async(self.check_permissions)(request)
+
+
+class ChatroomAccess:
+    """ The chatroom targeted by a request and the role of the requesting user in it """
+
+    def __init__(self, chatroom=None, is_participant=False, is_admin=False):
+        self.chatroom = chatroom
+        self.is_participant = is_participant
+        self.is_admin = is_admin
+
+    @property
+    def is_public(self):
+        return self.chatroom is not None and self.chatroom.public
 
 
 class GetModelObjectFromRequestMixin:
@@ -11,38 +188,65 @@ class GetModelObjectFromRequestMixin:
             return None
 
 
-class UserMixin:
+class UserMixin(SparseFieldsQuerysetMixin):
 
     def get_queryset(self, queryset=None):
         self.queryset = queryset if queryset is not None else super().get_queryset()
+        self.queryset = self.select_requested_fields(
+            self.queryset, UserSerializer(context={'request': self.request}),
+        )
 
         username = self.request.query_params.get('username')
         if username is not None:
-            self.queryset = self.queryset.filter(username__icontains=username).distinct()
+            self.queryset = self.queryset.filter(username__icontains=username)
         first_name = self.request.query_params.get('first_name')
         if first_name is not None:
-            self.queryset = self.queryset.filter(first_name__icontains=first_name).distinct()
+            self.queryset = self.queryset.filter(first_name__icontains=first_name)
         last_name = self.request.query_params.get('last_name')
         if last_name is not None:
-            self.queryset = self.queryset.filter(last_name__icontains=last_name).distinct()
+            self.queryset = self.queryset.filter(last_name__icontains=last_name)
         email = self.request.query_params.get('email')
         if email is not None:
             self.queryset = self.queryset.filter(email__icontains=email)
 
+        # applied last since the ranked results are capped
+        query = self.request.query_params.get('q')
+        if query is not None and query.strip():
+            self.queryset = search_users(self.queryset, query, self.get_search_limit())
+
         return self.queryset
 
+    def get_paginated_user_list(self, request, queryset):
+        """ One page of users, see KeysetPagination for the 'after', 'before' and 'page_size' query params """
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = UserSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+    def get_search_limit(self):
+        try:
+            return int(self.request.query_params.get('limit', 0)) or None
+        except ValueError:
+            raise ValidationError({'Bad Request': 'limit must be an integer.'})
+
+
+class MessageMixin(GetModelObjectFromRequestMixin, SparseFieldsQuerysetMixin):
+    filter_query_params = ('body', 'sender')
 
-class MessageMixin(GetModelObjectFromRequestMixin):
+    def has_message_filters(self, request):
+        return any(request.query_params.get(param) is not None for param in self.filter_query_params)
 
     def get_message_from_request(self, request):
-        return self.get_model_object_from_request(Message, request)
+        if not hasattr(request, 'message_object'):
+            request.message_object = self.get_model_object_from_request(Message, request)
+        return request.message_object
 
     def get_queryset(self, queryset=None):
         self.queryset = queryset if queryset is not None else super().get_queryset()
 
         body = self.request.query_params.get('body')
         if body is not None:
-            self.queryset = self.queryset.filter(body__icontains=body).distinct()
+            self.queryset = get_message_search(self.queryset.db).filter(self.queryset, body)
         sender = self.request.query_params.get('sender')
         if sender is not None:
             self.queryset = self.queryset.filter(sender__username=sender)
@@ -50,15 +254,133 @@ class MessageMixin(GetModelObjectFromRequestMixin):
         return self.queryset
 
 
-class ChatroomMixin(GetModelObjectFromRequestMixin):
+class ChatroomMixin(GetModelObjectFromRequestMixin, SparseFieldsQuerysetMixin):
+
+    def get_chatroom_access(self, request):
+        """
+            Loads the chatroom of the request along with the membership and admin
+            flags of the user in a single query, or only the chatroom when the
+            membership is cached. The result is stored on the request so
+            permission classes and views share it.
+        """
+        access = getattr(request, 'chatroom_access', None)
+        if access is None:
+            access = self.load_chatroom_access(request)
+            request.chatroom_access = access
+        return access
+
+    def load_chatroom_access(self, request):
+        chatroom_id = request.parser_context['kwargs'].get('pk')
+        user_id = request.user.pk
+        membership = get_cached_membership(chatroom_id, user_id) if user_id is not None else None
+        if membership is not None:
+            chatroom = Chatroom.objects.filter(pk=chatroom_id).first()
+        else:
+            chatroom = annotate_membership(Chatroom.objects.filter(pk=chatroom_id), user_id).first()
+            if chatroom is not None:
+                membership = Membership(chatroom.user_is_participant, chatroom.user_is_admin)
+                if user_id is not None:
+                    set_membership(chatroom_id, user_id, membership)
+        if chatroom is None:
+            return ChatroomAccess()
+        return ChatroomAccess(chatroom, membership.is_participant, membership.is_admin)
+
+    async def aget_chatroom_access(self, request):
+        """ get_chatroom_access for the async views, with the async cache and ORM """
+        access = getattr(request, 'chatroom_access', None)
+        if access is None:
+            access = await self.aload_chatroom_access(request)
+            request.chatroom_access = access
+        return access
+
+    async def aload_chatroom_access(self, request):
+        chatroom_id = request.parser_context['kwargs'].get('pk')
+        user_id = request.user.pk
+        membership = await aget_cached_membership(chatroom_id, user_id) if user_id is not None else None
+        if membership is not None:
+            chatroom = await Chatroom.objects.filter(pk=chatroom_id).afirst()
+        else:
+            chatroom = await annotate_membership(Chatroom.objects.filter(pk=chatroom_id), user_id).afirst()
+            if chatroom is not None:
+                membership = Membership(chatroom.user_is_participant, chatroom.user_is_admin)
+                if user_id is not None:
+                    await aset_membership(chatroom_id, user_id, membership)
+        if chatroom is None:
+            return ChatroomAccess()
+        return ChatroomAccess(chatroom, membership.is_participant, membership.is_admin)
 
     def get_chatroom_from_request(self, request):
-        return self.get_model_object_from_request(Chatroom, request)
+        return self.get_chatroom_access(request).chatroom
+
+    def get_member_ids_from_request(self, request):
+        """ The user ids of a membership change, from 'ids' or the single 'id' """
+        if 'ids' in request.data:
+            ids = request.data.get('ids')
+            return ids if isinstance(ids, list) else None
+        try:
+            return [int(request.data.get('id'))]
+        except (TypeError, ValueError):
+            return None
+
+    def perform_bulk_membership_change(self, request, relation, required_relation=None):
+        """
+            Adds (POST) or removes (DELETE) all the users of 'ids' and returns
+            the diff instead of the whole member list:
+            {"added"|"removed": [...], "unchanged": [...], "not_found": [...]},
+            plus "not_participant" when only participants can be added.
+        """
+        chatroom = self.get_chatroom_from_request(request)
+        if not isinstance(chatroom, Chatroom):
+            return Response({'Bad Request': f'Chatroom not found!'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = MemberIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        add = request.method == 'POST'
+        change = change_members(
+            chatroom, relation, serializer.validated_data['ids'], add, required_relation,
+        )
+        if change.changed:
+            # change_members doesn't send m2m_changed, see api.signals
+            bump_on_commit([('chatroom', chatroom.pk)])
+        data = {
+            'added' if add else 'removed': change.changed,
+            'unchanged': change.unchanged,
+            'not_found': change.not_found,
+        }
+        if required_relation == 'participants' and add:
+            data['not_participant'] = change.rejected
+        return Response(data, status=status.HTTP_200_OK)
+
+    representation_serializers = {
+        'compact': CompactChatroomSerializer,
+        'summary': ChatroomSummarySerializer,
+    }
 
     def get_queryset(self):
         self.queryset = self.queryset.filter(public=True)
+        serializer = self.get_serializer()
+        if self.get_serializer_class() is ChatroomSummarySerializer:
+            # a deferred foreign key can't be joined, see select_requested_fields
+            if 'last_message' in serializer.fields:
+                self.queryset = self.queryset.select_related('last_message')
+        else:
+            # only the member lists left in the representation by ?fields=
+            selected = get_selected_model_fields(serializer)
+            self.queryset = self.queryset.prefetch_related(*(
+                Prefetch(relation, queryset=User.objects.only('pk'))
+                for relation in ('participants', 'admins')
+                if selected is None or relation in selected
+            ))
+        self.queryset = self.select_requested_fields(self.queryset, serializer)
 
         name = self.request.query_params.get('name')
         if name is not None:
             self.queryset = self.queryset.filter(name__icontains=name).distinct()
         return self.queryset
+
+    def get_serializer_class(self):
+        """ ?representation=compact|summary selects one of the representation_serializers """
+        representation = self.request.query_params.get('representation')
+        if representation in self.representation_serializers:
+            return self.representation_serializers[representation]
+        return super().get_serializer_class()
@@ -4,7 +4,9 @@ from rest_framework.permissions import (
     IsAuthenticated,
 )
 
-from api.mixins.views import (
+from chatrooms.membership import get_membership
+
+from api.mixins.helpers import (
     MessageMixin,
     ChatroomMixin,
 )
@@ -18,8 +20,7 @@ class IsChatroomAdmin(BasePermission, ChatroomMixin):
 
     def has_permission(self, request, view):
         user = request.user
-        chatroom = self.get_chatroom_from_request(request)
-        user_is_chatroom_admin = user.is_active and chatroom.admins.filter(username=user.username).exists()
+        user_is_chatroom_admin = user.is_active and self.get_chatroom_access(request).is_admin
         user_admin = user.is_staff or user.is_superuser
         return bool(user_is_chatroom_admin or user_admin)
 
@@ -59,6 +60,33 @@ class UserFriendListPermissionsMixin:
         return super().get_permissions()
 
 
+class UserFriendSuggestionListPermissionsMixin:
+
+    def get_permissions(self):
+        self.permission_classes = [IsAdminUser]
+        if self.request.user.pk == self.request.parser_context['kwargs'].get('pk'):
+            self.permission_classes = [IsAuthenticated]
+        return super().get_permissions()
+
+
+class UserChatroomListPermissionsMixin:
+
+    def get_permissions(self):
+        self.permission_classes = [IsAdminUser]
+        if self.request.user.pk == self.request.parser_context['kwargs'].get('pk'):
+            self.permission_classes = [IsAuthenticated]
+        return super().get_permissions()
+
+
+class UserUnreadCountPermissionsMixin:
+
+    def get_permissions(self):
+        self.permission_classes = [IsAdminUser]
+        if self.request.user.pk == self.request.parser_context['kwargs'].get('pk'):
+            self.permission_classes = [IsAuthenticated]
+        return super().get_permissions()
+
+
 class MessageListPermissionsMixin:
 
     def get_permissions(self):
@@ -79,9 +107,7 @@ class MessageDetailPermissionsMixin(MessageMixin):
     def are_user_and_message_in_same_chatroom(self, request):
         user = request.user
         message = self.get_message_from_request(request)
-        if message.chatroom.participants.filter(pk=user.pk):
-            return True
-        return False
+        return get_membership(message.chatroom_id, user.pk).is_participant
 
     def get_permissions(self):
         self.permission_classes = [IsAdminUser]
@@ -109,15 +135,10 @@ class ChatroomDetailPermissionsMixin:
     """ The class that inherits this class, must as well inherit ChatroomMixin """
 
     def user_in_chatroom(self):
-        user = self.request.user
-        chatroom = self.get_chatroom_from_request(self.request)
-        if chatroom.participants.filter(pk=user.pk).exists():
-            return True
-        return False
+        return self.get_chatroom_access(self.request).is_participant
 
     def requested_chatroom_is_public(self):
-        chatroom = self.get_chatroom_from_request(self.request)
-        return chatroom.public
+        return self.get_chatroom_access(self.request).is_public
 
     def get_permissions(self):
         self.permission_classes = [IsChatroomAdmin]
@@ -137,23 +158,28 @@ class ChatroomMessageListPermissionsMixin:
 
     def get_permissions(self):
         self.permission_classes = [IsChatroomAdmin]
-        chatroom = self.get_chatroom_from_request(self.request)
+        access = self.get_chatroom_access(self.request)
         if self.request.method in SAFE_METHODS + ['POST']:
-            if chatroom.participants.filter(pk=self.request.user.pk).exists():
+            if access.is_participant:
                 self.permission_classes = [IsAuthenticated]
         return super().get_permissions()
 
+    async def acheck_permissions(self, request):
+        """ The access is loaded with the async ORM, the permission classes then read it from the request """
+        await self.aget_chatroom_access(request)
+        self.check_permissions(request)
+
 
 class ChatroomAdminListPermissionsMixin:
     """ The class that inherits this class, must as well inherit ChatroomMixin """
 
     def get_permissions(self):
         self.permission_classes = [IsChatroomAdmin]
-        chatroom = self.get_chatroom_from_request(self.request)
+        access = self.get_chatroom_access(self.request)
         if self.request.method in SAFE_METHODS:
-            if chatroom.participants.filter(pk=self.request.user.pk).exists():
+            if access.is_participant:
                 self.permission_classes = [IsAuthenticated]
-            elif chatroom.public is True:
+            elif access.is_public:
                 self.permission_classes = [IsAuthenticated]
         return super().get_permissions()
 
@@ -163,15 +189,16 @@ class ChatroomParticipantListPermissionsMixin:
 
     def get_permissions(self):
         self.permission_classes = [IsChatroomAdmin]
-        chatroom = self.get_chatroom_from_request(self.request)
+        access = self.get_chatroom_access(self.request)
 
         if self.request.method in SAFE_METHODS:
-            if chatroom.participants.filter(pk=self.request.user.pk).exists():
+            if access.is_participant:
                 self.permission_classes = [IsAuthenticated]
-            elif chatroom.public is True:
+            elif access.is_public:
                 self.permission_classes = [IsAuthenticated]
         elif self.request.method in ['POST', 'DELETE']:
-            if self.request.user.pk == int(self.request.data.get('id')):
-                if chatroom.public is True:
+            # users can join or leave public chatrooms on their own
+            if self.get_member_ids_from_request(self.request) == [self.request.user.pk]:
+                if access.is_public:
                     self.permission_classes = [IsAuthenticated]
         return super().get_permissions()
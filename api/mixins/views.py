@@ -1,24 +1,65 @@
+from datetime import datetime, timezone
+from functools import partial
+from itertools import chain
+from threading import Event
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Value
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+
 from rest_framework.settings import api_settings
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import status
 
+from accounts.friends import change_friends, get_friend_suggestions, get_mutual_friend_ids
 from accounts.models import CustomUser as User
-from chatrooms.models import Chatroom
-
+from chatrooms.archive import ChatroomArchive
+from chatrooms.counters import arecord_messages, record_messages, refresh_counters
+from chatrooms.membership import get_user_chatrooms
+from chatrooms.models import Chatroom, Message
+from chatrooms.search import get_message_search
+from chatrooms.unread import (
+    advance_read_cursor,
+    chatroom_version_key,
+    get_unread_counts,
+    invalidate_chatroom,
+)
+from chatrooms.unread import get_versions as get_message_versions
+
+from api.broadcast import get_broker
+from api.pagination import (
+    ChatroomInboxPagination,
+    KeysetPagination,
+    MessageCursorPagination,
+    MessageListPagination,
+    MessageSearchPagination,
+)
+from api.renderers import NDJSONRenderer, CSVRenderer
 from api.serializers import (
     UserSerializer,
     MessageSerializer,
     ChatroomMessageSerializer,
+    ChatroomSummarySerializer,
+    BulkMessageSerializer,
+    FriendIdsSerializer,
 )
 from api.mixins.helpers import (
+    AsyncAPIViewMixin,
     UserMixin,
     MessageMixin,
     ChatroomMixin,
+    ConditionalGetMixin,
 )
 from api.mixins.permissions import (
     UserListPermissionsMixin,
     UserDetailPermissionsMixin,
     UserFriendListPermissionsMixin,
+    UserFriendSuggestionListPermissionsMixin,
+    UserChatroomListPermissionsMixin,
+    UserUnreadCountPermissionsMixin,
     MessageListPermissionsMixin,
     MessageDetailPermissionsMixin,
     ChatroomListPermissionsMixin,
@@ -30,13 +71,14 @@ from api.mixins.permissions import (
 
 
 class UserListViewMixin(UserListPermissionsMixin, UserMixin):
+    pagination_class = KeysetPagination
 
     def get_queryset(self, queryset=None):
         return super().get_queryset(queryset)
 
 
-class UserDetailViewMixin(UserDetailPermissionsMixin):
-    pass
+class UserDetailViewMixin(UserDetailPermissionsMixin, ConditionalGetMixin):
+    etag_resource = 'user'
 
 
 class UserFriendListMixin(UserFriendListPermissionsMixin, UserMixin):
@@ -52,36 +94,143 @@ class UserFriendListMixin(UserFriendListPermissionsMixin, UserMixin):
 
     def list_friends(self, request, *args, **kwargs):
         user = request.user
-        serializer = UserSerializer(
-            self.get_queryset(user.friends.all()),
-            many = True,
-        )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_user_list(request, self.get_queryset(user.friends.all()))
 
     def perform_add_or_delete_friend(self, request, *args, **kwargs):
+        if 'ids' in request.data:
+            return self.perform_bulk_friend_change(request)
         user = request.user
         friend = self.get_model_obj(request.data.get('id'), User)
         if friend is None:
             return Response({'not found': f'user not found'}, status=status.HTTP_404_NOT_FOUND)
         if request.method == 'POST':
-            user.friends.add(friend.pk)
-            user.clean_friends()
+            # a user can't be its own friend
+            if friend.pk != user.pk:
+                user.friends.add(friend.pk)
         elif request.method == 'DELETE':
             user.friends.remove(friend.pk)
         return self.list_friends(request, *args, **kwargs)
 
+    def perform_bulk_friend_change(self, request):
+        """
+            Adds (POST) or removes (DELETE) all the users of 'ids' and returns
+            the diff: {"added"|"removed": [...], "unchanged": [...], "not_found": [...]}
+        """
+        serializer = FriendIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        add = request.method == 'POST'
+        change = change_friends(request.user, serializer.validated_data['ids'], add)
+        return Response({
+            'added' if add else 'removed': change.changed,
+            'unchanged': change.unchanged,
+            'not_found': change.not_found,
+        }, status=status.HTTP_200_OK)
+
+
+class UserMutualFriendListViewMixin(UserFriendListPermissionsMixin, UserMixin):
+
+    def list_mutual_friends(self, request, *args, **kwargs):
+        """ The friends the user of the request has in common with the user of the URL """
+        ids = get_mutual_friend_ids(request.user.pk, kwargs['pk'])
+        queryset = User.objects.filter(pk__in=ids) if ids else User.objects.none()
+        return self.get_paginated_user_list(request, self.get_queryset(queryset))
+
+
+class UserFriendSuggestionListViewMixin(UserFriendSuggestionListPermissionsMixin):
+
+    def get_suggestion_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', settings.FRIEND_SUGGESTIONS_MAX_RESULTS))
+        except ValueError:
+            raise ValidationError({'Bad Request': 'limit must be an integer.'})
+        return max(1, min(limit, settings.FRIEND_SUGGESTIONS_MAX_RESULTS))
+
+    def list_friend_suggestions(self, request, *args, **kwargs):
+        """ Friends of friends, most mutual friends first, with their 'mutual_friends' count """
+        suggestions = get_friend_suggestions(kwargs['pk'], self.get_suggestion_limit(request))
+        users = User.objects.in_bulk([suggestion.user_id for suggestion in suggestions])
+        data = [
+            {**UserSerializer(users[suggestion.user_id]).data, 'mutual_friends': suggestion.mutual_friends}
+            for suggestion in suggestions
+            if suggestion.user_id in users
+        ]
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class UserChatroomListViewMixin(UserChatroomListPermissionsMixin):
+    pagination_class = ChatroomInboxPagination
+    # sort key of the chatrooms without messages, after every other chatroom
+    inactive_since = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    def get_inbox_queryset(self, user_id):
+        """ The chatrooms the user participates in, with their last message joined """
+        return (
+            Chatroom.objects.filter(participants=user_id)
+            .select_related('last_message')
+            .annotate(activity=Coalesce('last_activity', Value(self.inactive_since)))
+        )
+
+    def list_chatrooms(self, request, *args, **kwargs):
+        """
+            The inbox of the user: one page of the chatrooms they participate in,
+            most recent activity first, in a single query. See
+            ChatroomInboxPagination for the 'before', 'after' and 'page_size'
+            query params.
+        """
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(self.get_inbox_queryset(kwargs['pk']), request, view=self)
+        serializer = ChatroomSummarySerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+
+class UserUnreadCountViewMixin(UserUnreadCountPermissionsMixin):
+
+    def list_unread_counts(self, request, *args, **kwargs):
+        """ The number of unread messages of every chatroom the user participates in """
+        user_id = kwargs['pk']
+        counts = get_unread_counts(user_id, get_user_chatrooms(user_id).participant_of)
+        return Response({
+            'total': sum(counts.values()),
+            'chatrooms': [
+                {'chatroom': chatroom_id, 'unread': unread}
+                for chatroom_id, unread in counts.items()
+            ],
+        }, status=status.HTTP_200_OK)
+
 
 class MessageListViewMixin(MessageListPermissionsMixin, MessageMixin):
+    # same order as the message_chatroom_timeline and message_sender_history indexes
+    pagination_class = MessageListPagination
 
     def get_queryset(self, queryset=None):
-        return super().get_queryset(queryset)
+        return self.select_requested_fields(
+            super().get_queryset(queryset), self.get_serializer(), *self.pagination_class.ordering,
+        )
+
+    def perform_create(self, serializer):
+        # the chatroom counters are updated in the same transaction (post_save)
+        with transaction.atomic():
+            serializer.save()
 
 
 class MessageDetailViewMixin(MessageDetailPermissionsMixin):
-    pass
+
+    def perform_update(self, serializer):
+        previous_chatroom_id = serializer.instance.chatroom_id
+        with transaction.atomic():
+            message = serializer.save()
+            if message.chatroom_id != previous_chatroom_id:
+                refresh_counters(Chatroom.objects.filter(pk__in=[previous_chatroom_id, message.chatroom_id]))
+                invalidate_chatroom(previous_chatroom_id)
+                invalidate_chatroom(message.chatroom_id)
+
+    def perform_destroy(self, instance):
+        # the counters are updated by the post_delete signal, see chatrooms.signals
+        instance.delete()
 
 
 class ChatroomListViewMixin(ChatroomListPermissionsMixin, ChatroomMixin):
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return super().get_queryset()
@@ -117,34 +266,332 @@ class ChatroomListViewMixin(ChatroomListPermissionsMixin, ChatroomMixin):
             return {}
 
 
-class ChatroomDetailViewMixin(ChatroomDetailPermissionsMixin, ChatroomMixin):
-    pass
+class ChatroomDetailViewMixin(ChatroomDetailPermissionsMixin, ChatroomMixin, ConditionalGetMixin):
+    etag_resource = 'chatroom'
+
+    def get_etag_versions(self, request):
+        versions = super().get_etag_versions(request)
+        if self.get_serializer_class() is ChatroomSummarySerializer:
+            # the message counters and the last message change with every message
+            versions += get_message_versions([chatroom_version_key(self.kwargs['pk'])])
+        return versions
 
 
 class ChatroomMessageListViewMixin(ChatroomMessageListPermissionsMixin, MessageMixin, ChatroomMixin):
+    pagination_class = MessageCursorPagination
+
+    def get_message_paginator(self, chatroom, archive=True):
+        paginator = self.pagination_class()
+        if archive:
+            paginator.archive = ChatroomArchive(chatroom.pk)
+        return paginator
 
     def list_messages(self, request, *args, **kwargs):
+        """
+            Returns one page of the chatroom timeline. See MessageCursorPagination
+            for the 'before', 'after' and 'page_size' query params.
+        """
         chatroom = self.get_chatroom_from_request(request)
-        serializer = MessageSerializer(
+        if not isinstance(chatroom, Chatroom):
+            return Response({'Bad Request': 'Object not found!'}, status=status.HTTP_404_NOT_FOUND)
+        # the archived messages can't be filtered like the table, the
+        # filtered timelines stop at the archive boundary
+        paginator = self.get_message_paginator(chatroom, archive=not self.has_message_filters(request))
+        page = paginator.paginate_queryset(self.get_message_queryset(request, chatroom, paginator), request, view=self)
+        serializer = MessageSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+    def get_message_queryset(self, request, chatroom, paginator):
+        return self.select_requested_fields(
             self.get_queryset(queryset=chatroom.messages.all()),
-            many = True,
-            context = {'request': request},
+            MessageSerializer(context={'request': request}),
+            *paginator.ordering,
         )
-        return Response(serializer.data, status=status.HTTP_200_OK)
 
     def send_message(self, request, *args, **kwargs):
         serializer = ChatroomMessageSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        since = request.query_params.get('since')
+        if since is not None:
+            # an invalid cursor is rejected (404) before the message is written
+            self.pagination_class().validate_cursor(Message, since)
         chatroom = self.get_chatroom_from_request(request)
         if isinstance(chatroom, Chatroom):
             serializer.validated_data['chatroom'] = chatroom
         if isinstance(request.user, User):
             serializer.validated_data['sender'] = request.user
-        serializer.save()
+        # the chatroom counters are updated in the same transaction (post_save)
+        with transaction.atomic():
+            message = serializer.save()
+        data = MessageSerializer(message, context={'request': request}).data
+        transaction.on_commit(partial(get_broker().publish, message.chatroom_id, data))
+
+        if since is None:
+            return Response(data, status=status.HTTP_201_CREATED)
+        return Response(
+            {'message': data, **self.get_messages_since(request, chatroom, since)},
+            status = status.HTTP_201_CREATED,
+        )
+
+    def get_messages_since(self, request, chatroom, cursor):
+        """ Returns the page of messages sent after the given cursor """
+        paginator = self.get_message_paginator(chatroom)
+        page = paginator.paginate_queryset(chatroom.messages.all(), request, view=self, after=cursor)
+        serializer = MessageSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_data(serializer.data)
+
+
+class AsyncChatroomMessageListViewMixin(ChatroomMessageListViewMixin, AsyncAPIViewMixin):
+    """
+        The chatroom timeline and message sending for config.asgi, with the
+        async ORM and cache: the page is read by apaginate_queryset, the
+        message is inserted with abulk_create and the counters and the
+        broadcast are awaited. Only the archive segments are read in a worker
+        thread. The responses are the same as the ones of the sync view.
+
+        The insert and the counter update run in autocommit, one after the
+        other: repair_chatroom_counters fixes the counters of an insert whose
+        update failed.
+    """
+
+    async def alist_messages(self, request, *args, **kwargs):
+        chatroom = (await self.aget_chatroom_access(request)).chatroom
+        if not isinstance(chatroom, Chatroom):
+            return Response({'Bad Request': 'Object not found!'}, status=status.HTTP_404_NOT_FOUND)
+        paginator = self.get_message_paginator(chatroom, archive=not self.has_message_filters(request))
+        page = await paginator.apaginate_queryset(
+            self.get_message_queryset(request, chatroom, paginator), request, view=self,
+        )
+        serializer = MessageSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+    async def asend_message(self, request, *args, **kwargs):
+        # the chatroom and the sender come from the request, validating them would query
+        serializer = BulkMessageSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        since = request.query_params.get('since')
+        if since is not None:
+            self.pagination_class().validate_cursor(Message, since)
+        chatroom = (await self.aget_chatroom_access(request)).chatroom
+        if not isinstance(chatroom, Chatroom):
+            return Response({'Bad Request': 'Object not found!'}, status=status.HTTP_404_NOT_FOUND)
+        sender = request.user if isinstance(request.user, User) else None
+        message = Message(chatroom=chatroom, sender=sender, **serializer.validated_data)
+        # bulk_create doesn't send post_save, the counters are recorded here
+        await Message.objects.abulk_create([message])
+        await arecord_messages(chatroom.pk, 1, message)
+        data = MessageSerializer(message, context={'request': request}).data
+        await get_broker().apublish(chatroom.pk, data)
+
+        if since is None:
+            return Response(data, status=status.HTTP_201_CREATED)
+        return Response(
+            {'message': data, **await self.aget_messages_since(request, chatroom, since)},
+            status = status.HTTP_201_CREATED,
+        )
+
+    async def aget_messages_since(self, request, chatroom, cursor):
+        paginator = self.get_message_paginator(chatroom)
+        page = await paginator.apaginate_queryset(chatroom.messages.all(), request, view=self, after=cursor)
+        serializer = MessageSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_data(serializer.data)
+
+
+class ChatroomMessageWaitViewMixin(ChatroomMessageListViewMixin):
+
+    def get_wait_timeout(self, request):
+        timeout = request.query_params.get('timeout', settings.CHATROOM_LONG_POLL_TIMEOUT)
+        try:
+            timeout = float(timeout)
+        except ValueError:
+            raise ValidationError({'Bad Request': 'timeout must be a number of seconds.'})
+        return max(0.0, min(timeout, settings.CHATROOM_LONG_POLL_TIMEOUT))
+
+    def wait_for_messages(self, request, *args, **kwargs):
+        """
+            Long-polling version of list_messages. Returns as soon as there are
+            messages after the 'after' cursor, or an empty page once the timeout
+            expires. The request sleeps on a broker notification, so an idle
+            client costs one query per timeout instead of one per poll.
+        """
+        if not request.query_params.get(self.pagination_class.after_query_param):
+            raise ValidationError({'Bad Request': 'The after cursor is required.'})
+        timeout = self.get_wait_timeout(request)
+        chatroom = self.get_chatroom_from_request(request)
+        if not isinstance(chatroom, Chatroom):
+            return Response({'Bad Request': 'Object not found!'}, status=status.HTTP_404_NOT_FOUND)
+
+        # subscribe before querying so a message sent in between isn't missed
+        new_message = Event()
+        broker = get_broker()
+        subscription = broker.subscribe(chatroom.pk, lambda message: new_message.set())
+        try:
+            response = self.list_messages(request, *args, **kwargs)
+            if response.data['results'] or not new_message.wait(timeout):
+                return response
+        finally:
+            broker.unsubscribe(subscription)
         return self.list_messages(request, *args, **kwargs)
 
 
-class ChatroomAdminListViewMixin(ChatroomAdminListPermissionsMixin, UserMixin, ChatroomMixin):
+class ChatroomMessageSearchViewMixin(ChatroomMessageListViewMixin):
+    search_pagination_class = MessageSearchPagination
+
+    def search_messages(self, request, *args, **kwargs):
+        """ Returns the messages of the chatroom matching ?q=, best match first """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'Bad Request': 'The q param is required.'})
+        chatroom = self.get_chatroom_from_request(request)
+        if not isinstance(chatroom, Chatroom):
+            return Response({'Bad Request': 'Object not found!'}, status=status.HTTP_404_NOT_FOUND)
+
+        messages = chatroom.messages.all()
+        paginator = self.search_pagination_class()
+        page = paginator.paginate_queryset(
+            get_message_search(messages.db).search(messages, query),
+            request,
+            view = self,
+        )
+        serializer = MessageSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ChatroomMessageBulkViewMixin(ChatroomMessageListViewMixin):
+
+    def bulk_send_messages(self, request, *args, **kwargs):
+        """
+            Creates up to MESSAGE_BULK_MAX_SIZE messages sent as a JSON list of
+            {"body": ...} objects. Items are validated in a single pass that
+            doesn't touch the database, the valid ones are inserted with
+            bulk_create in one transaction and the response holds one result
+            per item, in order: {"id": ...} or {"errors": {...}}.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'Bad Request': 'Expected a non-empty list of messages.'})
+        if len(items) > settings.MESSAGE_BULK_MAX_SIZE:
+            raise ValidationError({
+                'Bad Request': f'At most {settings.MESSAGE_BULK_MAX_SIZE} messages can be sent at once.',
+            })
+        chatroom = self.get_chatroom_from_request(request)
+        if not isinstance(chatroom, Chatroom):
+            return Response({'Bad Request': 'Object not found!'}, status=status.HTTP_404_NOT_FOUND)
+
+        sender = request.user if isinstance(request.user, User) else None
+        child = BulkMessageSerializer()
+        messages, results = [], []
+        for item in items:
+            try:
+                validated_data = child.run_validation(item)
+            except ValidationError as error:
+                results.append({'errors': error.detail})
+                continue
+            message = Message(chatroom=chatroom, sender=sender, **validated_data)
+            messages.append(message)
+            results.append(message)
+
+        with transaction.atomic():
+            Message.objects.bulk_create(messages, batch_size=settings.MESSAGE_BULK_BATCH_SIZE)
+            if messages:
+                record_messages(chatroom.pk, len(messages), messages[-1])
+        self.publish_messages(request, chatroom, messages)
+
+        results = [{'id': result.pk} if isinstance(result, Message) else result for result in results]
+        return Response(
+            {'created': len(messages), 'failed': len(items) - len(messages), 'results': results},
+            status = status.HTTP_201_CREATED if messages else status.HTTP_400_BAD_REQUEST,
+        )
+
+    def publish_messages(self, request, chatroom, messages):
+        if not messages:
+            return
+        data = MessageSerializer(messages, many=True, context={'request': request}).data
+
+        def publish():
+            broker = get_broker()
+            for item in data:
+                broker.publish(chatroom.pk, item)
+
+        transaction.on_commit(publish)
+
+
+class ChatroomMessageExportViewMixin(ChatroomMessageListViewMixin):
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    export_fields = ['id', 'chatroom', 'sender', 'body', 'datetime']
+    export_chunk_size = 2000
+
+    def export_messages(self, request, *args, **kwargs):
+        """
+            Streams the whole transcript of the chatroom, oldest first, as
+            NDJSON (default) or CSV (?format=csv or 'Accept: text/csv').
+            Rows are read through a server-side cursor and serialized one by
+            one, so the memory used doesn't depend on the size of the room.
+        """
+        chatroom = self.get_chatroom_from_request(request)
+        if not isinstance(chatroom, Chatroom):
+            return Response({'Bad Request': 'Object not found!'}, status=status.HTTP_404_NOT_FOUND)
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.render_stream(self.get_export_rows(request, chatroom), self.export_fields),
+            content_type = f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="chatroom-{chatroom.pk}-messages.{renderer.format}"'
+        )
+        return response
+
+    def get_export_rows(self, request, chatroom):
+        # a single serializer, so the hyperlink templates are only resolved once
+        serializer = MessageSerializer(context={'request': request})
+        messages = chain(
+            ChatroomArchive(chatroom.pk).iterator(),
+            chatroom.messages.order_by('datetime', 'id').iterator(chunk_size=self.export_chunk_size),
+        )
+        for message in messages:
+            yield serializer.to_representation(message)
+
+
+class ChatroomReadCursorViewMixin(ChatroomMessageListViewMixin):
+
+    def get_read_message_id(self, request):
+        message_id = request.data.get('message')
+        if message_id is None:
+            return None
+        try:
+            message_id = int(message_id)
+        except (TypeError, ValueError):
+            raise ValidationError({'Bad Request': 'message must be a message id.'})
+        if message_id < 0:
+            raise ValidationError({'Bad Request': 'message must be a message id.'})
+        return message_id
+
+    def mark_as_read(self, request, *args, **kwargs):
+        """
+            Moves the read cursor of the user forward to the given 'message' id,
+            or to the latest message of the chatroom when it is omitted. The
+            cursor never moves backward and never past the latest message.
+        """
+        message_id = self.get_read_message_id(request)
+        chatroom = self.get_chatroom_from_request(request)
+        if not isinstance(chatroom, Chatroom):
+            return Response({'Bad Request': 'Object not found!'}, status=status.HTTP_404_NOT_FOUND)
+
+        # an index-only lookup on message_chatroom_id
+        latest_id = chatroom.messages.aggregate(latest=Max('id'))['latest'] or 0
+        message_id = latest_id if message_id is None else min(message_id, latest_id)
+        with transaction.atomic():
+            position = advance_read_cursor(request.user.pk, chatroom.pk, message_id)
+        return Response({
+            'chatroom': chatroom.pk,
+            'message': position,
+            'unread': chatroom.messages.filter(id__gt=position).count(),
+        }, status=status.HTTP_200_OK)
+
+
+class ChatroomAdminListViewMixin(ChatroomAdminListPermissionsMixin, UserMixin, ChatroomMixin, ConditionalGetMixin):
+    etag_resource = 'chatroom'
 
     def get_queryset(self, queryset=None):
         return super().get_queryset(queryset)
@@ -159,14 +606,12 @@ class ChatroomAdminListViewMixin(ChatroomAdminListPermissionsMixin, UserMixin, C
     def list_admins(self, request):
         chatroom = self.get_chatroom_from_request(request)
         if isinstance(chatroom, Chatroom):
-            serializer = UserSerializer(
-                self.get_queryset(queryset=chatroom.admins.all()),
-                many = True,
-            )
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return self.get_paginated_user_list(request, self.get_queryset(queryset=chatroom.admins.all()))
         return Response({'Bad Request': 'Object not found!'}, status=status.HTTP_404_NOT_FOUND)
 
     def perform_add_or_delete_admin(self, request):
+        if 'ids' in request.data:
+            return self.perform_bulk_membership_change(request, 'admins', required_relation='participants')
         chatroom = self.get_chatroom_from_request(request)
         if not isinstance(chatroom, Chatroom):
             return Response({'Bad Request': f'Chatroom not found!'}, status=status.HTTP_404_NOT_FOUND)
@@ -181,11 +626,11 @@ class ChatroomAdminListViewMixin(ChatroomAdminListPermissionsMixin, UserMixin, C
         if request.method == 'DELETE':
             chatroom.admins.remove(admin)
 
-        serializer = UserSerializer(chatroom.admins.all(), many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.list_admins(request)
 
 
-class ChatroomParticipantListViewMixin(ChatroomParticipantListPermissionsMixin, UserMixin, ChatroomMixin):
+class ChatroomParticipantListViewMixin(ChatroomParticipantListPermissionsMixin, UserMixin, ChatroomMixin, ConditionalGetMixin):
+    etag_resource = 'chatroom'
 
     def get_queryset(self, queryset=None):
         return super().get_queryset(queryset)
@@ -200,14 +645,12 @@ class ChatroomParticipantListViewMixin(ChatroomParticipantListPermissionsMixin,
     def list_participants(self, request):
         chatroom = self.get_chatroom_from_request(request)
         if isinstance(chatroom, Chatroom):
-            serializer = UserSerializer(
-                self.get_queryset(queryset=chatroom.participants.all()),
-                many = True,
-            )
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return self.get_paginated_user_list(request, self.get_queryset(queryset=chatroom.participants.all()))
         return Response({'Bad Request': 'Object not found!'}, status=status.HTTP_404_NOT_FOUND)
 
     def perform_add_or_delete_participant(self, request):
+        if 'ids' in request.data:
+            return self.perform_bulk_membership_change(request, 'participants')
         chatroom = self.get_chatroom_from_request(request)
         if not isinstance(chatroom, Chatroom):
             return Response({'Bad Request': f'Chatroom not found!'}, status=status.HTTP_404_NOT_FOUND)
@@ -220,5 +663,4 @@ class ChatroomParticipantListViewMixin(ChatroomParticipantListPermissionsMixin,
         if request.method == 'DELETE':
             chatroom.participants.remove(participant)
 
-        serializer = UserSerializer(chatroom.participants.all(), many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.list_participants(request)
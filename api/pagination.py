@@ -0,0 +1,319 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from json import dumps, loads
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils import timezone
+
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    """
+        Keyset (a.k.a. seek) pagination over a tuple of ordering fields.
+
+        Instead of OFFSET, every page is fetched with a range condition on the
+        ordering fields of the first or last row already seen, so the cost of
+        a request only depends on the page size. The position is exchanged
+        with the client through the opaque 'before' and 'after' cursors.
+
+        The last field of 'ordering' must be unique to break ties. Fields
+        prefixed with '-' are sorted in descending order. Sliced querysets
+        can't be filtered any further and are returned as a single page.
+    """
+    ordering = ('id',)
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    before_query_param = 'before'
+    after_query_param = 'after'
+
+    # When True, a request without cursors returns the newest page and the
+    # 'after' cursor is always emitted so clients can poll for newer rows.
+    follow_tail = False
+
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None, after=None):
+        """ 'after' overrides the cursor sent in the query params """
+        forward = self.start_pagination(queryset, request, after)
+        if forward is None:
+            self.page = list(queryset)
+            return self.page
+        if forward:
+            return self.paginate_forward(queryset, self.after)
+        return self.paginate_backward(queryset, self.before)
+
+    async def apaginate_queryset(self, queryset, request, view=None, after=None):
+        """ paginate_queryset for the async views, the rows are read with the async ORM """
+        forward = self.start_pagination(queryset, request, after)
+        if forward is None:
+            self.page = [row async for row in queryset]
+            return self.page
+        if forward:
+            return await self.apaginate_forward(queryset, self.after)
+        return await self.apaginate_backward(queryset, self.before)
+
+    def start_pagination(self, queryset, request, after):
+        """
+            Reads the page size and the cursors. Returns whether the page is
+            read forward (from 'after' or the first row) or backward (from
+            'before' or the last row), None for a sliced queryset.
+        """
+        self.request = request
+        self.model = queryset.model
+        self.page_size = self.get_page_size(request)
+        if queryset.query.is_sliced:
+            # ranked and capped results (e.g. the user search) come in a single page
+            self.raw_after = None
+            self.has_older = self.has_newer = False
+            return None
+        self.raw_after = after if after is not None else request.query_params.get(self.after_query_param)
+        self.before = self.decode_cursor(request.query_params.get(self.before_query_param) if after is None else None)
+        self.after = self.decode_cursor(self.raw_after)
+        if self.before is not None and self.after is not None:
+            raise ValidationError({
+                'Bad Request': f'Use either {self.before_query_param!r} or {self.after_query_param!r}, not both.',
+            })
+
+        return self.after is not None or (self.before is None and not self.follow_tail)
+
+    def paginate_forward(self, queryset, cursor):
+        return self.set_forward_page(list(self.get_forward_rows(queryset, cursor)), cursor)
+
+    async def apaginate_forward(self, queryset, cursor):
+        return self.set_forward_page([row async for row in self.get_forward_rows(queryset, cursor)], cursor)
+
+    def get_forward_rows(self, queryset, cursor):
+        """ One row more than the page, which tells whether there are newer rows """
+        if cursor is not None:
+            queryset = queryset.filter(self.build_keyset_filter(cursor, forward=True))
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def set_forward_page(self, rows, cursor):
+        self.has_older = cursor is not None
+        self.has_newer = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def paginate_backward(self, queryset, cursor):
+        return self.set_backward_page(list(self.get_backward_rows(queryset, cursor)), cursor)
+
+    async def apaginate_backward(self, queryset, cursor):
+        return self.set_backward_page([row async for row in self.get_backward_rows(queryset, cursor)], cursor)
+
+    def get_backward_rows(self, queryset, cursor):
+        """ One row more than the page, newest first, which tells whether there are older rows """
+        if cursor is not None:
+            queryset = queryset.filter(self.build_keyset_filter(cursor, forward=False))
+        reverse = [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+        return queryset.order_by(*reverse)[:self.page_size + 1]
+
+    def set_backward_page(self, rows, cursor):
+        self.has_older = len(rows) > self.page_size
+        self.has_newer = cursor is not None
+        self.page = rows[:self.page_size][::-1]
+        return self.page
+
+    def build_keyset_filter(self, cursor, forward):
+        """
+            Expands (f1, f2, ..., fn) > (v1, v2, ..., vn) into
+            f1 > v1 OR (f1 = v1 AND f2 > v2) OR ... so it works on every backend.
+        """
+        fields = self.get_field_names()
+        condition = Q()
+        for position, field in enumerate(fields):
+            descending = self.ordering[position].startswith('-')
+            lookup = 'gt' if forward != descending else 'lt'
+            equal = {name: cursor[index] for index, name in enumerate(fields[:position])}
+            condition |= Q(**equal, **{f'{field}__{lookup}': cursor[position]})
+        return condition
+
+    def get_field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            self.before_query_param: self.get_before_cursor(),
+            self.after_query_param: self.get_after_cursor(),
+            'results': data,
+        }
+
+    def get_before_cursor(self):
+        if not self.page or not self.has_older:
+            return None
+        return self.encode_cursor(self.page[0])
+
+    def get_after_cursor(self):
+        if not self.page:
+            return self.raw_after if self.follow_tail else None
+        if not (self.has_newer or self.follow_tail):
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_page_size(self, request):
+        page_size = request.query_params.get(self.page_size_query_param)
+        if page_size is None:
+            return self.page_size
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            raise ValidationError({'Bad Request': 'page_size must be an integer.'})
+        if page_size < 1:
+            raise ValidationError({'Bad Request': 'page_size must be greater than zero.'})
+        return min(page_size, self.max_page_size)
+
+    def get_cursor_values(self, instance):
+        return [getattr(instance, field) for field in self.get_field_names()]
+
+    def encode_cursor(self, instance):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in self.get_cursor_values(instance)
+        ]
+        return urlsafe_b64encode(dumps(values).encode()).decode()
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            values = loads(urlsafe_b64decode(encoded.encode()).decode())
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            # encode_cursor only writes strings and integers
+            if not all(isinstance(value, (str, int)) and not isinstance(value, bool) for value in values):
+                raise ValueError
+            # clean also checks the range of the integers
+            return [
+                self.get_cursor_field(field).clean(value, None)
+                for field, value in zip(self.get_field_names(), values)
+            ]
+        except (BinasciiError, UnicodeError, TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def validate_cursor(self, model, encoded):
+        """ Decodes a cursor of 'model' outside of a pagination, raises NotFound when invalid """
+        self.model = model
+        return self.decode_cursor(encoded)
+
+    def get_cursor_field(self, name):
+        """ The model field used to parse the cursor values of an ordering field """
+        return self.model._meta.get_field(name)
+
+
+class MessageListPagination(KeysetPagination):
+    """ Paginates messages of every chatroom on (datetime, id), oldest first """
+    ordering = ('datetime', 'id')
+
+
+class MessageCursorPagination(KeysetPagination):
+    """
+        Paginates a chatroom timeline on (datetime, id). Without cursors the
+        most recent page is returned; 'before' walks back into the history and
+        'after' returns the messages sent since the given cursor.
+
+        When 'archive' is set to the ChatroomArchive of the chatroom, pages
+        reaching past the oldest message of the table are completed with the
+        archived messages.
+    """
+    ordering = ('datetime', 'id')
+    follow_tail = True
+    archive = None
+
+    def paginate_forward(self, queryset, cursor):
+        super().paginate_forward(queryset, cursor)
+        if self.archive is None or cursor is None:
+            return self.page
+        return self.add_newer_archived(self.archive.newer(cursor, self.page_size + 1))
+
+    async def apaginate_forward(self, queryset, cursor):
+        await super().apaginate_forward(queryset, cursor)
+        if self.archive is None or cursor is None:
+            return self.page
+        return self.add_newer_archived(await self.aread_archive(self.archive.newer, cursor, self.page_size + 1))
+
+    def add_newer_archived(self, archived):
+        # archived messages are all older than the ones left in the table
+        if archived:
+            rows = archived + self.page
+            self.has_newer = self.has_newer or len(rows) > self.page_size
+            self.page = rows[:self.page_size]
+        return self.page
+
+    def paginate_backward(self, queryset, cursor):
+        """
+            With the MESSAGE_HOT_WINDOW setting, the page is first looked up in
+            the window preceding the cursor (or now), which lets PostgreSQL
+            prune the message partitions to the most recent months. The whole
+            history is only queried when the window doesn't fill the page.
+        """
+        if settings.MESSAGE_HOT_WINDOW is not None:
+            super().paginate_backward(self.get_hot_queryset(queryset, cursor), cursor)
+            if self.has_older:
+                return self.page
+        super().paginate_backward(queryset, cursor)
+        if self.archive is None or self.has_older:
+            return self.page
+        limit = self.page_size - len(self.page)
+        return self.add_older_archived(self.archive.older(self.get_archive_cursor(cursor), limit + 1), limit)
+
+    async def apaginate_backward(self, queryset, cursor):
+        if settings.MESSAGE_HOT_WINDOW is not None:
+            await super().apaginate_backward(self.get_hot_queryset(queryset, cursor), cursor)
+            if self.has_older:
+                return self.page
+        await super().apaginate_backward(queryset, cursor)
+        if self.archive is None or self.has_older:
+            return self.page
+        limit = self.page_size - len(self.page)
+        archived = await self.aread_archive(self.archive.older, self.get_archive_cursor(cursor), limit + 1)
+        return self.add_older_archived(archived, limit)
+
+    def get_hot_queryset(self, queryset, cursor):
+        upper_bound = cursor[0] if cursor is not None else timezone.now()
+        return queryset.filter(datetime__gte=upper_bound - settings.MESSAGE_HOT_WINDOW)
+
+    def get_archive_cursor(self, cursor):
+        """ The archive continues from the oldest message of the page """
+        return self.get_cursor_values(self.page[0]) if self.page else cursor
+
+    def add_older_archived(self, archived, limit):
+        self.has_older = len(archived) > limit
+        self.page = archived[:limit][::-1] + self.page
+        return self.page
+
+    async def aread_archive(self, read, cursor, limit):
+        """ The segments are read and decompressed in a worker thread, off the event loop """
+        return await sync_to_async(read, thread_sensitive=False)(cursor, limit)
+
+
+class ChatroomInboxPagination(KeysetPagination):
+    """
+        Paginates the chatrooms of a user on their last activity, most recent
+        first. The queryset must be annotated with 'activity', the
+        last_activity of the chatroom or a fixed timestamp for the chatrooms
+        without messages, which come last.
+    """
+    ordering = ('-activity', '-id')
+    page_size = 20
+    max_page_size = 100
+
+    def get_cursor_field(self, name):
+        if name == 'activity':
+            return self.model._meta.get_field('last_activity')
+        return super().get_cursor_field(name)
+
+
+class MessageSearchPagination(PageNumberPagination):
+    """ Search results are ranked, so they are paginated by page number """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
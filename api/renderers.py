@@ -0,0 +1,60 @@
+import csv
+from json import dumps
+
+from rest_framework.renderers import BaseRenderer
+
+
+class StreamRenderer(BaseRenderer):
+    """
+        Renderer of the streaming exports. render() handles the regular
+        responses (errors) while render_stream() turns an iterable of rows
+        into the chunks of a StreamingHttpResponse, one row at a time.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(self.render_stream(rows, fields=None)).encode(self.charset)
+
+    def render_stream(self, rows, fields):
+        raise NotImplementedError('render_stream() must be implemented.')
+
+
+class NDJSONRenderer(StreamRenderer):
+    """ Newline delimited JSON, one object per line """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render_stream(self, rows, fields):
+        for row in rows:
+            yield dumps(row, ensure_ascii=False) + '\n'
+
+
+class Echo:
+    """ File-like object handing back what the csv writer writes """
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(StreamRenderer):
+    """ CSV with a header line, 'fields' are the columns (the keys of the first row when None) """
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def render_stream(self, rows, fields):
+        writer = csv.writer(Echo())
+        rows = iter(rows)
+        if fields is None:
+            first = next(rows, None)
+            if first is None:
+                return
+            fields = list(first)
+            yield writer.writerow(fields)
+            yield writer.writerow([first.get(field) for field in fields])
+        else:
+            yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([row.get(field) for field in fields])
@@ -1,11 +1,54 @@
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from rest_framework import serializers
 
 from accounts.models import CustomUser as User
 from chatrooms.models import Chatroom, Message
 
+from api.fields import (
+    TemplatedHyperlinkedIdentityField,
+    TemplatedHyperlinkedRelatedField,
+)
 
-class UserSerializer(serializers.ModelSerializer):
+
+FIELDS_QUERY_PARAM = 'fields'
+
+
+def get_requested_fields(request):
+    """ The field names of ?fields=a,b on GET requests, None when not narrowed """
+    if request is None or request.method != 'GET':
+        return None
+    value = request.query_params.get(FIELDS_QUERY_PARAM)
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()} or None
+
+
+class SparseFieldsMixin:
+    """
+        Keeps only the fields listed in ?fields= in the representation. Nested
+        serializers are left whole, only the top-level serializer (or the
+        items of a top-level list) is narrowed.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = get_requested_fields(self.context.get('request'))
+        if requested is None or not self.is_top_level():
+            return fields
+        unknown = requested - {name for name, field in fields.items() if not field.write_only}
+        if unknown:
+            raise serializers.ValidationError({
+                'Bad Request': f'Unknown fields: {", ".join(sorted(unknown))}.',
+            })
+        return {name: field for name, field in fields.items() if name in requested}
+
+    def is_top_level(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = User
@@ -24,12 +67,13 @@ class UserSerializer(serializers.ModelSerializer):
         return super().save(**kwargs)
 
 
-class MessageSerializer(serializers.ModelSerializer):
-    chatroom = serializers.HyperlinkedRelatedField(
+class MessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # only the chatroom_id and sender_id columns are read to build the links
+    chatroom = TemplatedHyperlinkedRelatedField(
         read_only = True,
         view_name = 'api:chatroom-detail',
     )
-    sender = serializers.HyperlinkedRelatedField(
+    sender = TemplatedHyperlinkedRelatedField(
         read_only = True,
         view_name = 'api:user-detail',
     )
@@ -46,13 +90,13 @@ class MessageSerializer(serializers.ModelSerializer):
         }
 
 
-class ChatroomSerializer(serializers.ModelSerializer):
-    participants = serializers.HyperlinkedRelatedField(
+class ChatroomSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    participants = TemplatedHyperlinkedRelatedField(
         many = True,
         read_only = True,
         view_name = 'api:user-detail',
     )
-    admins = serializers.HyperlinkedRelatedField(
+    admins = TemplatedHyperlinkedRelatedField(
         many = True,
         read_only = True,
         view_name = 'api:user-detail',
@@ -67,8 +111,98 @@ class ChatroomSerializer(serializers.ModelSerializer):
         read_only = ['creation_date']
 
 
+class CompactChatroomSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+        Chatroom representation for large rooms: member counts and ids instead
+        of one hyperlink per member. The full member lists are served by the
+        participants and admins endpoints linked from the representation.
+    """
+    participant_count = serializers.SerializerMethodField()
+    admin_count = serializers.SerializerMethodField()
+    participant_ids = serializers.SerializerMethodField()
+    admin_ids = serializers.SerializerMethodField()
+    participants_url = TemplatedHyperlinkedIdentityField(view_name='api:chatroom-participants')
+    admins_url = TemplatedHyperlinkedIdentityField(view_name='api:chatroom-admins')
+
+    class Meta:
+        model = Chatroom
+        fields = [
+            'id', 'name', 'description', 'creation_date', 'public', 'min_age_required',
+            'participant_count', 'admin_count', 'participant_ids', 'admin_ids',
+            'participants_url', 'admins_url',
+        ]
+        read_only_fields = fields
+
+    def get_participant_count(self, obj):
+        return len(obj.participants.all())
+
+    def get_admin_count(self, obj):
+        return len(obj.admins.all())
+
+    def get_participant_ids(self, obj):
+        return [user.pk for user in obj.participants.all()]
+
+    def get_admin_ids(self, obj):
+        return [user.pk for user in obj.admins.all()]
+
+
+class LastMessageSerializer(serializers.ModelSerializer):
+    sender = TemplatedHyperlinkedRelatedField(
+        read_only = True,
+        view_name = 'api:user-detail',
+    )
+
+    class Meta:
+        model = Message
+        fields = ['id', 'sender', 'body', 'datetime']
+        read_only_fields = fields
+
+
+class ChatroomSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+        Chatroom representation for room pickers, read from the denormalized
+        counters (chatrooms.counters) and the last message joined in the same
+        query.
+    """
+    last_message = LastMessageSerializer(read_only=True)
+
+    class Meta:
+        model = Chatroom
+        fields = [
+            'id', 'name', 'description', 'public', 'participant_count',
+            'message_count', 'last_activity', 'last_message',
+        ]
+        read_only_fields = fields
+
+
 class ChatroomMessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Message
         fields = ['id', 'chatroom', 'sender', 'body']
+
+
+class BulkMessageSerializer(serializers.ModelSerializer):
+    """ One item of a bulk ingestion, the chatroom and the sender come from the request """
+
+    class Meta:
+        model = Message
+        fields = ['body']
+
+
+class MemberIdsSerializer(serializers.Serializer):
+    """ The user ids of a bulk membership change """
+    ids = serializers.ListField(
+        child = serializers.IntegerField(min_value=1),
+        allow_empty = False,
+        max_length = settings.CHATROOM_MEMBERSHIP_BULK_MAX_SIZE,
+    )
+
+
+class FriendIdsSerializer(serializers.Serializer):
+    """ The user ids of a bulk friendship change """
+    ids = serializers.ListField(
+        child = serializers.IntegerField(min_value=1),
+        allow_empty = False,
+        max_length = settings.FRIENDS_BULK_MAX_SIZE,
+    )
@@ -0,0 +1,45 @@
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from accounts.models import CustomUser as User
+from chatrooms.models import Chatroom
+
+from api.etags import bump_on_commit
+
+
+def get_user_chatroom_ids(user_id):
+    return Chatroom.objects.filter(
+        Q(participants=user_id) | Q(admins=user_id),
+    ).values_list('pk', flat=True).distinct()
+
+
+@receiver(post_save, sender=Chatroom)
+@receiver(post_delete, sender=Chatroom)
+def bump_chatroom(sender, instance, **kwargs):
+    bump_on_commit([('chatroom', instance.pk)])
+
+
+@receiver(m2m_changed, sender=Chatroom.participants.through)
+@receiver(m2m_changed, sender=Chatroom.admins.through)
+def bump_chatroom_members(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        chatroom_ids = [instance.pk]
+    elif pk_set is not None:
+        chatroom_ids = pk_set
+    else:
+        chatroom_ids = sender.objects.filter(customuser=instance).values_list('chatroom_id', flat=True)
+    bump_on_commit(('chatroom', chatroom_id) for chatroom_id in chatroom_ids)
+
+
+@receiver(post_save, sender=User)
+@receiver(pre_delete, sender=User)
+def bump_user(sender, instance, created=False, **kwargs):
+    # the member lists of the chatrooms of the user show the user as well.
+    # pre_delete, the memberships are gone after the delete
+    resources = [('user', instance.pk)]
+    if not created:
+        resources += [('chatroom', chatroom_id) for chatroom_id in get_user_chatroom_ids(instance.pk)]
+    bump_on_commit(resources)
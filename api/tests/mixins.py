@@ -1,4 +1,6 @@
+from django.core.cache import caches
 from django.urls import reverse
+from django.utils.http import urlencode
 from django.test import Client
 
 from rest_framework import status
@@ -17,7 +19,16 @@ class APIRequestFactoryMixin:
         return Request(self.factory.get('/'))
 
 
-class UserMixin:
+class ClearCacheMixin:
+    """ Cached lookups are keyed by ids, which the test database reuses between tests """
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        return super().setUp()
+
+
+class UserMixin(ClearCacheMixin):
     user_data = {
         'username': 'test_username',
         'first_name': 'test_first_name',
@@ -144,6 +155,17 @@ class ChatroomMixin:
             self.chatroom_data,
         )
 
+    def create_chatroom_list(self, count, member_count=3):
+        users = [
+            User.objects.create(username=f'member{index}', password='member_password')
+            for index in range(member_count)
+        ]
+        for index in range(count):
+            chatroom = Chatroom.objects.create(name=f'chatroom {index}')
+            chatroom.participants.set(users)
+            chatroom.admins.set(users[:1])
+        return users
+
     def get_single_chatroom_serializer(self):
         return serializers.ChatroomSerializer(
             Chatroom.objects.get(
@@ -162,13 +184,25 @@ class ChatroomMixin:
 
 class ChatroomMessageMixin:
 
-    def create_chatroom_message(self):
-        return self.client.post(
-            reverse(
-                'api:chatroom-messages',
-                kwargs={'pk': self.chatroom.pk},
-            ),
-            data = {'body': 'Message body'}
+    def create_chatroom_message(self, query=None):
+        url = reverse(
+            'api:chatroom-messages',
+            kwargs={'pk': self.chatroom.pk},
+        )
+        if query is not None:
+            url = f'{url}?{urlencode(query)}'
+        return self.client.post(url, data={'body': 'Message body'})
+
+    def create_message_list(self, count):
+        return [
+            Message.objects.create(body=f'message {index}', chatroom=self.chatroom, sender=self.sender)
+            for index in range(count)
+        ]
+
+    def get_single_chatroom_message_serializer(self, message_id):
+        return serializers.MessageSerializer(
+            Message.objects.get(pk=message_id),
+            context = {'request': self.request}
         )
 
     def get_chatroom_message_list_serializer(self):
@@ -45,7 +45,7 @@ class TestChatroomParticipantListEndpoint(SetUpMixin, TestCase):
         response = self.client.get(self.url)
         serializer = serializers.UserSerializer(self.chatroom.admins.all(), many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
         self.assertEqual(len(self.chatroom.admins.all()), 2)
 
     def test_post(self):
@@ -53,13 +53,28 @@ class TestChatroomParticipantListEndpoint(SetUpMixin, TestCase):
         response = self.client.post(self.url, {'id': self.admin.pk})
         serializer = serializers.UserSerializer(self.chatroom.admins.all(), many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
         self.assertEqual(len(self.chatroom.admins.all()), 2)
 
     def test_delete(self):
         response = self.client.delete(self.url, dumps({'id': self.admin.pk}), content_type='application/json')
         serializer = serializers.UserSerializer(self.chatroom.admins, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
         self.assertEqual(len(self.chatroom.admins.all()), 1)
 
+
+    def test_post_ids(self):
+        self.chatroom.admins.remove(self.admin)
+        outsider = User.objects.create(username='outsider', password='outsider_password')
+        response = self.client.post(
+            self.url, dumps({'ids': [self.admin.pk, outsider.pk]}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'added': [self.admin.pk],
+            'unchanged': [],
+            'not_found': [],
+            'not_participant': [outsider.pk],
+        })
+        self.assertEqual(self.chatroom.admins.count(), 2)
@@ -0,0 +1,82 @@
+from json import dumps
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+
+from accounts.models import CustomUser as User
+from api.broadcast import get_broker
+from chatrooms.models import Chatroom, Message
+from api.tests.mixins import (
+    UserMixin,
+    ChatroomMixin,
+)
+
+
+class SetUpMixin(UserMixin, ChatroomMixin):
+
+    def setUp(self):
+        self.user_response = self.create_user()
+        self.client = self.get_client_with_authorization_headers()
+        chatroom_response = self.create_chatroom()
+        self.chatroom = Chatroom.objects.get(pk=chatroom_response.data.get('id'))
+        self.sender = User.objects.get(pk=self.user_response.data.get('id'))
+        self.url = reverse('api:chatroom-messages-bulk', kwargs={'pk': self.chatroom.pk})
+        return super().setUp()
+
+    def post_messages(self, items):
+        return self.client.post(self.url, dumps(items), content_type='application/json')
+
+
+class TestChatroomMessageBulkEndpoint(SetUpMixin, TestCase):
+
+    def test_post(self):
+        response = self.post_messages([{'body': f'message {index}'} for index in range(3)])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        messages = list(Message.objects.filter(chatroom=self.chatroom, sender=self.sender).order_by('id'))
+        self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in messages])
+        self.assertEqual([m.body for m in messages], ['message 0', 'message 1', 'message 2'])
+
+    def test_post_per_item_errors(self):
+        response = self.post_messages([{'body': 'valid'}, {'body': ''}, 'not an object', {'body': 'x' * 1001}])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 3))
+        results = response.data['results']
+        self.assertIn('id', results[0])
+        self.assertIn('body', results[1]['errors'])
+        self.assertIn('non_field_errors', results[2]['errors'])
+        self.assertIn('body', results[3]['errors'])
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_post_all_invalid(self):
+        response = self.post_messages([{'body': ''}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['created'], 0)
+
+    @override_settings(MESSAGE_BULK_BATCH_SIZE=100)
+    def test_post_queries(self):
+        # user authentication, chatroom access, the savepoint and its release,
+        # one INSERT per batch of 100 and the chatroom counters
+        with self.assertNumQueries(8):
+            response = self.post_messages([{'body': f'message {index}'} for index in range(250)])
+        self.assertEqual(response.data['created'], 250)
+
+    def test_post_publishes(self):
+        received = []
+        subscription = get_broker().subscribe(self.chatroom.pk, received.append)
+        self.addCleanup(get_broker().unsubscribe, subscription)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_messages([{'body': 'first'}, {'body': 'second'}])
+        self.assertEqual([item['body'] for item in received], ['first', 'second'])
+
+    @override_settings(MESSAGE_BULK_MAX_SIZE=2)
+    def test_post_too_many(self):
+        response = self.post_messages([{'body': 'message'}] * 3)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Message.objects.exists())
+
+    def test_post_not_a_list(self):
+        response = self.post_messages({'body': 'message'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,65 @@
+import csv
+from io import StringIO
+from json import loads
+
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+
+from accounts.models import CustomUser as User
+from chatrooms.models import Chatroom
+from api.tests.mixins import (
+    APIRequestFactoryMixin,
+    UserMixin,
+    ChatroomMessageMixin,
+    ChatroomMixin,
+)
+
+
+class SetUpMixin(APIRequestFactoryMixin, UserMixin, ChatroomMessageMixin, ChatroomMixin):
+
+    def setUp(self):
+        self.request = self.get_api_request()
+        self.user_response = self.create_user()
+        self.client = self.get_client_with_authorization_headers()
+        chatroom_response = self.create_chatroom()
+        self.chatroom = Chatroom.objects.get(pk=chatroom_response.data.get('id'))
+        self.sender = User.objects.get(pk=self.user_response.data.get('id'))
+        self.url = reverse('api:chatroom-messages-export', kwargs={'pk': self.chatroom.pk})
+        return super().setUp()
+
+    def get_content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+
+class TestChatroomMessageExportEndpoint(SetUpMixin, TestCase):
+
+    def test_get_ndjson(self):
+        messages = self.create_message_list(3)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [loads(line) for line in self.get_content(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [m.pk for m in messages])
+        self.assertEqual(rows[0], self.get_single_chatroom_message_serializer(messages[0].pk).data)
+
+    def test_get_csv(self):
+        messages = self.create_message_list(2)
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(self.get_content(response))))
+        self.assertEqual([int(row['id']) for row in rows], [m.pk for m in messages])
+        self.assertEqual(rows[0]['body'], messages[0].body)
+
+    def test_get_empty_csv(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='text/csv')
+        self.assertEqual(self.get_content(response).strip(), 'id,chatroom,sender,body,datetime')
+
+    def test_get_not_a_participant(self):
+        self.chatroom.participants.remove(self.sender)
+        self.chatroom.admins.remove(self.sender)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
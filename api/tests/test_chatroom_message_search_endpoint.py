@@ -0,0 +1,48 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+
+from accounts.models import CustomUser as User
+from chatrooms.models import Chatroom, Message
+from api.tests.mixins import (
+    UserMixin,
+    ChatroomMixin,
+)
+
+
+class SetUpMixin(UserMixin, ChatroomMixin):
+
+    def setUp(self):
+        self.user_response = self.create_user()
+        self.client = self.get_client_with_authorization_headers()
+        chatroom_response = self.create_chatroom()
+        self.chatroom = Chatroom.objects.get(pk=chatroom_response.data.get('id'))
+        self.sender = User.objects.get(pk=self.user_response.data.get('id'))
+        self.url = reverse('api:chatroom-messages-search', kwargs={'pk': self.chatroom.pk})
+        return super().setUp()
+
+    def create_message(self, body):
+        return Message.objects.create(body=body, chatroom=self.chatroom, sender=self.sender)
+
+
+class TestChatroomMessageSearchEndpoint(SetUpMixin, TestCase):
+
+    def test_get(self):
+        scattered = self.create_message('the deploy went fine, then a release')
+        phrase = self.create_message('release deploy is done')
+        self.create_message('unrelated message')
+        response = self.client.get(self.url, {'q': 'release deploy'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([item['id'] for item in response.data['results']], [phrase.pk, scattered.pk])
+
+    def test_get_other_chatroom(self):
+        other = Chatroom.objects.create(name='other chatroom')
+        Message.objects.create(body='release', chatroom=other, sender=self.sender)
+        response = self.client.get(self.url, {'q': 'release'})
+        self.assertEqual(response.data['count'], 0)
+
+    def test_get_without_query(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,9 +1,21 @@
-from django.test import TestCase
-from django.urls import reverse
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from json import dumps
+from tempfile import TemporaryDirectory
+from threading import Timer
+from time import monotonic
+
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
 
 from rest_framework import status
 
 from accounts.models import CustomUser as User
+from api.broadcast import get_broker
+from api.views import AsyncChatroomMessageListView, ChatroomMessageListView
+from chatrooms.archive import archive_messages
 from chatrooms.models import Chatroom, Message
 from api.tests.mixins import (
     APIRequestFactoryMixin,
@@ -40,12 +52,237 @@ class TestChatroomMessageListEndpoint(SetUpMixin, TestCase):
         response = self.client.get(self.url)
         serializer = self.get_chatroom_message_list_serializer()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
+        self.assertIsNone(response.data['before'])
         self.assertEqual(User.objects.all().count(), 1)
 
+    def test_get_pages(self):
+        messages = self.create_message_list(5)
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in messages[3:]])
+
+        response = self.client.get(self.url, {'page_size': 2, 'before': response.data['before']})
+        self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in messages[1:3]])
+
+        response = self.client.get(self.url, {'page_size': 2, 'before': response.data['before']})
+        self.assertEqual([item['id'] for item in response.data['results']], [messages[0].pk])
+        self.assertIsNone(response.data['before'])
+
+    def test_get_after(self):
+        messages = self.create_message_list(3)
+        response = self.client.get(self.url, {'page_size': 1})
+        after = response.data['after']
+        newer = self.create_message_list(2)
+        response = self.client.get(self.url, {'after': after})
+        self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in newer])
+        response = self.client.get(self.url, {'after': response.data['after']})
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(len(messages), 3)
+
+    def test_get_queries(self):
+        self.create_message_list(3)
+        # user authentication, chatroom access and the page of messages
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 3)
+
+    @override_settings(MESSAGE_HOT_WINDOW=timedelta(days=30))
+    def test_get_hot_window(self):
+        old = self.create_message_list(2)
+        Message.objects.filter(pk__in=[m.pk for m in old]).update(datetime=timezone.now() - timedelta(days=60))
+        recent = self.create_message_list(3)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in recent[1:]])
+        # the window doesn't fill the page, the whole history is queried. The
+        # role of the user is cached by the first request
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'page_size': 4})
+        self.assertEqual([item['id'] for item in response.data['results']], [old[1].pk] + [m.pk for m in recent])
+
+    def test_get_archived(self):
+        messages = self.create_message_list(5)
+        for days, message in zip([90, 60, 30], messages[:3]):
+            Message.objects.filter(pk=message.pk).update(datetime=timezone.now() - timedelta(days=days))
+        with TemporaryDirectory() as root, self.settings(MESSAGE_ARCHIVE_ROOT=root):
+            archive_messages(timezone.now() - timedelta(days=1))
+            self.assertEqual(Message.objects.filter(chatroom=self.chatroom).count(), 2)
+
+            response = self.client.get(self.url, {'page_size': 3})
+            self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in messages[2:]])
+            response = self.client.get(self.url, {'page_size': 3, 'before': response.data['before']})
+            self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in messages[:2]])
+            self.assertIsNone(response.data['before'])
+
+            response = self.client.get(self.url, {'page_size': 2, 'after': response.data['after']})
+            self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in messages[2:4]])
+
+    def test_get_filtered_archived(self):
+        messages = self.create_message_list(3)
+        Message.objects.filter(pk__in=[m.pk for m in messages]).update(datetime=timezone.now() - timedelta(days=60))
+        keep = Message.objects.create(body='keep', chatroom=self.chatroom, sender=self.sender)
+        with TemporaryDirectory() as root, self.settings(MESSAGE_ARCHIVE_ROOT=root):
+            archive_messages(timezone.now() - timedelta(days=1))
+            response = self.client.get(self.url, {'sender': self.sender.username})
+            self.assertEqual([item['id'] for item in response.data['results']], [keep.pk])
+            self.assertIsNone(response.data['before'])
+            # without filters the archive completes the page
+            response = self.client.get(self.url)
+            self.assertEqual(len(response.data['results']), 4)
+
+    def test_get_invalid_cursor(self):
+        response = self.client.get(self.url, {'before': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_malformed_cursor(self):
+        datetime = timezone.now().isoformat()
+        for values in ([1, 1], [None, None], [datetime, None], [[datetime], {}], [datetime, True], [datetime, 2 ** 64]):
+            with self.subTest(values=values):
+                cursor = urlsafe_b64encode(dumps(values).encode()).decode()
+                response = self.client.get(self.url, {'before': cursor})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_post(self):
+        self.create_message_list(3)
         response = self.create_chatroom_message()
-        serializer = self.get_chatroom_message_list_serializer()
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        serializer = self.get_single_chatroom_message_serializer(response.data.get('id'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data, serializer.data)
-        self.assertTrue(Message.objects.filter(pk=response.data[0].get('id')).exists())
+        self.assertEqual(Message.objects.filter(chatroom=self.chatroom).count(), 4)
+
+    def test_post_since(self):
+        self.create_message_list(2)
+        after = self.client.get(self.url).data['after']
+        newer = self.create_message_list(1)
+        response = self.create_chatroom_message(query={'since': after})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [newer[0].pk, response.data['message']['id']],
+        )
+
+    def test_post_since_invalid_cursor(self):
+        response = self.create_chatroom_message(query={'since': 'zzz'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        # nothing was written, a retry doesn't duplicate the message
+        self.assertFalse(Message.objects.exists())
+        self.chatroom.refresh_from_db()
+        self.assertEqual(self.chatroom.message_count, 0)
+
+
+@override_settings(ROOT_URLCONF='config.asgi_urls')
+class TestAsyncChatroomMessageListEndpoint(SetUpMixin, TestCase):
+    """ The same endpoint served by its async view, as config.asgi does """
+
+    def setUp(self):
+        self.user_response = self.create_user()
+        # AsyncClient only sends the headers given to each request
+        self.headers = {'Authorization': f'JWT {self.get_access_token()}'}
+        self.async_client = AsyncClient()
+        self.client = self.get_client_with_authorization_headers()
+        chatroom_response = self.create_chatroom()
+        self.chatroom = Chatroom.objects.get(pk=chatroom_response.data.get('id'))
+        self.sender = User.objects.get(pk=self.user_response.data.get('id'))
+        super().setUp()
+        self.messages = self.create_message_list(5)
+
+    def test_resolve(self):
+        self.assertIs(resolve(self.url).func.view_class, AsyncChatroomMessageListView)
+        self.assertIs(resolve(self.url, urlconf='config.urls').func.view_class, ChatroomMessageListView)
+
+    async def test_get(self):
+        response = await self.async_client.get(self.url, {'page_size': 2}, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in self.messages[3:]])
+        response = await self.async_client.get(self.url, {'page_size': 2, 'before': response.data['before']}, headers=self.headers)
+        self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in self.messages[1:3]])
+
+    async def test_get_same_as_sync_view(self):
+        response = await self.async_client.get(self.url, headers=self.headers)
+        sync_url = reverse('api:chatroom-messages', urlconf='config.urls', kwargs={'pk': self.chatroom.pk})
+        sync_response = await sync_to_async(self.client.get)(sync_url)
+        self.assertEqual(response.data, sync_response.data)
+
+    async def test_get_unauthenticated(self):
+        response = await AsyncClient().get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_get_not_participant(self):
+        await self.chatroom.participants.aremove(self.sender)
+        await self.chatroom.admins.aremove(self.sender)
+        response = await self.async_client.get(self.url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_post(self):
+        response = await self.async_client.post(self.url, {'body': 'async body'}, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['body'], 'async body')
+        self.assertEqual(await Message.objects.filter(chatroom=self.chatroom).acount(), 6)
+        await self.chatroom.arefresh_from_db()
+        self.assertEqual(self.chatroom.message_count, 6)
+        self.assertEqual(self.chatroom.last_message_id, response.data['id'])
+
+    async def test_post_broadcast(self):
+        received = []
+        broker = get_broker()
+        subscription = broker.subscribe(self.chatroom.pk, received.append)
+        try:
+            response = await self.async_client.post(self.url, {'body': 'async body'}, headers=self.headers)
+        finally:
+            broker.unsubscribe(subscription)
+        self.assertEqual(received, [response.data])
+
+    async def test_get_archived(self):
+        messages = self.messages
+        for days, message in zip([90, 60, 30], messages[:3]):
+            await Message.objects.filter(pk=message.pk).aupdate(datetime=timezone.now() - timedelta(days=days))
+        with TemporaryDirectory() as root, self.settings(MESSAGE_ARCHIVE_ROOT=root):
+            await sync_to_async(archive_messages)(timezone.now() - timedelta(days=1))
+            response = await self.async_client.get(self.url, {'page_size': 3}, headers=self.headers)
+            self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in messages[2:]])
+            response = await self.async_client.get(
+                self.url, {'page_size': 3, 'before': response.data['before']}, headers=self.headers,
+            )
+            self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in messages[:2]])
+
+    async def test_post_since(self):
+        after = (await self.async_client.get(self.url, headers=self.headers)).data['after']
+        response = await self.async_client.post(f'{self.url}?since={after}', {'body': 'async body'}, headers=self.headers)
+        self.assertEqual([item['id'] for item in response.data['results']], [response.data['message']['id']])
+
+
+class TestChatroomMessageWaitEndpoint(SetUpMixin, TestCase):
+
+    def setUp(self):
+        self.user_response = self.create_user()
+        self.client = self.get_client_with_authorization_headers()
+        chatroom_response = self.create_chatroom()
+        self.chatroom = Chatroom.objects.get(pk=chatroom_response.data.get('id'))
+        self.sender = User.objects.get(pk=self.user_response.data.get('id'))
+        super().setUp()
+        self.create_message_list(1)
+        self.after = self.client.get(self.url).data['after']
+        self.url = reverse('api:chatroom-messages-wait', kwargs={'pk': self.chatroom.pk})
+
+    def test_get_returns_pending_messages(self):
+        messages = self.create_message_list(2)
+        response = self.client.get(self.url, {'after': self.after, 'timeout': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [m.pk for m in messages])
+
+    def test_get_timeout(self):
+        response = self.client.get(self.url, {'after': self.after, 'timeout': 0.05})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['after'], self.after)
+
+    def test_get_woken_by_broker(self):
+        Timer(0.1, get_broker().publish, args=(self.chatroom.pk, {})).start()
+        start = monotonic()
+        response = self.client.get(self.url, {'after': self.after, 'timeout': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLess(monotonic() - start, 5)
+
+    def test_get_without_cursor(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,109 @@
+from datetime import timedelta
+from json import loads
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.test import TestCase
+
+from accounts.models import CustomUser as User
+from accounts.tokens import RefreshToken
+from chatrooms.models import Chatroom
+from api.broadcast import get_broker
+from api.tests.mixins import (
+    UserMixin,
+    ChatroomMessageMixin,
+    ChatroomMixin,
+)
+from api.websocket import (
+    CLOSE_FORBIDDEN,
+    CLOSE_UNAUTHORIZED,
+    websocket_application,
+)
+
+
+class SetUpMixin(UserMixin, ChatroomMessageMixin, ChatroomMixin):
+
+    def setUp(self):
+        self.user_response = self.create_user()
+        self.client = self.get_client_with_authorization_headers()
+        chatroom_response = self.create_chatroom()
+        self.chatroom = Chatroom.objects.get(pk=chatroom_response.data.get('id'))
+        self.sender = User.objects.get(pk=self.user_response.data.get('id'))
+        return super().setUp()
+
+    def get_communicator(self, token=None):
+        scope = {
+            'type': 'websocket',
+            'path': f'/ws/chatrooms/{self.chatroom.pk}/messages',
+            'query_string': f'token={token if token is not None else self.token}'.encode(),
+            'headers': [],
+        }
+        return ApplicationCommunicator(websocket_application, scope)
+
+    def get_access_token_expiring_in(self, lifetime):
+        token = RefreshToken.for_user(self.sender).access_token
+        token.set_exp(lifetime=lifetime)
+        return str(token)
+
+    def send_message(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.create_chatroom_message()
+
+
+class TestChatroomMessageWebSocket(SetUpMixin, TestCase):
+
+    async def test_receive_message(self):
+        communicator = self.get_communicator()
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await communicator.receive_output(1))['type'], 'websocket.accept')
+
+        response = await sync_to_async(self.send_message)()
+        output = await communicator.receive_output(1)
+        self.assertEqual(output['type'], 'websocket.send')
+        self.assertEqual(loads(output['text']), response.data)
+
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait(1)
+
+    async def test_invalid_token(self):
+        communicator = self.get_communicator(token='invalid')
+        await communicator.send_input({'type': 'websocket.connect'})
+        output = await communicator.receive_output(1)
+        self.assertEqual(output, {'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+
+    async def test_not_a_participant(self):
+        await sync_to_async(self.chatroom.participants.remove)(self.sender)
+        communicator = self.get_communicator()
+        await communicator.send_input({'type': 'websocket.connect'})
+        output = await communicator.receive_output(1)
+        self.assertEqual(output, {'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+
+    async def test_removed_participant(self):
+        communicator = self.get_communicator()
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await communicator.receive_output(1))['type'], 'websocket.accept')
+
+        await sync_to_async(self.chatroom.participants.remove)(self.sender)
+        get_broker().publish(self.chatroom.pk, {'body': 'not sent'})
+        output = await communicator.receive_output(1)
+        self.assertEqual(output, {'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+
+    async def test_revoked_token(self):
+        communicator = self.get_communicator()
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await communicator.receive_output(1))['type'], 'websocket.accept')
+
+        self.sender.set_password('new_password')
+        await sync_to_async(self.sender.save)()
+        get_broker().publish(self.chatroom.pk, {'body': 'not sent'})
+        output = await communicator.receive_output(1)
+        self.assertEqual(output, {'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+
+    async def test_expired_token(self):
+        token = await sync_to_async(self.get_access_token_expiring_in)(timedelta(seconds=1))
+        communicator = self.get_communicator(token=token)
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await communicator.receive_output(1))['type'], 'websocket.accept')
+
+        output = await communicator.receive_output(3)
+        self.assertEqual(output, {'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
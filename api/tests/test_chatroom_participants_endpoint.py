@@ -42,20 +42,74 @@ class TestChatroomParticipantListEndpoint(SetUpMixin, TestCase):
         response = self.client.get(self.url)
         serializer = serializers.UserSerializer(self.chatroom.participants.all(), many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
         self.assertEqual(len(self.chatroom.participants.all()), 1)
 
+    def test_get_modified_by_bulk_changes(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        member = User.objects.create(username='member', password='member_password')
+        self.client.post(self.url, dumps({'ids': [member.pk]}), content_type='application/json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
     def test_post(self):
         self.chatroom.participants.remove(self.participant)
         response = self.client.post(self.url, {'id': self.participant.pk})
         serializer = serializers.UserSerializer(self.chatroom.participants.all(), many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
         self.assertEqual(len(self.chatroom.participants.all()), 1)
 
     def test_delete(self):
         response = self.client.delete(self.url, dumps({'id': self.participant.pk}), content_type='application/json')
         serializer = serializers.UserSerializer(self.chatroom.participants, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
         self.assertEqual(len(self.chatroom.participants.all()), 0)
+
+    def create_members(self, count):
+        return [
+            User.objects.create(username=f'member{index}', password='member_password')
+            for index in range(count)
+        ]
+
+    def test_post_ids(self):
+        members = self.create_members(3)
+        ids = [self.participant.pk] + [m.pk for m in members] + [9999]
+        # user authentication, chatroom access, users, the insert and the
+        # participant count
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url, dumps({'ids': ids}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'added': [m.pk for m in members],
+            'unchanged': [self.participant.pk],
+            'not_found': [9999],
+        })
+        self.assertEqual(self.chatroom.participants.count(), 4)
+
+    def test_delete_ids(self):
+        members = self.create_members(2)
+        self.chatroom.participants.add(*members)
+        ids = [m.pk for m in members]
+        response = self.client.delete(self.url, dumps({'ids': ids}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'removed': ids, 'unchanged': [], 'not_found': []})
+        self.assertEqual(list(self.chatroom.participants.all()), [self.participant])
+
+    def test_post_ids_invalid(self):
+        response = self.client.post(self.url, dumps({'ids': ['a']}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_post_ids_not_an_admin(self):
+        self.chatroom.admins.remove(self.participant)
+        members = self.create_members(1)
+        ids = [self.participant.pk, members[0].pk]
+        response = self.client.post(self.url, dumps({'ids': ids}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        # joining on one's own is still allowed
+        self.chatroom.participants.remove(self.participant)
+        response = self.client.post(self.url, dumps({'ids': [self.participant.pk]}), content_type='application/json')
+        self.assertEqual(response.data['added'], [self.participant.pk])
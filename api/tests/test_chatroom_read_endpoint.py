@@ -0,0 +1,108 @@
+from json import dumps
+
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+
+from accounts.models import CustomUser as User
+from chatrooms.models import Chatroom, Message, ReadCursor
+from api.tests.mixins import (
+    UserMixin,
+    ChatroomMixin,
+    ChatroomMessageMixin,
+)
+
+
+class SetUpMixin(UserMixin, ChatroomMixin, ChatroomMessageMixin):
+
+    def setUp(self):
+        self.user_response = self.create_user()
+        self.client = self.get_client_with_authorization_headers()
+        chatroom_response = self.create_chatroom()
+        self.chatroom = Chatroom.objects.get(pk=chatroom_response.data.get('id'))
+        self.sender = User.objects.get(pk=self.user_response.data.get('id'))
+        self.messages = self.create_message_list(5)
+        self.url = reverse('api:chatroom-read', kwargs={'pk': self.chatroom.pk})
+        self.unread_url = reverse('api:user-unread', kwargs={'pk': self.sender.pk})
+        return super().setUp()
+
+    def mark_as_read(self, message=None):
+        data = {} if message is None else {'message': message}
+        return self.client.post(self.url, dumps(data), content_type='application/json')
+
+
+class TestChatroomReadEndpoint(SetUpMixin, TestCase):
+
+    def test_post(self):
+        response = self.mark_as_read(self.messages[1].pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['message'], self.messages[1].pk)
+        self.assertEqual(response.data['unread'], 3)
+        cursor = ReadCursor.objects.get(user=self.sender, chatroom=self.chatroom)
+        self.assertEqual(cursor.message_id, self.messages[1].pk)
+
+    def test_post_without_message_reads_everything(self):
+        response = self.mark_as_read()
+        self.assertEqual(response.data['message'], self.messages[-1].pk)
+        self.assertEqual(response.data['unread'], 0)
+
+    def test_cursor_never_moves_backward(self):
+        self.mark_as_read(self.messages[3].pk)
+        response = self.mark_as_read(self.messages[0].pk)
+        self.assertEqual(response.data['message'], self.messages[3].pk)
+
+    def test_cursor_never_moves_past_the_latest_message(self):
+        response = self.mark_as_read(self.messages[-1].pk + 100)
+        self.assertEqual(response.data['message'], self.messages[-1].pk)
+
+    def test_post_invalid_message(self):
+        response = self.mark_as_read('latest')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_non_participant_cant_post(self):
+        self.chatroom.participants.remove(self.sender)
+        self.chatroom.admins.remove(self.sender)
+        response = self.mark_as_read()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TestUserUnreadEndpoint(SetUpMixin, TestCase):
+
+    def get_unread(self):
+        response = self.client.get(self.unread_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_get(self):
+        other = Chatroom.objects.create(name='other chatroom')
+        other.participants.add(self.sender)
+        Message.objects.create(body='elsewhere', chatroom=other, sender=self.sender)
+        self.mark_as_read(self.messages[2].pk)
+        self.assertEqual(self.get_unread(), {
+            'total': 3,
+            'chatrooms': [
+                {'chatroom': self.chatroom.pk, 'unread': 2},
+                {'chatroom': other.pk, 'unread': 1},
+            ],
+        })
+
+    def test_get_is_cached_until_a_write(self):
+        self.get_unread()
+        # the role of the user, their chatrooms and the counts are all cached
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_unread()['total'], 5)
+        self.create_chatroom_message()
+        self.assertEqual(self.get_unread()['total'], 6)
+        self.mark_as_read()
+        self.assertEqual(self.get_unread()['total'], 0)
+
+    def test_get_follows_membership_changes(self):
+        self.get_unread()
+        self.chatroom.participants.remove(self.sender)
+        self.assertEqual(self.get_unread(), {'total': 0, 'chatrooms': []})
+
+    def test_other_user_cant_get(self):
+        other = User.objects.create(username='other', password='other_password')
+        response = self.client.get(reverse('api:user-unread', kwargs={'pk': other.pk}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
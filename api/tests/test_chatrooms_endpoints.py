@@ -3,7 +3,8 @@ from django.urls import reverse
 
 from rest_framework import status
 
-from chatrooms.models import Chatroom
+from accounts.models import CustomUser as User
+from chatrooms.models import Chatroom, Message
 from api.tests.mixins import (
     APIRequestFactoryMixin,
     ChatroomMixin,
@@ -36,7 +37,72 @@ class TestChatroomListEndpoint(SetUpMixin, TestCase):
         response = self.client.get(self.url)
         serializer = self.get_list_chatroom_serializer()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
+
+    def test_get_compact(self):
+        users = self.create_chatroom_list(2)
+        response = self.client.get(self.url, {'representation': 'compact'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['participant_count'], len(users))
+        self.assertEqual(sorted(response.data['results'][0]['participant_ids']), sorted(user.pk for user in users))
+        self.assertTrue(response.data['results'][0]['participants_url'].endswith(
+            reverse('api:chatroom-participants', kwargs={'pk': response.data['results'][0]['id']})
+        ))
+
+    def test_get_queries(self):
+        self.create_chatroom_list(5)
+        # user authentication, chatrooms, participants and admins
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 5)
+        # the role of the user is cached by the first request
+        with self.assertNumQueries(3):
+            self.client.get(self.url, {'representation': 'compact'})
+
+    def test_get_paginated(self):
+        self.create_chatroom_list(3)
+        response = self.client.get(self.url, {'page_size': 2})
+        names = [item['name'] for item in response.data['results']]
+        response = self.client.get(self.url, {'page_size': 2, 'after': response.data['after']})
+        names += [item['name'] for item in response.data['results']]
+        self.assertEqual(names, ['chatroom 0', 'chatroom 1', 'chatroom 2'])
+        self.assertIsNone(response.data['after'])
+
+    def test_get_fields(self):
+        self.create_chatroom_list(5)
+        # user authentication and the chatrooms, the member lists aren't prefetched
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'fields': 'id,name'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'name'])
+        response = self.client.get(self.url, {'fields': 'name,admins'})
+        self.assertEqual(list(response.data['results'][0]), ['name', 'admins'])
+        self.assertEqual(len(response.data['results'][0]['admins']), 1)
+
+    def test_get_representation_fields(self):
+        self.create_chatroom_list(2)
+        for representation in ('default', 'compact', 'summary'):
+            with self.subTest(representation=representation):
+                query = {'fields': 'name', 'representation': representation}
+                response = self.client.get(self.url, query)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(list(response.data['results'][0]), ['name'])
+        response = self.client.get(self.url, {'fields': 'name,last_message', 'representation': 'summary'})
+        self.assertEqual(list(response.data['results'][0]), ['name', 'last_message'])
+
+    def test_get_summary(self):
+        users = self.create_chatroom_list(3)
+        chatroom = Chatroom.objects.get(name='chatroom 1')
+        message = Message.objects.create(chatroom=chatroom, sender=users[0], body='latest')
+        # user authentication and the chatrooms joined with their last message
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'representation': 'summary'})
+        summary = next(item for item in response.data['results'] if item['id'] == chatroom.pk)
+        self.assertEqual(summary['participant_count'], len(users))
+        self.assertEqual(summary['message_count'], 1)
+        self.assertEqual(summary['last_message']['id'], message.pk)
+        self.assertEqual(summary['last_message']['body'], 'latest')
+        self.assertIsNotNone(summary['last_activity'])
 
     def test_post(self):
         response = self.create_chatroom()
@@ -79,6 +145,52 @@ class TestChatroomDetailEndpoint(SetUpMixin, TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, serializer.data)
 
+    def test_get_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # the representation is part of the ETag
+        response = self.client.get(self.url, {'representation': 'compact'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_cached(self):
+        self.client.get(self.url)
+        # the chatroom access only, the response comes from the cache
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data, self.get_single_chatroom_serializer().data)
+
+    def test_get_modified_by_members(self):
+        etag = self.client.get(self.url)['ETag']
+        chatroom = Chatroom.objects.get(pk=self.chatroom.data.get('id'))
+        member = User.objects.create(username='member', password='member_password')
+        chatroom.participants.add(member)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['participants']), 2)
+        # deleting a member changes the chatroom as well
+        etag = response['ETag']
+        member.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.data['participants']), 1)
+
+    def test_get_representation_fields(self):
+        for representation in ('default', 'compact', 'summary'):
+            with self.subTest(representation=representation):
+                query = {'fields': 'name', 'representation': representation}
+                response = self.client.get(self.url, query)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.data, {'name': self.chatroom_data.get('name')})
+
+    def test_get_summary_modified_by_messages(self):
+        query = {'representation': 'summary'}
+        etag = self.client.get(self.url, query)['ETag']
+        chatroom = Chatroom.objects.get(pk=self.chatroom.data.get('id'))
+        Message.objects.create(chatroom=chatroom, sender=chatroom.participants.first(), body='new')
+        response = self.client.get(self.url, query, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['message_count'], 1)
+
     def test_delete(self):
         response = self.client.delete(self.url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
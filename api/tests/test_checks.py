@@ -0,0 +1,32 @@
+from django.test import SimpleTestCase, override_settings
+
+from api.broadcast import BaseBroker
+from api.checks import check_shared_broker, check_shared_caches
+
+
+class SharedCachesCheckTestCase(SimpleTestCase):
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_local_memory_cache(self):
+        messages = check_shared_caches(None)
+        self.assertTrue(messages)
+        self.assertEqual({message.id for message in messages}, {'api.W001'})
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}})
+    def test_shared_cache(self):
+        self.assertEqual(check_shared_caches(None), [])
+
+
+class SharedBrokerCheckTestCase(SimpleTestCase):
+
+    @override_settings(CHATROOM_BROKER_BACKEND='api.broadcast.InMemoryBroker')
+    def test_in_memory_broker(self):
+        self.assertEqual([message.id for message in check_shared_broker(None)], ['api.W002'])
+
+    @override_settings(CHATROOM_BROKER_BACKEND='api.tests.test_checks.SharedBroker')
+    def test_shared_broker(self):
+        self.assertEqual(check_shared_broker(None), [])
+
+
+class SharedBroker(BaseBroker):
+    pass
@@ -1,9 +1,11 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 
-from chatrooms.models import Message
+from chatrooms.models import Chatroom, Message
 from api.tests.mixins import (
     APIRequestFactoryMixin,
     MessageMixin,
@@ -38,7 +40,29 @@ class TestMessageListEndpoint(SetUpMixin, TestCase):
         response = self.client.get(self.url)
         serializer = self.get_list_message_serializer()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
+
+    def test_serializer_queries(self):
+        self.chatroom = self.create_chatroom()
+        Message.objects.bulk_create([
+            Message(chatroom_id=self.chatroom.data.get('id'), sender_id=self.user.data.get('id'), body='body')
+            for _ in range(1000)
+        ])
+        with self.assertNumQueries(1):
+            data = self.get_list_message_serializer().data
+        self.assertEqual(len(data), 1000)
+        self.assertTrue(data[0]['sender'].endswith(
+            reverse('api:user-detail', kwargs={'pk': self.user.data.get('id')})
+        ))
+
+    def test_get_fields(self):
+        self.chatroom = self.create_chatroom()
+        self.create_message()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'fields': 'id,sender'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'sender'])
+        # the pagination reads the datetime, the body isn't selected
+        self.assertNotIn('"body"', queries.captured_queries[-1]['sql'])
 
     def test_post(self):
         self.chatroom = self.create_chatroom()
@@ -90,3 +114,5 @@ class TestMessageDetailEndpoint(SetUpMixin, TestCase):
         response = self.client.delete(self.url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Message.objects.filter(pk=self.message_data.get('id')))
+        chatroom = Chatroom.objects.get(pk=self.chatroom.data.get('id'))
+        self.assertEqual((chatroom.message_count, chatroom.last_message_id), (0, None))
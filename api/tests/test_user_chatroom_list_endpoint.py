@@ -0,0 +1,93 @@
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from json import dumps
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from rest_framework import status
+
+from accounts.models import CustomUser as User
+from chatrooms.models import Chatroom, Message
+from api.tests.mixins import UserMixin
+
+
+class SetUpMixin(UserMixin):
+
+    def setUp(self):
+        self.user_response = self.create_user()
+        self.client = self.get_client_with_authorization_headers()
+        self.user = User.objects.get(pk=self.user_response.data.get('id'))
+        self.url = reverse('api:user-chatrooms', kwargs={'pk': self.user.pk})
+        return super().setUp()
+
+    def create_chatroom(self, name, minutes_ago=None):
+        chatroom = Chatroom.objects.create(name=name)
+        chatroom.participants.add(self.user)
+        if minutes_ago is not None:
+            message = Message.objects.create(body=f'in {name}', chatroom=chatroom, sender=self.user)
+            # Message.datetime is auto_now, moved back with an update
+            Message.objects.filter(pk=message.pk).update(datetime=timezone.now() - timedelta(minutes=minutes_ago))
+            Chatroom.objects.filter(pk=chatroom.pk).update(
+                last_message = message,
+                last_activity = timezone.now() - timedelta(minutes=minutes_ago),
+            )
+        return chatroom
+
+    def get_names(self, query=None):
+        url = self.url if query is None else f'{self.url}?{urlencode(query)}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [chatroom['name'] for chatroom in response.data['results']], response.data
+
+
+class TestUserChatroomListEndpoint(SetUpMixin, TestCase):
+
+    def test_get(self):
+        self.create_chatroom('old', minutes_ago=30)
+        self.create_chatroom('quiet')
+        self.create_chatroom('recent', minutes_ago=1)
+        Chatroom.objects.create(name='not joined')
+        names, data = self.get_names()
+        self.assertEqual(names, ['recent', 'old', 'quiet'])
+        self.assertEqual(data['results'][0]['last_message']['body'], 'in recent')
+        self.assertIsNone(data['results'][2]['last_message'])
+
+    def test_get_pages(self):
+        for index in range(5):
+            self.create_chatroom(f'chatroom {index}', minutes_ago=index + 1)
+        self.create_chatroom('quiet 1')
+        self.create_chatroom('quiet 2')
+        seen, query = [], {'page_size': 2}
+        while True:
+            names, data = self.get_names(query)
+            seen += names
+            if data['after'] is None:
+                break
+            query = {'page_size': 2, 'after': data['after']}
+        self.assertEqual(seen, [f'chatroom {index}' for index in range(5)] + ['quiet 2', 'quiet 1'])
+
+        names, data = self.get_names({'page_size': 2, 'before': data['before']})
+        self.assertEqual(names, ['chatroom 4', 'quiet 2'])
+
+    def test_get_malformed_cursor(self):
+        self.create_chatroom('recent', minutes_ago=1)
+        for values in ([1, 1], [None, None], [timezone.now().isoformat(), 'id'], ['not a datetime', 1]):
+            with self.subTest(values=values):
+                cursor = urlsafe_b64encode(dumps(values).encode()).decode()
+                response = self.client.get(self.url, {'after': cursor})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_queries(self):
+        for index in range(3):
+            self.create_chatroom(f'chatroom {index}', minutes_ago=index + 1)
+        # user authentication and the page with the last messages joined
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+    def test_other_user_cant_get(self):
+        other = User.objects.create(username='other', password='other_password')
+        response = self.client.get(reverse('api:user-chatrooms', kwargs={'pk': other.pk}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.test import TestCase
 from django.urls import reverse
 
@@ -38,8 +39,8 @@ class TestUserFriendListEndpoint(SetUpMixin, TestCase):
         response = self.client.get(self.url)
         serializer = self.get_friend_list_serializer()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
-        self.assertTrue(response.data != [])
+        self.assertEqual(response.data['results'], serializer.data)
+        self.assertTrue(response.data['results'] != [])
 
     def test_delete(self):
         response = self.client.delete(
@@ -49,7 +50,7 @@ class TestUserFriendListEndpoint(SetUpMixin, TestCase):
         )
         serializer = self.get_friend_list_serializer()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
         self.assertFalse(self.user.friends.filter(pk=self.target.pk).exists())
 
     def test_post(self):
@@ -60,7 +61,7 @@ class TestUserFriendListEndpoint(SetUpMixin, TestCase):
         )
         serializer = self.get_friend_list_serializer()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
         self.assertTrue(self.user.friends.filter(pk=self.target.pk).exists())
 
     def test_user_cant_be_user_friend(self):
@@ -71,5 +72,105 @@ class TestUserFriendListEndpoint(SetUpMixin, TestCase):
         )
         serializer = self.get_friend_list_serializer()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
         self.assertFalse(self.user.friends.filter(pk=self.user.pk).exists())
+
+    def test_post_does_not_clean_friends(self):
+        self.user.friends.remove(self.target)
+        # user authentication, friend lookup, the insert with its lookup of the
+        # existing rows and the friend list
+        with self.assertNumQueries(5):
+            self.client.post(self.url, dumps({'id': self.target.pk}), content_type='application/json')
+        self.assertTrue(self.user.friends.filter(pk=self.target.pk).exists())
+
+
+class TestUserFriendListBulkEndpoint(SetUpMixin, TestCase):
+
+    def last_setup(self):
+        self.create_user_list()
+        self.others = list(User.objects.exclude(pk=self.user.pk).order_by('pk'))
+        self.user.friends.add(self.others[0])
+        self.url = reverse('api:user-friends', kwargs={'pk': self.user.pk})
+
+    def test_post_ids(self):
+        ids = [other.pk for other in self.others] + [self.user.pk, 9999]
+        # user authentication, users and the insert
+        with self.assertNumQueries(3):
+            response = self.client.post(self.url, dumps({'ids': ids}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'added': [other.pk for other in self.others[1:]],
+            'unchanged': [self.others[0].pk],
+            'not_found': [9999],
+        })
+        self.assertEqual(self.user.friends.count(), len(self.others))
+
+    def test_post_too_many_ids(self):
+        ids = list(range(1, settings.FRIENDS_BULK_MAX_SIZE + 2))
+        response = self.client.post(self.url, dumps({'ids': ids}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.user.friends.count(), 1)
+
+    def test_delete_ids(self):
+        response = self.client.delete(
+            self.url, dumps({'ids': [self.others[0].pk, self.others[1].pk]}), content_type='application/json',
+        )
+        self.assertEqual(response.data, {'removed': [self.others[0].pk], 'unchanged': [self.others[1].pk], 'not_found': []})
+        self.assertFalse(self.user.friends.exists())
+
+
+class TestUserMutualFriendsEndpoint(SetUpMixin, TestCase):
+
+    def last_setup(self):
+        self.create_user_list()
+        self.others = list(User.objects.exclude(pk=self.user.pk).order_by('pk'))
+        self.user.friends.add(*self.others[1:3])
+        self.others[0].friends.add(*self.others[2:])
+        self.url = reverse('api:user-mutual-friends', kwargs={'pk': self.others[0].pk})
+
+    def test_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.others[2].pk])
+
+    def test_get_cached(self):
+        self.client.get(self.url)
+        # the users, the role of the user and the mutual ids come from the cache
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_get_invalidated(self):
+        self.client.get(self.url)
+        self.user.friends.add(self.others[3])
+        response = self.client.get(self.url)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.others[2].pk, self.others[3].pk])
+
+
+class TestUserFriendSuggestionsEndpoint(SetUpMixin, TestCase):
+
+    def last_setup(self):
+        self.create_user_list()
+        self.others = list(User.objects.exclude(pk=self.user.pk).order_by('pk'))
+        self.user.friends.add(*self.others[:2])
+        self.others[0].friends.add(*self.others[2:])
+        self.others[1].friends.add(self.others[2])
+        self.url = reverse('api:user-friend-suggestions', kwargs={'pk': self.user.pk})
+
+    def test_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['id'], item['mutual_friends']) for item in response.data],
+            [(self.others[2].pk, 2), (self.others[3].pk, 1)],
+        )
+
+    def test_get_limit_and_invalidation(self):
+        self.client.get(self.url)
+        self.user.friends.add(self.others[2])
+        response = self.client.get(self.url, {'limit': 1})
+        self.assertEqual([item['id'] for item in response.data], [self.others[3].pk])
+
+    def test_get_other_user(self):
+        url = reverse('api:user-friend-suggestions', kwargs={'pk': self.others[0].pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
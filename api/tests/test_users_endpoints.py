@@ -1,4 +1,6 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -25,7 +27,64 @@ class TestUserListEndpoint(SetUpMixin, TestCase):
         response = self.client.get(self.url)
         serializer = self.get_list_user_serializer()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
+
+    def test_get_search(self):
+        for username, first_name in [('annabel', ''), ('ann', ''), ('joanne', 'Anna'), ('bob', 'Bo')]:
+            User.objects.create(username=username, first_name=first_name, email=f'{username}@localhost.com')
+        response = self.client.get(self.url, {'q': 'ANN'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([user['username'] for user in response.data['results']], ['ann', 'annabel', 'joanne'])
+
+    @override_settings(USER_SEARCH_MAX_RESULTS=2)
+    def test_get_search_cap(self):
+        for index in range(5):
+            User.objects.create(username=f'capped{index}')
+        response = self.client.get(self.url, {'q': 'capped'})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_get_search_limit(self):
+        for index in range(3):
+            User.objects.create(username=f'limited{index}')
+        response = self.client.get(self.url, {'q': 'limited', 'limit': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        # non-positive limits return a single user
+        response = self.client.get(self.url, {'q': 'limited', 'limit': -5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_get_search_invalid_limit(self):
+        response = self.client.get(self.url, {'q': 'limited', 'limit': 'two'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'Bad Request': 'limit must be an integer.'})
+
+    def test_get_paginated(self):
+        users = [User.objects.create(username=f'paged{index}') for index in range(4)]
+        response = self.client.get(self.url, {'page_size': 3})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNone(response.data['before'])
+        response = self.client.get(self.url, {'page_size': 3, 'after': response.data['after']})
+        self.assertEqual([user['id'] for user in response.data['results']], [user.pk for user in users[2:]])
+        self.assertIsNone(response.data['after'])
+
+    def test_get_search_single_page(self):
+        User.objects.create(username='ranked')
+        response = self.client.get(self.url, {'q': 'ranked', 'page_size': 1})
+        self.assertEqual(response.data, {'before': None, 'after': None, 'results': response.data['results']})
+
+    def test_get_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'fields': 'id,username'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data['results'][0]), ['id', 'username'])
+        # the other columns aren't selected
+        select = queries.captured_queries[-1]['sql']
+        self.assertIn('"username"', select)
+        self.assertNotIn('"email"', select)
+
+    def test_get_unknown_fields(self):
+        response = self.client.get(self.url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_post(self):
         self.user_data['username'] = 'new_test_username'
@@ -63,6 +122,29 @@ class TestUserDetailEndpoint(SetUpMixin, TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, serializer.data)
 
+    def test_get_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        # the role of the user and the resource version are cached
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_get_version_expired(self):
+        with self.settings(RESPONSE_VERSION_TIMEOUT=0):
+            etag = self.client.get(self.url)['ETag']
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_get_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(self.url, {'bio': 'new bio'}, content_type='application/json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['bio'], 'new bio')
+
     def test_delete(self):
         response = self.client.delete(self.url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
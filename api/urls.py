@@ -8,6 +8,10 @@ urlpatterns = [
     path('users', views.UserListView.as_view(), name='users'),
     path('users/<int:pk>', views.UserDetailView.as_view(), name='user-detail'),
     path('users/<int:pk>/friends', views.UserFriendListView.as_view(), name='user-friends'),
+    path('users/<int:pk>/friends/mutual', views.UserMutualFriendListView.as_view(), name='user-mutual-friends'),
+    path('users/<int:pk>/friends/suggestions', views.UserFriendSuggestionListView.as_view(), name='user-friend-suggestions'),
+    path('users/<int:pk>/chatrooms', views.UserChatroomListView.as_view(), name='user-chatrooms'),
+    path('users/<int:pk>/unread', views.UserUnreadCountView.as_view(), name='user-unread'),
 
     path('messages', views.MessageListView.as_view(), name='messages'),
     path('messages/<int:pk>', views.MessageDetailView.as_view(), name='message-detail'),
@@ -15,6 +19,11 @@ urlpatterns = [
     path('chatrooms', views.ChatroomListView.as_view(), name='chatrooms'),
     path('chatrooms/<int:pk>', views.ChatroomDetailView.as_view(), name='chatroom-detail'),
     path('chatrooms/<int:pk>/messages', views.ChatroomMessageListView.as_view(), name='chatroom-messages'),
+    path('chatrooms/<int:pk>/messages/wait', views.ChatroomMessageWaitView.as_view(), name='chatroom-messages-wait'),
+    path('chatrooms/<int:pk>/messages/search', views.ChatroomMessageSearchView.as_view(), name='chatroom-messages-search'),
+    path('chatrooms/<int:pk>/messages/bulk', views.ChatroomMessageBulkView.as_view(), name='chatroom-messages-bulk'),
+    path('chatrooms/<int:pk>/messages/export', views.ChatroomMessageExportView.as_view(), name='chatroom-messages-export'),
+    path('chatrooms/<int:pk>/read', views.ChatroomReadCursorView.as_view(), name='chatroom-read'),
     path('chatrooms/<int:pk>/admins', views.ChatroomAdminListView.as_view(), name='chatroom-admins'),
     path('chatrooms/<int:pk>/participants', views.ChatroomParticipantListView.as_view(), name='chatroom-participants'),
 ]
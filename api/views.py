@@ -17,11 +17,21 @@ from api.mixins.views import (
     UserListViewMixin,
     UserDetailViewMixin,
     UserFriendListMixin,
+    UserMutualFriendListViewMixin,
+    UserFriendSuggestionListViewMixin,
+    UserChatroomListViewMixin,
+    UserUnreadCountViewMixin,
     MessageListViewMixin,
     MessageDetailViewMixin,
     ChatroomListViewMixin,
     ChatroomDetailViewMixin,
     ChatroomMessageListViewMixin,
+    AsyncChatroomMessageListViewMixin,
+    ChatroomMessageWaitViewMixin,
+    ChatroomMessageSearchViewMixin,
+    ChatroomMessageBulkViewMixin,
+    ChatroomMessageExportViewMixin,
+    ChatroomReadCursorViewMixin,
     ChatroomParticipantListViewMixin,
     ChatroomAdminListViewMixin,
 )
@@ -38,6 +48,9 @@ class UserDetailView(UserDetailViewMixin, RetrieveUpdateDestroyAPIView):
     queryset = model.objects.all()
     serializer_class = UserSerializer
 
+    def get(self, request, *args, **kwargs):
+        return self.conditional_get(request, self.retrieve, *args, **kwargs)
+
 
 class UserFriendListView(UserFriendListMixin, APIView):
 
@@ -51,6 +64,30 @@ class UserFriendListView(UserFriendListMixin, APIView):
         return self.perform_add_or_delete_friend(request, *args, **kwargs)
 
 
+class UserMutualFriendListView(UserMutualFriendListViewMixin, APIView):
+
+    def get(self, request, *args, **kwargs):
+        return self.list_mutual_friends(request, *args, **kwargs)
+
+
+class UserFriendSuggestionListView(UserFriendSuggestionListViewMixin, APIView):
+
+    def get(self, request, *args, **kwargs):
+        return self.list_friend_suggestions(request, *args, **kwargs)
+
+
+class UserChatroomListView(UserChatroomListViewMixin, APIView):
+
+    def get(self, request, *args, **kwargs):
+        return self.list_chatrooms(request, *args, **kwargs)
+
+
+class UserUnreadCountView(UserUnreadCountViewMixin, APIView):
+
+    def get(self, request, *args, **kwargs):
+        return self.list_unread_counts(request, *args, **kwargs)
+
+
 class MessageListView(MessageListViewMixin, ListCreateAPIView):
     model = Message
     queryset = model.objects.all()
@@ -77,6 +114,9 @@ class ChatroomDetailView(ChatroomDetailViewMixin, RetrieveUpdateDestroyAPIView):
     queryset = model.objects.all()
     serializer_class = ChatroomSerializer
 
+    def get(self, request, *args, **kwargs):
+        return self.conditional_get(request, self.retrieve, *args, **kwargs)
+
 
 class ChatroomMessageListView(ChatroomMessageListViewMixin, APIView):
 
@@ -87,10 +127,50 @@ class ChatroomMessageListView(ChatroomMessageListViewMixin, APIView):
         return self.send_message(request, *args, **kwargs)
 
 
+class AsyncChatroomMessageListView(AsyncChatroomMessageListViewMixin, APIView):
+    """ ChatroomMessageListView for config.asgi, see config.asgi_urls """
+
+    async def get(self, request, *args, **kwargs):
+        return await self.alist_messages(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.asend_message(request, *args, **kwargs)
+
+
+class ChatroomMessageWaitView(ChatroomMessageWaitViewMixin, APIView):
+
+    def get(self, request, *args, **kwargs):
+        return self.wait_for_messages(request, *args, **kwargs)
+
+
+class ChatroomMessageSearchView(ChatroomMessageSearchViewMixin, APIView):
+
+    def get(self, request, *args, **kwargs):
+        return self.search_messages(request, *args, **kwargs)
+
+
+class ChatroomMessageBulkView(ChatroomMessageBulkViewMixin, APIView):
+
+    def post(self, request, *args, **kwargs):
+        return self.bulk_send_messages(request, *args, **kwargs)
+
+
+class ChatroomMessageExportView(ChatroomMessageExportViewMixin, APIView):
+
+    def get(self, request, *args, **kwargs):
+        return self.export_messages(request, *args, **kwargs)
+
+
+class ChatroomReadCursorView(ChatroomReadCursorViewMixin, APIView):
+
+    def post(self, request, *args, **kwargs):
+        return self.mark_as_read(request, *args, **kwargs)
+
+
 class ChatroomAdminListView(ChatroomAdminListViewMixin, APIView):
 
     def get(self, request, *args, **kwrags):
-        return self.list_admins(request)
+        return self.conditional_get(request, self.list_admins)
 
     def post(self, request, *args, **kwrags):
         return self.perform_add_or_delete_admin(request)
@@ -102,7 +182,7 @@ class ChatroomAdminListView(ChatroomAdminListViewMixin, APIView):
 class ChatroomParticipantListView(ChatroomParticipantListViewMixin, APIView):
 
     def get(self, request, *args, **kwrags):
-        return self.list_participants(request)
+        return self.conditional_get(request, self.list_participants)
 
     def post(self, request, *args, **kwrags):
         return self.perform_add_or_delete_participant(request)
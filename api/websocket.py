@@ -0,0 +1,141 @@
+import asyncio
+import re
+from json import dumps
+from time import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from rest_framework import HTTP_HEADER_ENCODING
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from accounts.authentication import StatelessJWTAuthentication
+from chatrooms.membership import get_membership
+
+from api.broadcast import get_broker
+
+
+CHATROOM_MESSAGES_PATH = re.compile(r'^/ws/chatrooms/(?P<pk>\d+)/messages/?$')
+
+# Close codes sent instead of accepting the handshake, the unauthorized and
+# forbidden ones also close accepted sockets (see stream_messages)
+CLOSE_NOT_FOUND = 4404
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+
+
+class ChatroomMessageConsumer:
+    """
+        ASGI application that pushes the messages of a chatroom to a WebSocket.
+
+        Clients connect to /ws/chatrooms/<pk>/messages with the access token
+        either in the 'Authorization' header (the same as the REST API) or in
+        the 'token' query param, since browsers can't set WebSocket headers.
+        Only participants of the chatroom are accepted. Every message created
+        in the room is then sent as a JSON text frame with the same
+        representation as the REST API, until the access token expires or is
+        revoked, or the user leaves the chatroom.
+    """
+    authentication_class = StatelessJWTAuthentication
+
+    async def __call__(self, scope, receive, send):
+        match = CHATROOM_MESSAGES_PATH.match(scope['path'])
+        event = await receive()
+        if event['type'] != 'websocket.connect':
+            return
+        if match is None:
+            await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+            return
+
+        chatroom_id = int(match.group('pk'))
+        authenticated = await self.authenticate(scope)
+        if authenticated is None:
+            await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+            return
+        user, validated_token = authenticated
+        if not await self.has_permission(user, chatroom_id):
+            await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+            return
+
+        await send({'type': 'websocket.accept'})
+        await self.stream_messages(chatroom_id, validated_token, receive, send)
+
+    def get_raw_token(self, scope):
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if token:
+            return token[0].encode(HTTP_HEADER_ENCODING)
+        headers = dict(scope.get('headers', []))
+        header = headers.get(b'authorization')
+        if header is None:
+            return None
+        return self.authentication_class().get_raw_token(header)
+
+    async def authenticate(self, scope):
+        """ Returns the (user, validated_token) pair of the scope, or None """
+        authentication = self.authentication_class()
+        try:
+            raw_token = self.get_raw_token(scope)
+            if raw_token is None:
+                return None
+            validated_token = authentication.get_validated_token(raw_token)
+            return await sync_to_async(authentication.get_user)(validated_token), validated_token
+        except (InvalidToken, AuthenticationFailed):
+            return None
+
+    async def has_permission(self, user, chatroom_id):
+        membership = await sync_to_async(get_membership)(chatroom_id, user.pk)
+        return membership.is_participant
+
+    async def get_close_code(self, chatroom_id, validated_token):
+        """ Checked again before every message: None while the socket may stay open """
+        try:
+            user = await sync_to_async(self.authentication_class().get_user)(validated_token)
+        except (InvalidToken, AuthenticationFailed):
+            return CLOSE_UNAUTHORIZED
+        if not await self.has_permission(user, chatroom_id):
+            return CLOSE_FORBIDDEN
+        return None
+
+    async def stream_messages(self, chatroom_id, validated_token, receive, send):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        broker = get_broker()
+        subscription = broker.subscribe(
+            chatroom_id,
+            lambda message: loop.call_soon_threadsafe(queue.put_nowait, message),
+        )
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        expired = asyncio.ensure_future(asyncio.sleep(max(0, validated_token['exp'] - time())))
+        try:
+            while True:
+                message = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait(
+                    [message, disconnected, expired],
+                    return_when = asyncio.FIRST_COMPLETED,
+                )
+                if disconnected in done:
+                    message.cancel()
+                    break
+                if expired in done:
+                    message.cancel()
+                    await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+                    break
+                code = await self.get_close_code(chatroom_id, validated_token)
+                if code is not None:
+                    await send({'type': 'websocket.close', 'code': code})
+                    break
+                await send({'type': 'websocket.send', 'text': dumps(message.result())})
+        finally:
+            disconnected.cancel()
+            expired.cancel()
+            broker.unsubscribe(subscription)
+
+    async def wait_for_disconnect(self, receive):
+        """ Incoming frames are ignored, the socket is push-only """
+        while True:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                return
+
+
+websocket_application = ChatroomMessageConsumer()
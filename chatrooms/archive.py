@@ -0,0 +1,324 @@
+"""
+    Cold storage of old chatroom messages.
+
+    The archive_messages command moves the messages older than the retention
+    horizon out of the message table into gzip-compressed JSON lines segments,
+    one per chatroom and month:
+
+        MESSAGE_ARCHIVE_ROOT/<chatroom id>/<YYYY-MM>.jsonl.gz
+
+    Segments are append-only. Every archive run adds a gzip member at the end
+    of the segment, and gzip readers see the members as a single stream.
+    MESSAGE_ARCHIVE_ROOT/<chatroom id>/index.json records the offset, length
+    and first and last (datetime, id) key of every member, whose messages
+    are written in key order.
+
+    Archived messages keep their id, so ChatroomArchive can serve them as
+    (unsaved) Message instances to the timeline pagination.
+"""
+import gzip
+import os
+import shutil
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime, timezone
+from json import dumps, loads
+from operator import attrgetter
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from chatrooms.counters import counting_deletes, forget_messages
+from chatrooms.models import Message
+
+
+SEGMENT_SUFFIX = '.jsonl.gz'
+INDEX_NAME = 'index.json'
+
+Member = namedtuple('Member', ['first', 'last', 'path', 'offset', 'length'])
+
+# {chatroom directory: (index file version, members)}, see get_members
+indexes = {}
+
+
+def get_archive_root():
+    return Path(settings.MESSAGE_ARCHIVE_ROOT)
+
+
+def get_chatroom_directory(chatroom_id):
+    return get_archive_root() / str(chatroom_id)
+
+
+def get_month(value):
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def get_segment_path(chatroom_id, month):
+    return get_chatroom_directory(chatroom_id) / f'{month:%Y-%m}{SEGMENT_SUFFIX}'
+
+
+def list_segments(chatroom_id):
+    """ Returns the (month, path) of the segments of a chatroom, oldest first """
+    directory = get_chatroom_directory(chatroom_id)
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    segments = []
+    for name in names:
+        if name.endswith(SEGMENT_SUFFIX):
+            month = datetime.strptime(name[:-len(SEGMENT_SUFFIX)], '%Y-%m').replace(tzinfo=timezone.utc)
+            segments.append((month, directory / name))
+    return sorted(segments)
+
+
+def dump_message(message):
+    return dumps({
+        'id': message.id,
+        'chatroom': message.chatroom_id,
+        'sender': message.sender_id,
+        'body': message.body,
+        'datetime': message.datetime.isoformat(),
+    })
+
+
+def load_message(line):
+    data = loads(line)
+    return Message(
+        id = data['id'],
+        chatroom_id = data['chatroom'],
+        sender_id = data['sender'],
+        body = data['body'],
+        datetime = parse_datetime(data['datetime']),
+    )
+
+
+def get_key(message):
+    return message.datetime, message.id
+
+
+def dump_key(key):
+    return [key[0].isoformat(), key[1]]
+
+
+def load_key(data):
+    return parse_datetime(data[0]), data[1]
+
+
+def read_segment(path):
+    """
+        Returns the messages of a segment ordered by (datetime, id). A run
+        interrupted between writing a segment and committing the deletion
+        archives the same messages again, so duplicates are skipped.
+    """
+    messages = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as segment:
+        for line in segment:
+            if line.strip():
+                message = load_message(line)
+                messages[message.id] = message
+    return sorted(messages.values(), key=get_key)
+
+
+def write_member(raw, messages):
+    """ Writes the messages as a gzip member at the end of 'raw', returns its index entry """
+    messages = sorted(messages, key=get_key)
+    offset = raw.seek(0, os.SEEK_END)
+    with gzip.GzipFile(fileobj=raw, mode='wb') as member:
+        for message in messages:
+            member.write(dump_message(message).encode('utf-8') + b'\n')
+    raw.flush()
+    # flushed once the gzip member is closed, before the rows get deleted
+    os.fsync(raw.fileno())
+    return {
+        'offset': offset,
+        'length': raw.tell() - offset,
+        'first': dump_key(get_key(messages[0])),
+        'last': dump_key(get_key(messages[-1])),
+    }
+
+
+def read_index(directory):
+    """
+        Returns the index entries of a chatroom directory, one per gzip member:
+        {'segment': name, 'offset', 'length', 'first': key, 'last': key}.
+        Directories archived before the index existed get indexed first.
+    """
+    try:
+        with open(directory / INDEX_NAME, encoding='utf-8') as file:
+            return loads(file.read())
+    except FileNotFoundError:
+        if not directory.is_dir():
+            return []
+    return build_index(directory)
+
+
+def write_index(directory, entries):
+    path = directory / INDEX_NAME
+    temporary = path.with_suffix('.tmp')
+    with open(temporary, 'w', encoding='utf-8') as file:
+        file.write(dumps(entries))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def build_index(directory):
+    """ Rewrites every segment of a directory as a single sorted gzip member and indexes it """
+    entries = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(SEGMENT_SUFFIX):
+            messages = read_segment(directory / name)
+            temporary = directory / f'{name}.tmp'
+            with open(temporary, 'wb') as raw:
+                entry = write_member(raw, messages)
+            os.replace(temporary, directory / name)
+            entries.append({'segment': name, **entry})
+    write_index(directory, entries)
+    return entries
+
+
+def append_segment(path, messages):
+    """
+        Appends the messages to a segment as a new gzip member, ordered by
+        (datetime, id), and adds the member to the index of the chatroom.
+    """
+    if not messages:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entries = read_index(path.parent)
+    with open(path, 'ab') as raw:
+        entry = write_member(raw, messages)
+    write_index(path.parent, entries + [{'segment': path.name, **entry}])
+
+
+def get_members(chatroom_id):
+    """
+        Returns the gzip members of the archive of a chatroom. The parsed
+        index is kept per process until the index file is replaced, so a
+        poll costs a stat() instead of listing and reading the directory.
+    """
+    directory = get_chatroom_directory(chatroom_id)
+    try:
+        stat = os.stat(directory / INDEX_NAME)
+        version = stat.st_ino, stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        version = None
+    cached = indexes.get(directory)
+    if cached is None or cached[0] != version:
+        members = [
+            Member(
+                load_key(entry['first']), load_key(entry['last']),
+                directory / entry['segment'], entry['offset'], entry['length'],
+            )
+            for entry in read_index(directory)
+        ]
+        cached = indexes[directory] = (version, members)
+    return cached[1]
+
+
+def read_member(member):
+    """ Returns the JSON lines of a gzip member, ordered by (datetime, id) """
+    with open(member.path, 'rb') as raw:
+        raw.seek(member.offset)
+        data = raw.read(member.length)
+    return gzip.decompress(data).decode('utf-8').splitlines()
+
+
+def get_line_key(line):
+    data = loads(line)
+    return parse_datetime(data['datetime']), data['id']
+
+
+def archive_chatroom(chatroom_id, before, batch_size=1000):
+    """ Moves the messages of a chatroom older than 'before', returns how many were moved """
+    archived = 0
+    while True:
+        with transaction.atomic():
+            messages = list(
+                Message.objects.filter(chatroom_id=chatroom_id, datetime__lt=before)
+                .order_by('datetime', 'id')[:batch_size]
+            )
+            if not messages:
+                return archived
+            by_month = {}
+            for message in messages:
+                by_month.setdefault(get_month(message.datetime), []).append(message)
+            for month, month_messages in by_month.items():
+                append_segment(get_segment_path(chatroom_id, month), month_messages)
+            with counting_deletes():
+                Message.objects.filter(pk__in=[message.pk for message in messages]).delete()
+            forget_messages(chatroom_id, len(messages), refresh_last_message=False)
+        archived += len(messages)
+
+
+def archive_messages(before, batch_size=1000):
+    """ Archives the messages older than 'before', returns {chatroom id: count} """
+    chatroom_ids = (
+        Message.objects.filter(datetime__lt=before)
+        .order_by('chatroom_id').values_list('chatroom_id', flat=True).distinct()
+    )
+    return {
+        chatroom_id: archive_chatroom(chatroom_id, before, batch_size)
+        for chatroom_id in list(chatroom_ids)
+    }
+
+
+def delete_archive(chatroom_id):
+    shutil.rmtree(get_chatroom_directory(chatroom_id), ignore_errors=True)
+
+
+class ChatroomArchive:
+    """
+        Reads the archived messages of a chatroom around a (datetime, id)
+        keyset cursor. The index gives the key range of every gzip member, so
+        a page only decompresses the members that can hold its messages.
+    """
+
+    def __init__(self, chatroom_id):
+        self.chatroom_id = chatroom_id
+
+    def iterator(self):
+        """ Yields all the archived messages, oldest first """
+        for month, path in list_segments(self.chatroom_id):
+            yield from read_segment(path)
+
+    def older(self, cursor, limit):
+        """ Returns up to 'limit' messages before the cursor (None: the end), newest first """
+        cursor = tuple(cursor) if cursor is not None else None
+        members = sorted(
+            (member for member in get_members(self.chatroom_id) if cursor is None or member.first < cursor),
+            key=attrgetter('last'), reverse=True,
+        )
+        found = {}
+        for member in members:
+            # members of different runs may overlap, the rest is older than the page
+            if len(found) >= limit and member.last < sorted(found, reverse=True)[limit - 1]:
+                break
+            lines = read_member(member)
+            end = len(lines) if cursor is None else bisect_left(lines, cursor, key=get_line_key)
+            for line in lines[max(end - limit, 0):end]:
+                message = load_message(line)
+                found[get_key(message)] = message
+        return [found[key] for key in sorted(found, reverse=True)[:limit]]
+
+    def newer(self, cursor, limit):
+        """ Returns up to 'limit' messages after the cursor, oldest first """
+        cursor = tuple(cursor)
+        members = sorted(
+            (member for member in get_members(self.chatroom_id) if member.last > cursor),
+            key=attrgetter('first'),
+        )
+        found = {}
+        for member in members:
+            if len(found) >= limit and member.first > sorted(found)[limit - 1]:
+                break
+            lines = read_member(member)
+            start = bisect_right(lines, cursor, key=get_line_key)
+            for line in lines[start:start + limit]:
+                message = load_message(line)
+                found[get_key(message)] = message
+        return [found[key] for key in sorted(found)[:limit]]
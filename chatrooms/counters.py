@@ -0,0 +1,128 @@
+"""
+    Denormalized counters of Chatroom: participant_count, message_count,
+    last_message and last_activity.
+
+    They are updated by the write paths themselves, within their
+    transaction: the m2m_changed, post_save and post_delete signals
+    (chatrooms.signals) and the bulk paths that bypass signals (bulk
+    ingestion, bulk membership changes). Archiving counts the messages it
+    deletes itself, within counting_deletes(). message_count only counts the
+    messages left in the table, archived messages aren't included.
+
+    refresh_counters recomputes everything from scratch, it backs the
+    repair_chatroom_counters command.
+
+    record_messages and forget_messages also drop the cached unread counts
+    of the chatroom (chatrooms.unread).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import (
+    BigIntegerField,
+    Case,
+    Count,
+    DateTimeField,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+
+from chatrooms.models import Chatroom, Message
+from chatrooms.unread import ainvalidate_chatroom, invalidate_chatroom
+
+
+# Set while a write path calls forget_messages for the messages it deletes
+counted_deletes = ContextVar('counted_deletes', default=False)
+
+
+def count_subquery(queryset, field):
+    """ COUNT(*) of queryset rows per chatroom, correlated on 'field' """
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(count=Count('*')).values('count')
+    ), 0)
+
+
+def latest_message_subquery(column):
+    return Subquery(
+        Message.objects.filter(chatroom=OuterRef('pk'))
+        .order_by('-datetime', '-id').values(column)[:1]
+    )
+
+
+def refresh_participant_count(chatroom_ids):
+    Chatroom.objects.filter(pk__in=chatroom_ids).update(
+        participant_count = count_subquery(Chatroom.participants.through.objects.all(), 'chatroom'),
+    )
+
+
+def record_messages(chatroom_id, count, last_message):
+    """
+        Adds 'count' messages to the counters, last_message being the newest.
+        Only moves last_message forward, so concurrent writers can't set an
+        older message back.
+    """
+    Chatroom.objects.filter(pk=chatroom_id).update(**get_recorded_fields(count, last_message))
+    invalidate_chatroom(chatroom_id)
+
+
+async def arecord_messages(chatroom_id, count, last_message):
+    """ record_messages for the async views, which write in autocommit """
+    await Chatroom.objects.filter(pk=chatroom_id).aupdate(**get_recorded_fields(count, last_message))
+    await ainvalidate_chatroom(chatroom_id)
+
+
+def get_recorded_fields(count, last_message):
+    is_newer = Q(last_activity__isnull=True) | Q(last_activity__lte=last_message.datetime)
+    return {
+        'message_count': F('message_count') + count,
+        'last_message': Case(
+            When(is_newer, then=Value(last_message.pk)),
+            default = F('last_message'),
+            output_field = BigIntegerField(),
+        ),
+        'last_activity': Case(
+            When(is_newer, then=Value(last_message.datetime)),
+            default = F('last_activity'),
+            output_field = DateTimeField(),
+        ),
+    }
+
+
+def forget_messages(chatroom_id, count, refresh_last_message=True):
+    """
+        Removes 'count' deleted messages and looks up the newest remaining one.
+        Archiving only removes the oldest messages, it keeps the last message
+        and the last activity as they are.
+    """
+    fields = {'message_count': F('message_count') - count}
+    if refresh_last_message:
+        fields['last_message'] = latest_message_subquery('pk')
+        fields['last_activity'] = latest_message_subquery('datetime')
+    Chatroom.objects.filter(pk=chatroom_id).update(**fields)
+    invalidate_chatroom(chatroom_id)
+
+
+@contextmanager
+def counting_deletes():
+    """ The messages deleted within the block are left out by the post_delete signal """
+    token = counted_deletes.set(True)
+    try:
+        yield
+    finally:
+        counted_deletes.reset(token)
+
+
+def refresh_counters(queryset):
+    """ Recomputes every counter of the chatrooms of the queryset in one UPDATE """
+    return queryset.update(
+        participant_count = count_subquery(Chatroom.participants.through.objects.all(), 'chatroom'),
+        message_count = count_subquery(Message.objects.all(), 'chatroom'),
+        last_message = latest_message_subquery('pk'),
+        last_activity = latest_message_subquery('datetime'),
+    )
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from chatrooms.archive import archive_messages, get_archive_root
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves the messages older than the retention horizon (MESSAGE_RETENTION '
+        'or --older-than) out of the message table into the compressed archive '
+        'segments under MESSAGE_ARCHIVE_ROOT. Schedule it, e.g. daily.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, metavar='DAYS', help='Overrides MESSAGE_RETENTION.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Messages moved per transaction.')
+
+    def handle(self, *args, **options):
+        if options['older_than'] is not None:
+            retention = timedelta(days=options['older_than'])
+        elif settings.MESSAGE_RETENTION is not None:
+            retention = settings.MESSAGE_RETENTION
+        else:
+            raise CommandError('Set MESSAGE_RETENTION or pass --older-than.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be greater than zero.')
+
+        archived = archive_messages(timezone.now() - retention, options['batch_size'])
+        for chatroom_id, count in archived.items():
+            self.stdout.write(f'chatroom {chatroom_id}: {count} messages')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {sum(archived.values())} messages to {get_archive_root()}.'
+        ))
@@ -0,0 +1,154 @@
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+
+from accounts.models import CustomUser as User
+from chatrooms.models import Chatroom, Message
+
+
+BENCHMARK_PREFIX = 'benchmark'
+
+# indexes of migration 0010 and the foreign key indexes they replaced
+TIMELINE_INDEXES = [
+    models.Index(fields=['chatroom', 'datetime', 'id'], name='message_chatroom_timeline'),
+    models.Index(fields=['sender', 'datetime', 'id'], name='message_sender_history'),
+]
+FOREIGN_KEY_INDEXES = [
+    models.Index(fields=['chatroom'], name='benchmark_message_chatroom'),
+    models.Index(fields=['sender'], name='benchmark_message_sender'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Shows the query plans and latency of the message hot-path queries with the '
+        'composite indexes of migration 0010 and with the foreign key indexes only. '
+        'The "before" run drops and recreates indexes inside a transaction that is '
+        'rolled back, which locks the message table: use a dedicated database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Number of messages to insert first, e.g. 10000000.')
+        parser.add_argument('--chatrooms', type=int, default=100, help='Number of chatrooms the seeded messages are spread over.')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query, the median is reported.')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'], options['chatrooms'])
+        chatroom = Chatroom.objects.filter(name__startswith=BENCHMARK_PREFIX).first()
+        sender = User.objects.filter(username=BENCHMARK_PREFIX).first()
+        if chatroom is None or sender is None:
+            raise CommandError('No benchmark data, run the command with --seed first.')
+
+        queries = self.get_queries(chatroom, sender)
+        self.analyze()
+        self.stdout.write(self.style.MIGRATE_HEADING('With the composite indexes (after)'))
+        self.run_queries(queries, options['repeat'])
+
+        # the SQLite schema editor refuses to run inside a transaction otherwise
+        connection.disable_constraint_checking()
+        try:
+            with transaction.atomic():
+                with connection.schema_editor(atomic=False) as schema_editor:
+                    for index in TIMELINE_INDEXES:
+                        schema_editor.remove_index(Message, index)
+                    for index in FOREIGN_KEY_INDEXES:
+                        schema_editor.add_index(Message, index)
+                self.analyze()
+                self.stdout.write(self.style.MIGRATE_HEADING('With the foreign key indexes only (before)'))
+                self.run_queries(queries, options['repeat'])
+                transaction.set_rollback(True)
+        finally:
+            connection.enable_constraint_checking()
+
+    def get_queries(self, chatroom, sender):
+        messages = Message.objects.filter(chatroom=chatroom)
+        middle = messages.order_by('datetime', 'id')[messages.count() // 2]
+        return {
+            'latest page of a chatroom': lambda: list(
+                messages.order_by('-datetime', '-id')[:50]
+            ),
+            'page in the middle of the history': lambda: list(
+                messages.filter(
+                    models.Q(datetime__lt=middle.datetime) | models.Q(datetime=middle.datetime, id__lt=middle.id)
+                ).order_by('-datetime', '-id')[:50]
+            ),
+            'latest messages of a sender': lambda: list(
+                Message.objects.filter(sender=sender).order_by('-datetime', '-id')[:50]
+            ),
+        }
+
+    def run_queries(self, queries, repeat):
+        for name, query in queries.items():
+            timings = []
+            for _ in range(repeat):
+                start = perf_counter()
+                query()
+                timings.append(perf_counter() - start)
+            self.stdout.write(f'{name}: {median(timings) * 1000:.2f} ms (median of {repeat})')
+            self.stdout.write(self.explain(query))
+
+    def explain(self, query):
+        """ Runs the query once more, capturing its SQL, and returns the plan """
+        with connection.execute_wrapper(self.capture_sql):
+            query()
+        sql, params = self.captured
+        prefix = 'EXPLAIN ANALYZE' if connection.vendor == 'postgresql' else 'EXPLAIN QUERY PLAN'
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return '\n'.join(f'    {" ".join(str(column) for column in row)}' for row in cursor.fetchall())
+
+    def capture_sql(self, execute, sql, params, many, context):
+        self.captured = (sql, params)
+        return execute(sql, params, many, context)
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Message._meta.db_table}')
+
+    def seed(self, rows, chatroom_count):
+        sender, _ = User.objects.get_or_create(username=BENCHMARK_PREFIX)
+        others = [
+            User.objects.get_or_create(username=f'{BENCHMARK_PREFIX}-{index}')[0]
+            for index in range(9)
+        ]
+        chatrooms = [
+            Chatroom.objects.get_or_create(name=f'{BENCHMARK_PREFIX}-{index}')[0]
+            for index in range(chatroom_count)
+        ]
+        chatroom_ids = [chatroom.pk for chatroom in chatrooms]
+        sender_ids = [sender.pk] + [user.pk for user in others]
+        self.stdout.write(f'Seeding {rows} messages...')
+        if connection.vendor == 'postgresql':
+            self.seed_postgresql(rows, chatroom_ids, sender_ids)
+        else:
+            self.seed_with_bulk_create(rows, chatroom_ids, sender_ids)
+
+    def seed_postgresql(self, rows, chatroom_ids, sender_ids):
+        """ Generates the rows server side, a few minutes for 10M rows """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                INSERT INTO {Message._meta.db_table} (chatroom_id, sender_id, body, datetime)
+                SELECT
+                    (%s::bigint[])[1 + n %% %s],
+                    (%s::bigint[])[1 + n %% %s],
+                    'benchmark message ' || n,
+                    now() - make_interval(secs => %s - n)
+                FROM generate_series(1, %s) AS n
+                ''',
+                [chatroom_ids, len(chatroom_ids), sender_ids, len(sender_ids), rows, rows],
+            )
+
+    def seed_with_bulk_create(self, rows, chatroom_ids, sender_ids, batch_size=10000):
+        for start in range(0, rows, batch_size):
+            Message.objects.bulk_create([
+                Message(
+                    chatroom_id = chatroom_ids[n % len(chatroom_ids)],
+                    sender_id = sender_ids[n % len(sender_ids)],
+                    body = f'benchmark message {n}',
+                )
+                for n in range(start, min(start + batch_size, rows))
+            ])
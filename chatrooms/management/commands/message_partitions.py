@@ -0,0 +1,62 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from chatrooms import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Manages the monthly partitions of the message table on PostgreSQL: '
+        '"convert" partitions the existing table, "create" adds the partitions of '
+        'the coming months (schedule it, e.g. daily), "detach" archives old months and '
+        'takes them out of the table and "list" shows the current partitions.'
+    )
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        convert = subparsers.add_parser('convert', help='Replaces the message table by a partitioned copy.')
+        convert.add_argument('--months-ahead', type=int, default=3)
+
+        create = subparsers.add_parser('create', help='Creates the missing partitions up to N months ahead.')
+        create.add_argument('--months-ahead', type=int, default=3)
+
+        detach = subparsers.add_parser('detach', help='Archives and detaches the partitions older than N months.')
+        detach.add_argument('--older-than', type=int, required=True, metavar='MONTHS')
+        detach.add_argument('--drop', action='store_true', help='Drops the detached partitions.')
+
+        subparsers.add_parser('list', help='Lists the monthly partitions.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                getattr(self, options['action'])(options)
+        except partitions.PartitioningError as error:
+            raise CommandError(error)
+
+    def convert(self, options):
+        partitions.convert(options['months_ahead'])
+        self.stdout.write(self.style.SUCCESS(f'{partitions.TABLE} is now partitioned by month.'))
+
+    def create(self, options):
+        if not partitions.is_partitioned():
+            raise partitions.PartitioningError(f'{partitions.TABLE} is not partitioned, run "convert" first.')
+        today = date.today()
+        for name in partitions.create_partitions(today, partitions.add_months(today, options['months_ahead'])):
+            self.stdout.write(name)
+
+    def detach(self, options):
+        this_month = date.today().replace(day=1)
+        before_month = partitions.add_months(this_month, -options['older_than'])
+        detached = partitions.detach_partitions(before_month, drop=options['drop'])
+        action = 'Dropped' if options['drop'] else 'Detached'
+        for name in detached:
+            self.stdout.write(f'{action} {name}')
+
+    def list(self, options):
+        if not partitions.is_partitioned():
+            raise partitions.PartitioningError(f'{partitions.TABLE} is not partitioned.')
+        for name, month in partitions.list_partitions():
+            self.stdout.write(f'{name}  {month:%Y-%m}')
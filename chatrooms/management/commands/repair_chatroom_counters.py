@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from chatrooms.counters import refresh_counters
+from chatrooms.models import Chatroom
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the denormalized participant_count, message_count, last_message '
+        'and last_activity of the chatrooms, one UPDATE per batch of chatrooms.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='Chatrooms to repair, all of them by default.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Chatrooms updated per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be greater than zero.')
+        chatrooms = Chatroom.objects.order_by('pk')
+        if options['ids']:
+            chatrooms = chatrooms.filter(pk__in=options['ids'])
+
+        repaired, last_id = 0, 0
+        while True:
+            ids = list(chatrooms.filter(pk__gt=last_id).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                repaired += refresh_counters(Chatroom.objects.filter(pk__in=ids))
+            last_id = ids[-1]
+        self.stdout.write(self.style.SUCCESS(f'Repaired the counters of {repaired} chatrooms.'))
@@ -0,0 +1,169 @@
+from collections import namedtuple
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from accounts.models import CustomUser as User
+from chatrooms.counters import refresh_participant_count
+from chatrooms.models import Chatroom
+
+
+Membership = namedtuple('Membership', ['is_participant', 'is_admin'])
+UserChatrooms = namedtuple('UserChatrooms', ['participant_of', 'admin_of'])
+MembershipChange = namedtuple('MembershipChange', ['changed', 'unchanged', 'not_found', 'rejected'])
+
+
+def get_cache():
+    return caches[settings.CHATROOM_MEMBERSHIP_CACHE]
+
+
+def membership_key(chatroom_id, user_id):
+    return f'chatroom-membership:{chatroom_id}:{user_id}'
+
+
+def user_chatrooms_key(user_id):
+    return f'user-chatrooms:{user_id}'
+
+
+def get_cached_membership(chatroom_id, user_id):
+    """ Returns the cached Membership or None, never queries the database """
+    cached = get_cache().get(membership_key(chatroom_id, user_id))
+    return Membership(*cached) if cached is not None else None
+
+
+def set_membership(chatroom_id, user_id, membership):
+    get_cache().set(
+        membership_key(chatroom_id, user_id),
+        tuple(membership),
+        settings.CHATROOM_MEMBERSHIP_TIMEOUT,
+    )
+
+
+async def aget_cached_membership(chatroom_id, user_id):
+    cached = await get_cache().aget(membership_key(chatroom_id, user_id))
+    return Membership(*cached) if cached is not None else None
+
+
+async def aset_membership(chatroom_id, user_id, membership):
+    await get_cache().aset(
+        membership_key(chatroom_id, user_id),
+        tuple(membership),
+        settings.CHATROOM_MEMBERSHIP_TIMEOUT,
+    )
+
+
+def annotate_membership(queryset, user_id):
+    """ Annotates a Chatroom queryset with the user_is_participant and user_is_admin flags """
+    return queryset.annotate(
+        user_is_participant = Exists(Chatroom.participants.through.objects.filter(
+            chatroom = OuterRef('pk'),
+            customuser = user_id,
+        )),
+        user_is_admin = Exists(Chatroom.admins.through.objects.filter(
+            chatroom = OuterRef('pk'),
+            customuser = user_id,
+        )),
+    )
+
+
+def get_membership(chatroom_id, user_id):
+    """ Tells whether the user is a participant and/or an admin of the chatroom """
+    if user_id is None:
+        return Membership(False, False)
+    membership = get_cached_membership(chatroom_id, user_id)
+    if membership is None:
+        flags = annotate_membership(
+            Chatroom.objects.filter(pk=chatroom_id),
+            user_id,
+        ).values_list('user_is_participant', 'user_is_admin').first()
+        membership = Membership(*flags) if flags is not None else Membership(False, False)
+        set_membership(chatroom_id, user_id, membership)
+    return membership
+
+
+def get_user_chatrooms(user_id):
+    """ Returns the ids of the chatrooms the user participates in and administers """
+    cache = get_cache()
+    cached = cache.get(user_chatrooms_key(user_id))
+    if cached is not None:
+        return UserChatrooms(*cached)
+    chatrooms = UserChatrooms(
+        frozenset(Chatroom.participants.through.objects.filter(
+            customuser = user_id,
+        ).values_list('chatroom_id', flat=True)),
+        frozenset(Chatroom.admins.through.objects.filter(
+            customuser = user_id,
+        ).values_list('chatroom_id', flat=True)),
+    )
+    cache.set(user_chatrooms_key(user_id), tuple(chatrooms), settings.CHATROOM_MEMBERSHIP_TIMEOUT)
+    return chatrooms
+
+
+def invalidate_membership(chatroom_ids, user_ids):
+    """ Drops every cached entry involving the given chatrooms and users """
+    keys = [
+        membership_key(chatroom_id, user_id)
+        for chatroom_id in chatroom_ids
+        for user_id in user_ids
+    ]
+    keys += [user_chatrooms_key(user_id) for user_id in user_ids]
+    if keys:
+        get_cache().delete_many(keys)
+
+
+def invalidate_on_commit(chatroom_ids, user_ids):
+    """
+        Invalidates right away and again on commit, so a concurrent request that
+        cached the old membership before the commit doesn't keep it.
+    """
+    invalidate_membership(chatroom_ids, user_ids)
+    transaction.on_commit(partial(invalidate_membership, chatroom_ids, user_ids))
+
+
+def change_members(chatroom, relation, user_ids, add, required_relation=None):
+    """
+        Adds the users to or removes them from chatroom.<relation> ('participants'
+        or 'admins') with one query on the users and one bulk INSERT or DELETE
+        on the through table. When adding, users that aren't in
+        required_relation are rejected. The m2m_changed signal isn't sent, the
+        cached memberships are invalidated here instead.
+    """
+    through = getattr(Chatroom, relation).through
+    users = User.objects.filter(pk__in=user_ids).annotate(
+        is_member = Exists(through.objects.filter(chatroom=chatroom, customuser=OuterRef('pk'))),
+    )
+    if add and required_relation is not None:
+        users = users.annotate(is_allowed=Exists(getattr(Chatroom, required_relation).through.objects.filter(
+            chatroom = chatroom,
+            customuser = OuterRef('pk'),
+        )))
+        rows = users.values_list('pk', 'is_member', 'is_allowed')
+    else:
+        rows = [(pk, is_member, True) for pk, is_member in users.values_list('pk', 'is_member')]
+
+    found, changed, unchanged, rejected = set(), [], [], []
+    for pk, is_member, is_allowed in rows:
+        found.add(pk)
+        if not is_allowed:
+            rejected.append(pk)
+        elif is_member == add:
+            unchanged.append(pk)
+        else:
+            changed.append(pk)
+    not_found = [pk for pk in dict.fromkeys(user_ids) if pk not in found]
+
+    if changed:
+        if add:
+            through.objects.bulk_create(
+                [through(chatroom_id=chatroom.pk, customuser_id=pk) for pk in changed],
+                ignore_conflicts = True,
+            )
+        else:
+            through.objects.filter(chatroom=chatroom, customuser_id__in=changed).delete()
+        if relation == 'participants':
+            refresh_participant_count([chatroom.pk])
+        invalidate_on_commit([chatroom.pk], changed)
+    return MembershipChange(sorted(changed), sorted(unchanged), not_found, sorted(rejected))
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+# GIN index on the search vector of chatrooms.search with the 'english' text
+# search configuration, the MESSAGE_SEARCH_CONFIG of this migration. The
+# expression must stay the one of the queries for the index to be used.
+CREATE_SEARCH_INDEX = (
+    'CREATE INDEX "chatrooms_message_body_fts" ON "chatrooms_message" '
+    'USING gin ((to_tsvector(\'english\'::regconfig, COALESCE("body", \'\'))))'
+)
+DROP_SEARCH_INDEX = 'DROP INDEX IF EXISTS "chatrooms_message_body_fts"'
+
+
+def add_search_index(apps, schema_editor):
+    """ The full-text index only exists on PostgreSQL, other backends scan the table """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_SEARCH_INDEX)
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_SEARCH_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatrooms', '0008_remove_chatroom_topics_delete_topic'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
@@ -0,0 +1,33 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatrooms', '0009_message_body_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # create the composite indexes before dropping the foreign key ones
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chatroom', 'datetime', 'id'], name='message_chatroom_timeline'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'datetime', 'id'], name='message_sender_history'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='chatroom',
+            field=models.ForeignKey(blank=True, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chatrooms.chatroom'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='sender',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='messages', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
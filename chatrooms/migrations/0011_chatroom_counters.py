@@ -0,0 +1,56 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    """ Same as chatrooms.counters.refresh_counters, with the historical models """
+    Chatroom = apps.get_model('chatrooms', 'Chatroom')
+    Message = apps.get_model('chatrooms', 'Message')
+    Participant = Chatroom.participants.through
+
+    def count(model):
+        return Coalesce(Subquery(
+            model.objects.filter(chatroom=OuterRef('pk')).order_by()
+            .values('chatroom').annotate(count=Count('*')).values('count')
+        ), 0)
+
+    latest = Message.objects.filter(chatroom=OuterRef('pk')).order_by('-datetime', '-id')
+    Chatroom.objects.update(
+        participant_count = count(Participant),
+        message_count = count(Message),
+        last_message = Subquery(latest.values('pk')[:1]),
+        last_activity = Subquery(latest.values('datetime')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatrooms', '0010_message_timeline_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='chatrooms.message'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='participant_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatrooms', '0011_chatroom_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.BigIntegerField(default=0)),
+                ('datetime', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chatroom', 'id'], name='message_chatroom_id'),
+        ),
+        migrations.AddField(
+            model_name='readcursor',
+            name='chatroom',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='chatrooms.chatroom'),
+        ),
+        migrations.AddField(
+            model_name='readcursor',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='readcursor',
+            constraint=models.UniqueConstraint(fields=('user', 'chatroom'), name='read_cursor_user_chatroom'),
+        ),
+    ]
@@ -13,15 +13,55 @@ class Chatroom(models.Model):
     participants = models.ManyToManyField(User, related_name='chatrooms')
     admins = models.ManyToManyField(User, related_name='admin_of_chatrooms')
 
+    # denormalized from the participants and messages, see chatrooms.counters
+    participant_count = models.PositiveIntegerField(default=0, editable=False)
+    message_count = models.PositiveIntegerField(default=0, editable=False)
+    # no constraint since the message table may be partitioned (chatrooms.partitions)
+    last_message = models.ForeignKey(
+        'chatrooms.Message', blank=True, null=True, editable=False, related_name='+',
+        on_delete=models.DO_NOTHING, db_constraint=False,
+    )
+    last_activity = models.DateTimeField(blank=True, null=True, editable=False)
+
     def __str__(self) -> str:
         return self.name
 
 
 class Message(models.Model):
-    chatroom = models.ForeignKey(Chatroom, blank=True, on_delete=models.CASCADE, related_name='messages')
-    sender = models.ForeignKey(User, blank=True, null=True, on_delete=models.SET_NULL, related_name='messages')
+    # the composite indexes below lead with chatroom and sender, so the
+    # foreign keys don't need an index of their own
+    chatroom = models.ForeignKey(
+        Chatroom, blank=True, on_delete=models.CASCADE, related_name='messages', db_index=False,
+    )
+    sender = models.ForeignKey(
+        User, blank=True, null=True, on_delete=models.SET_NULL, related_name='messages', db_index=False,
+    )
     body = models.CharField(max_length=1000)
     datetime = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # chatroom timelines, paginated on (datetime, id)
+            models.Index(fields=['chatroom', 'datetime', 'id'], name='message_chatroom_timeline'),
+            # the history of a sender
+            models.Index(fields=['sender', 'datetime', 'id'], name='message_sender_history'),
+            # unread counts, the messages of a chatroom after a read cursor
+            models.Index(fields=['chatroom', 'id'], name='message_chatroom_id'),
+        ]
+
     def __str__(self):
         return f'{self.sender.username}: {self.body[:100]}'
+
+
+class ReadCursor(models.Model):
+    """ The last message of a chatroom read by a user, see chatrooms.unread """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='read_cursors')
+    chatroom = models.ForeignKey(Chatroom, on_delete=models.CASCADE, related_name='read_cursors')
+    # message ids only grow, every message with a greater id is unread
+    message_id = models.BigIntegerField(default=0)
+    datetime = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'chatroom'], name='read_cursor_user_chatroom'),
+        ]
@@ -0,0 +1,212 @@
+"""
+    Monthly range partitioning of the message table on PostgreSQL.
+
+    Once converted, chatrooms_message is partitioned on 'datetime' with one
+    partition per month (chatrooms_message_pYYYY_MM) plus a default partition.
+    The primary key becomes (id, datetime) since PostgreSQL requires the
+    partition key in unique constraints; ids still come from a single sequence.
+    Nothing may reference the message table with a foreign key constraint.
+
+    Detached months are archived first (chatrooms.archive), so their messages
+    stay readable from the chatroom timelines.
+
+    See the message_partitions management command.
+"""
+from datetime import date
+from itertools import groupby, islice
+
+from django.db import connection
+
+from chatrooms.archive import append_segment, get_month, get_segment_path
+from chatrooms.counters import refresh_counters
+from chatrooms.models import Chatroom, Message
+from chatrooms.search import get_search_index
+from chatrooms.unread import invalidate_chatroom
+
+
+TABLE = Message._meta.db_table
+UNPARTITIONED_TABLE = f'{TABLE}_unpartitioned'
+DEFAULT_PARTITION = f'{TABLE}_default'
+SEQUENCE = f'{TABLE}_partitioned_id_seq'
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def get_partition_name(month):
+    return f'{TABLE}_p{month.year}_{month.month:02d}'
+
+
+def check_database():
+    if connection.vendor != 'postgresql':
+        raise PartitioningError('Message partitioning requires PostgreSQL.')
+
+
+def is_partitioned():
+    check_database()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)',
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """ Returns the (name, month) of the monthly partitions, oldest first """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '''
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s AND child.relname <> %s
+            ORDER BY child.relname
+            ''',
+            [TABLE, DEFAULT_PARTITION],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f'{TABLE}_p'
+    return [
+        (name, date(int(name[len(prefix):][:4]), int(name[len(prefix):][5:7]), 1))
+        for name in names
+    ]
+
+
+def create_partition(cursor, month):
+    cursor.execute(
+        f'''
+        CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(get_partition_name(month))}
+        PARTITION OF {connection.ops.quote_name(TABLE)}
+        FOR VALUES FROM (%s) TO (%s)
+        ''',
+        [month.isoformat(), add_months(month, 1).isoformat()],
+    )
+
+
+def create_partitions(first_month, last_month):
+    """ Creates the missing monthly partitions from first_month to last_month included """
+    month = date(first_month.year, first_month.month, 1)
+    created = []
+    with connection.cursor() as cursor:
+        while month <= last_month:
+            create_partition(cursor, month)
+            created.append(get_partition_name(month))
+            month = add_months(month, 1)
+    return created
+
+
+def convert(months_ahead):
+    """
+        Replaces the message table by a partitioned copy. The table is locked
+        for the whole copy, so run it during a maintenance window.
+    """
+    if is_partitioned():
+        raise PartitioningError(f'{TABLE} is already partitioned.')
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {quote(TABLE)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT min(datetime), max(id) FROM {quote(TABLE)}')
+        oldest, last_id = cursor.fetchone()
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(UNPARTITIONED_TABLE)}')
+        cursor.execute(
+            f'''
+            CREATE TABLE {quote(TABLE)} (LIKE {quote(UNPARTITIONED_TABLE)} INCLUDING DEFAULTS)
+            PARTITION BY RANGE (datetime)
+            '''
+        )
+        cursor.execute(f'CREATE SEQUENCE {quote(SEQUENCE)} OWNED BY {quote(TABLE)}.id')
+        if last_id is not None:
+            cursor.execute('SELECT setval(%s, %s)', [SEQUENCE, last_id])
+        cursor.execute(
+            f'ALTER TABLE {quote(TABLE)} ALTER COLUMN id SET DEFAULT nextval(%s::regclass)',
+            [SEQUENCE],
+        )
+        cursor.execute(f'CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(TABLE)} DEFAULT')
+
+    today = date.today()
+    first_month = oldest.date() if oldest is not None else today
+    create_partitions(first_month, add_months(today, months_ahead))
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote(TABLE)} SELECT * FROM {quote(UNPARTITIONED_TABLE)}')
+        # frees the names of the primary key and the indexes
+        cursor.execute(f'DROP TABLE {quote(UNPARTITIONED_TABLE)}')
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} ADD PRIMARY KEY (id, datetime)')
+        # created on the parent, so every current and future partition gets them
+        for field_name in ['chatroom', 'sender']:
+            add_foreign_key(cursor, Message._meta.get_field(field_name))
+
+    with connection.schema_editor(atomic=False) as schema_editor:
+        for index in Message._meta.indexes:
+            schema_editor.add_index(Message, index)
+        schema_editor.add_index(Message, get_search_index())
+
+
+def add_foreign_key(cursor, field):
+    """ The constraint Django creates for the foreign key 'field', deferred like Django's """
+    quote = connection.ops.quote_name
+    target = field.target_field
+    target_table = target.model._meta.db_table
+    cursor.execute(
+        f'''
+        ALTER TABLE {quote(TABLE)}
+        ADD CONSTRAINT {quote(f'{TABLE}_{field.column}_fk_{target_table}_{target.column}')}
+        FOREIGN KEY ({quote(field.column)}) REFERENCES {quote(target_table)} ({quote(target.column)})
+        DEFERRABLE INITIALLY DEFERRED
+        '''
+    )
+
+
+def archive_partition(name, batch_size=1000):
+    """
+        Appends the messages of a partition to the archive segments of their
+        chatroom and month. Returns {chatroom id: count}.
+    """
+    messages = Message.objects.raw(
+        f'SELECT * FROM {connection.ops.quote_name(name)} ORDER BY chatroom_id, datetime, id',
+    ).iterator()
+    counts = {}
+
+    def get_segment(message):
+        return message.chatroom_id, get_month(message.datetime)
+
+    for (chatroom_id, month), group in groupby(messages, key=get_segment):
+        while batch := list(islice(group, batch_size)):
+            append_segment(get_segment_path(chatroom_id, month), batch)
+            counts[chatroom_id] = counts.get(chatroom_id, 0) + len(batch)
+    return counts
+
+
+def detach_partitions(before_month, drop=False):
+    """
+        Archives and detaches the monthly partitions that only hold messages
+        older than before_month. Detached partitions are kept as standalone
+        tables unless drop is True. The counters and the unread counts of the
+        chatrooms that had messages in them are refreshed.
+    """
+    if not is_partitioned():
+        raise PartitioningError(f'{TABLE} is not partitioned, run the convert command first.')
+    quote = connection.ops.quote_name
+    detached, chatroom_ids = [], set()
+    with connection.cursor() as cursor:
+        for name, month in list_partitions():
+            if add_months(month, 1) > before_month:
+                break
+            chatroom_ids.update(archive_partition(name))
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(name)}')
+            if drop:
+                cursor.execute(f'DROP TABLE {quote(name)}')
+            detached.append(name)
+    if chatroom_ids:
+        refresh_counters(Chatroom.objects.filter(pk__in=chatroom_ids))
+        for chatroom_id in chatroom_ids:
+            invalidate_chatroom(chatroom_id)
+    return detached
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+
+
+# Name of the full-text index created on PostgreSQL by migration 0009
+MESSAGE_BODY_SEARCH_INDEX = 'chatrooms_message_body_fts'
+
+
+def get_search_vector():
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector('body', config=settings.MESSAGE_SEARCH_CONFIG)
+
+
+def get_search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    return GinIndex(get_search_vector(), name=MESSAGE_BODY_SEARCH_INDEX)
+
+
+class BaseMessageSearch:
+    """ Searches messages by their body """
+
+    def filter(self, queryset, query):
+        """ Narrows the queryset to the matching messages, keeping its ordering """
+        raise NotImplementedError('filter() must be implemented.')
+
+    def search(self, queryset, query):
+        """ Returns the matching messages annotated with 'rank', best first """
+        raise NotImplementedError('search() must be implemented.')
+
+
+class PostgresMessageSearch(BaseMessageSearch):
+    """
+        Full-text search on PostgreSQL. The search vector is the expression of
+        the GIN index created by migration 0009, so matches are looked up in
+        the index instead of scanning the table.
+    """
+
+    def get_search_query(self, query):
+        from django.contrib.postgres.search import SearchQuery
+        return SearchQuery(query, config=settings.MESSAGE_SEARCH_CONFIG, search_type='websearch')
+
+    def filter(self, queryset, query):
+        return queryset.annotate(search=get_search_vector()).filter(search=self.get_search_query(query))
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchRank
+        search_query = self.get_search_query(query)
+        return self.filter(queryset, query).annotate(
+            rank = SearchRank(get_search_vector(), search_query),
+        ).order_by('-rank', '-datetime', '-id')
+
+
+class SimpleMessageSearch(BaseMessageSearch):
+    """
+        Fallback for the other backends (SQLite in the test suite): every term
+        must appear in the body, and messages containing the whole query as a
+        phrase rank first.
+    """
+
+    def filter(self, queryset, query):
+        condition = Q()
+        for term in query.split():
+            condition &= Q(body__icontains=term)
+        return queryset.filter(condition)
+
+    def search(self, queryset, query):
+        return self.filter(queryset, query).annotate(
+            rank = Case(
+                When(body__icontains=query, then=Value(1.0)),
+                default = Value(0.5),
+                output_field = FloatField(),
+            ),
+        ).order_by('-rank', '-datetime', '-id')
+
+
+def get_message_search(using='default'):
+    if connections[using].vendor == 'postgresql':
+        return PostgresMessageSearch()
+    return SimpleMessageSearch()
@@ -0,0 +1,78 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from chatrooms.archive import delete_archive
+from chatrooms.counters import counted_deletes, forget_messages, record_messages, refresh_participant_count
+from chatrooms.membership import invalidate_on_commit
+from chatrooms.models import Chatroom, Message
+
+
+@receiver(m2m_changed, sender=Chatroom.participants.through)
+@receiver(m2m_changed, sender=Chatroom.admins.through)
+def invalidate_chatroom_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # user.chatrooms / user.admin_of_chatrooms, pk_set holds chatroom ids
+        user_ids = [instance.pk]
+        chatroom_ids = pk_set if pk_set is not None else list(
+            sender.objects.filter(customuser=instance).values_list('chatroom_id', flat=True)
+        )
+    else:
+        chatroom_ids = [instance.pk]
+        user_ids = pk_set if pk_set is not None else list(
+            sender.objects.filter(chatroom=instance).values_list('customuser_id', flat=True)
+        )
+    invalidate_on_commit(list(chatroom_ids), list(user_ids))
+
+
+@receiver(m2m_changed, sender=Chatroom.participants.through)
+def update_participant_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # the chatrooms of the user are unknown once cleared
+        instance._cleared_chatroom_ids = list(
+            sender.objects.filter(customuser=instance).values_list('chatroom_id', flat=True)
+        )
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        chatroom_ids = [instance.pk]
+    elif action == 'post_clear':
+        chatroom_ids = instance.__dict__.pop('_cleared_chatroom_ids', [])
+    else:
+        chatroom_ids = list(pk_set)
+    refresh_participant_count(chatroom_ids)
+
+
+@receiver(post_save, sender=Message)
+def update_message_counters(sender, instance, created, raw=False, **kwargs):
+    # 'datetime' is auto_now, an updated message becomes the last one too
+    if not raw:
+        record_messages(instance.chatroom_id, 1 if created else 0, instance)
+
+
+@receiver(post_delete, sender=Message)
+def forget_deleted_message(sender, instance, origin=None, **kwargs):
+    # the counters of a deleted chatroom go with it
+    if counted_deletes.get() or isinstance(origin, Chatroom) or getattr(origin, 'model', None) is Chatroom:
+        return
+    forget_messages(instance.chatroom_id, 1)
+
+
+@receiver(pre_delete, sender=Chatroom)
+def invalidate_deleted_chatroom(sender, instance, **kwargs):
+    user_ids = set(Chatroom.participants.through.objects.filter(
+        chatroom = instance,
+    ).values_list('customuser_id', flat=True))
+    user_ids |= set(Chatroom.admins.through.objects.filter(
+        chatroom = instance,
+    ).values_list('customuser_id', flat=True))
+    invalidate_on_commit([instance.pk], list(user_ids))
+
+
+@receiver(pre_delete, sender=Chatroom)
+def delete_chatroom_archive(sender, instance, **kwargs):
+    transaction.on_commit(partial(delete_archive, instance.pk))
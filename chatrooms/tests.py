@@ -1,5 +1,21 @@
+import gzip
+from datetime import timedelta
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from django.utils import timezone
 
+from chatrooms.archive import ChatroomArchive, dump_message, get_segment_path, list_segments
+from chatrooms.partitions import archive_partition
+from chatrooms.membership import (
+    Membership,
+    change_members,
+    get_cache,
+    get_membership,
+    get_user_chatrooms,
+)
 from chatrooms.models import Chatroom, Message
 from accounts.tests import CreateUserMixin
 
@@ -41,3 +57,176 @@ class ChatroomTest(CreateUserMixin, TestChatroomMixin, TestCase):
         self.assertEqual(chatroom_message.chatroom, self.chatroom)
         self.assertEqual(chatroom_message.sender, self.user)
         self.assertEqual(chatroom_message.body, 'Hello, world!')
+
+
+class ChatroomMembershipTest(CreateUserMixin, TestChatroomMixin, TestCase):
+
+    def setUp(self) -> None:
+        get_cache().clear()
+        self.user = self.create_user()
+        self.chatroom = self.create_chatroom()
+
+    def test_membership_is_cached(self):
+        self.chatroom.participants.add(self.user)
+        self.assertEqual(get_membership(self.chatroom.pk, self.user.pk), Membership(True, False))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_membership(self.chatroom.pk, self.user.pk), Membership(True, False))
+
+    def test_membership_invalidation(self):
+        self.assertEqual(get_membership(self.chatroom.pk, self.user.pk), Membership(False, False))
+        self.chatroom.participants.add(self.user)
+        self.user.admin_of_chatrooms.add(self.chatroom)
+        self.assertEqual(get_membership(self.chatroom.pk, self.user.pk), Membership(True, True))
+        self.chatroom.admins.clear()
+        self.assertEqual(get_membership(self.chatroom.pk, self.user.pk), Membership(True, False))
+
+    def test_change_members_invalidation(self):
+        self.assertEqual(get_membership(self.chatroom.pk, self.user.pk), Membership(False, False))
+        change = change_members(self.chatroom, 'participants', [self.user.pk], add=True)
+        self.assertEqual(change.changed, [self.user.pk])
+        self.assertEqual(get_membership(self.chatroom.pk, self.user.pk), Membership(True, False))
+        change_members(self.chatroom, 'participants', [self.user.pk], add=False)
+        self.assertEqual(get_membership(self.chatroom.pk, self.user.pk), Membership(False, False))
+
+    def test_user_chatrooms(self):
+        self.chatroom.participants.add(self.user)
+        self.assertEqual(get_user_chatrooms(self.user.pk).participant_of, {self.chatroom.pk})
+        self.chatroom.participants.remove(self.user)
+        self.assertEqual(get_user_chatrooms(self.user.pk).participant_of, set())
+
+
+class ChatroomCountersTest(CreateUserMixin, TestChatroomMixin, TestCase):
+
+    def setUp(self) -> None:
+        self.user = self.create_user()
+        self.chatroom = self.create_chatroom()
+
+    def assertCounters(self, participant_count, message_count, last_message):
+        chatroom = Chatroom.objects.get(pk=self.chatroom.pk)
+        self.assertEqual(chatroom.participant_count, participant_count)
+        self.assertEqual(chatroom.message_count, message_count)
+        self.assertEqual(chatroom.last_message_id, last_message.pk if last_message else None)
+        self.assertEqual(chatroom.last_activity, last_message.datetime if last_message else None)
+
+    def test_participant_count(self):
+        self.chatroom.participants.add(self.user)
+        self.assertCounters(1, 0, None)
+        self.user.chatrooms.clear()
+        self.assertCounters(0, 0, None)
+        self.user.chatrooms.add(self.chatroom)
+        self.chatroom.participants.remove(self.user)
+        self.assertCounters(0, 0, None)
+
+    def test_message_counters(self):
+        first = self.create_chatroom_message()
+        last = self.create_chatroom_message()
+        self.assertCounters(0, 2, last)
+        last.delete()
+        self.assertCounters(0, 1, first)
+
+    def test_message_counters_bulk_delete(self):
+        first = self.create_chatroom_message()
+        self.create_chatroom_message()
+        Message.objects.exclude(pk=first.pk).delete()
+        self.assertCounters(0, 1, first)
+        Message.objects.all().delete()
+        self.assertCounters(0, 0, None)
+
+    def test_chatroom_delete(self):
+        self.create_chatroom_message()
+        self.chatroom.delete()
+        self.assertFalse(Message.objects.exists())
+
+    def test_repair(self):
+        self.chatroom.participants.add(self.user)
+        message = self.create_chatroom_message()
+        Chatroom.objects.update(participant_count=7, message_count=7, last_message=None, last_activity=None)
+        call_command('repair_chatroom_counters', stdout=StringIO())
+        self.assertCounters(1, 1, message)
+
+
+class MessageArchiveTest(CreateUserMixin, TestChatroomMixin, TestCase):
+
+    def setUp(self) -> None:
+        self.user = self.create_user()
+        self.chatroom = self.create_chatroom()
+        self.messages = [self.create_chatroom_message() for _ in range(3)]
+        Message.objects.filter(pk__in=[m.pk for m in self.messages[:2]]).update(
+            datetime = timezone.now() - timedelta(days=40),
+        )
+        self.root = TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+
+    def archive(self):
+        with self.settings(MESSAGE_ARCHIVE_ROOT=self.root.name):
+            call_command('archive_messages', '--older-than', '30', stdout=StringIO())
+
+    def test_archive_messages(self):
+        self.archive()
+        self.assertEqual(list(Message.objects.values_list('pk', flat=True)), [self.messages[2].pk])
+        with self.settings(MESSAGE_ARCHIVE_ROOT=self.root.name):
+            self.assertEqual(len(list_segments(self.chatroom.pk)), 1)
+            archived = ChatroomArchive(self.chatroom.pk).older(None, 10)
+        self.assertEqual([m.pk for m in archived], [m.pk for m in self.messages[1::-1]])
+        self.assertEqual(archived[0].body, 'Hello, world!')
+        self.assertEqual(archived[0].sender_id, self.user.pk)
+
+    def test_archive_is_append_only(self):
+        self.archive()
+        Message.objects.filter(pk=self.messages[2].pk).update(datetime=timezone.now() - timedelta(days=40))
+        self.archive()
+        with self.settings(MESSAGE_ARCHIVE_ROOT=self.root.name):
+            archived = ChatroomArchive(self.chatroom.pk).older(None, 10)
+        self.assertEqual(sorted(m.pk for m in archived), [m.pk for m in self.messages])
+        self.assertFalse(Message.objects.exists())
+
+    def test_archive_partition(self):
+        # any table with the columns of the messages, e.g. the message table itself
+        with self.settings(MESSAGE_ARCHIVE_ROOT=self.root.name):
+            counts = archive_partition(Message._meta.db_table, batch_size=2)
+            archived = ChatroomArchive(self.chatroom.pk).older(None, 10)
+        self.assertEqual(counts, {self.chatroom.pk: 3})
+        self.assertEqual([m.pk for m in archived], [m.pk for m in self.messages[::-1]])
+
+    def test_archive_pages(self):
+        self.messages += [self.create_chatroom_message() for _ in range(7)]
+        for seconds, message in enumerate(self.messages):
+            message.datetime = timezone.now() - timedelta(days=40, seconds=-seconds)
+            Message.objects.filter(pk=message.pk).update(datetime=message.datetime)
+        with self.settings(MESSAGE_ARCHIVE_ROOT=self.root.name):
+            call_command('archive_messages', '--older-than', '30', '--batch-size', '3', stdout=StringIO())
+            archive = ChatroomArchive(self.chatroom.pk)
+            older, cursor = [], None
+            while page := archive.older(cursor, 4):
+                older += page
+                cursor = (page[-1].datetime, page[-1].id)
+            newer, cursor = [], (self.messages[0].datetime, self.messages[0].id)
+            while page := archive.newer(cursor, 4):
+                newer += page
+                cursor = (page[-1].datetime, page[-1].id)
+        self.assertEqual([m.pk for m in older], [m.pk for m in self.messages[::-1]])
+        self.assertEqual([m.pk for m in newer], [m.pk for m in self.messages[1:]])
+
+    def test_archive_without_index(self):
+        # segments written before the index: two unsorted members with a duplicate
+        with self.settings(MESSAGE_ARCHIVE_ROOT=self.root.name):
+            path = get_segment_path(self.chatroom.pk, self.messages[0].datetime)
+            path.parent.mkdir(parents=True)
+            for messages in (self.messages[1::-1], self.messages[:1]):
+                with open(path, 'ab') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as segment:
+                    for message in messages:
+                        segment.write(dump_message(message).encode('utf-8') + b'\n')
+            archived = ChatroomArchive(self.chatroom.pk).older(None, 10)
+            self.assertTrue((path.parent / 'index.json').exists())
+        self.assertEqual([m.pk for m in archived], [m.pk for m in self.messages[1::-1]])
+
+    def test_retention_required(self):
+        with self.settings(MESSAGE_RETENTION=None), self.assertRaises(CommandError):
+            call_command('archive_messages', stdout=StringIO())
+
+
+class MessagePartitionsCommandTest(TestCase):
+
+    def test_unpartitioned_table(self):
+        with self.assertRaises(CommandError):
+            call_command('message_partitions', 'list', stdout=StringIO())
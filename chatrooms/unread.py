@@ -0,0 +1,129 @@
+"""
+    Read cursors and unread counts.
+
+    A ReadCursor holds the id of the last message of a chatroom read by a
+    user. Message ids only grow, so the unread messages of a chatroom are the
+    ones with a greater id, counted on the message_chatroom_id index.
+
+    The counts of a user are cached under a key made of a version token of
+    the user (changed when a cursor moves) and one of every chatroom of the
+    user (changed by every message write, see chatrooms.counters). A write
+    in one chatroom only recomputes the counts of its participants.
+"""
+from functools import partial, reduce
+from hashlib import sha1
+from operator import or_
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Q
+
+from chatrooms.models import Message, ReadCursor
+
+
+def get_cache():
+    return caches[settings.UNREAD_COUNTS_CACHE]
+
+
+def user_version_key(user_id):
+    return f'unread-version:user:{user_id}'
+
+
+def chatroom_version_key(chatroom_id):
+    return f'unread-version:chatroom:{chatroom_id}'
+
+
+def get_versions(keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(keys):
+    get_cache().set_many({key: uuid4().hex for key in keys}, None)
+
+
+def invalidate_chatroom(chatroom_id):
+    """ Called by the message write paths, right away and on commit """
+    keys = [chatroom_version_key(chatroom_id)]
+    bump_versions(keys)
+    transaction.on_commit(partial(bump_versions, keys))
+
+
+async def ainvalidate_chatroom(chatroom_id):
+    """ invalidate_chatroom for the async write paths, which run in autocommit """
+    await get_cache().aset_many({chatroom_version_key(chatroom_id): uuid4().hex}, None)
+
+
+def advance_read_cursor(user_id, chatroom_id, message_id):
+    """ Moves the cursor forward to message_id, never backward. Returns the cursor position """
+    cursor, moved = ReadCursor.objects.get_or_create(
+        user_id = user_id,
+        chatroom_id = chatroom_id,
+        defaults = {'message_id': message_id},
+    )
+    if not moved and cursor.message_id < message_id:
+        # conditional, a concurrent request may have moved it further
+        moved = ReadCursor.objects.filter(pk=cursor.pk, message_id__lt=message_id).update(
+            message_id = message_id,
+        ) > 0
+        if moved:
+            cursor.message_id = message_id
+    if moved:
+        keys = [user_version_key(user_id)]
+        bump_versions(keys)
+        transaction.on_commit(partial(bump_versions, keys))
+    return cursor.message_id
+
+
+def count_unread(user_id, chatroom_ids):
+    """
+        {chatroom id: unread messages} of the chatrooms with unread messages.
+        The cursors are read first, then the messages are counted in one
+        grouped query made of one (chatroom, id > cursor) index range per
+        chatroom.
+    """
+    cursors = dict(ReadCursor.objects.filter(
+        user = user_id,
+        chatroom__in = chatroom_ids,
+    ).values_list('chatroom_id', 'message_id'))
+    ranges = reduce(or_, [
+        Q(chatroom_id=chatroom_id, id__gt=cursors.get(chatroom_id, 0))
+        for chatroom_id in chatroom_ids
+    ])
+    rows = (
+        Message.objects.filter(ranges)
+        .order_by()
+        .values('chatroom_id')
+        .annotate(unread=Count('id'))
+        .values_list('chatroom_id', 'unread')
+    )
+    return dict(rows)
+
+
+def get_unread_counts(user_id, chatroom_ids):
+    """
+        {chatroom id: unread messages} for the given chatrooms of the user,
+        usually the ones from chatrooms.membership.get_user_chatrooms
+    """
+    chatroom_ids = sorted(chatroom_ids)
+    if not chatroom_ids:
+        return {}
+    versions = get_versions(
+        [user_version_key(user_id)] + [chatroom_version_key(chatroom_id) for chatroom_id in chatroom_ids]
+    )
+    digest = sha1(':'.join(map(str, chatroom_ids + versions)).encode()).hexdigest()
+    key = f'unread-counts:{user_id}:{digest}'
+    cache = get_cache()
+    counts = cache.get(key)
+    if counts is None:
+        unread = count_unread(user_id, chatroom_ids)
+        counts = {chatroom_id: unread.get(chatroom_id, 0) for chatroom_id in chatroom_ids}
+        cache.set(key, counts, settings.UNREAD_COUNTS_TIMEOUT)
+    return counts
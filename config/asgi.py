@@ -2,6 +2,9 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests are handled by Django with the URLconf of config.asgi_urls,
+which serves the async views, WebSocket connections by the chatroom message
+consumer in api.websocket.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -9,8 +12,30 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+
+class AsyncViewsRequest(ASGIRequest):
+    # resolved by the handler instead of settings.ROOT_URLCONF
+    urlconf = 'config.asgi_urls'
+
+
+class AsyncViewsHandler(ASGIHandler):
+    request_class = AsyncViewsRequest
+
+
+# what get_asgi_application() does, with the handler above
+django.setup(set_prefix=False)
+django_application = AsyncViewsHandler()
+
+# imported once the apps are loaded by django.setup()
+from api.websocket import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,19 @@
+"""
+    URLconf of the ASGI application (config.asgi): config.urls with the
+    chatroom messages served by their async view. The routes and names are
+    the same, so reverse() gives the same URLs under both servers.
+"""
+from django.urls import include, path
+
+from api import urls as api_urls
+from api import views
+from config import urls
+
+
+urlpatterns = [
+    path('api/', include(([
+        path('chatrooms/<int:pk>/messages', views.AsyncChatroomMessageListView.as_view(), name='chatroom-messages'),
+        *api_urls.urlpatterns,
+    ], api_urls.app_name))),
+    *urls.urlpatterns,
+]
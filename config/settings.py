@@ -26,6 +26,7 @@ INSTALLED_APPS = [
     # third party
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'django_filters',
 
     # my apps
@@ -64,6 +65,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+ASGI_APPLICATION = 'config.asgi.application'
+
 DATABASES = {
     'default': {
 	    'ENGINE': 'django.db.backends.postgresql',
@@ -75,6 +78,37 @@ DATABASES = {
     },
 }
 
+# The default cache holds authorization data (chatroom memberships) that is
+# invalidated by the process making the change. A local-memory cache is only
+# correct with a single process: set CACHE_URL to a shared cache (e.g.
+# redis://127.0.0.1:6379/1) when running several workers or servers, which
+# `manage.py check --deploy` warns about.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+if CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    # all the caches below share the default one, Django's 300 entries would
+    # evict the memberships of the active users on every request
+    CACHES['default'].setdefault('OPTIONS', {}).setdefault(
+        'MAX_ENTRIES', env.int('CACHE_MAX_ENTRIES', default=100_000),
+    )
+
+# accounts.hashers.PBKDF2PasswordHasher reads the PBKDF2 iterations from
+# PASSWORD_HASH_ITERATIONS (Django's default when unset) and hashes on a pool
+# of PASSWORD_HASHING_WORKERS threads (one per CPU when unset). Up to
+# PASSWORD_HASHING_BACKLOG more hashes wait for a thread, the next logins get
+# a 503. Hashes made with another iteration count are updated on login.
+PASSWORD_HASHERS = [
+    'accounts.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = env.int('PASSWORD_HASH_ITERATIONS', default=None)
+PASSWORD_HASHING_WORKERS = env.int('PASSWORD_HASHING_WORKERS', default=None)
+PASSWORD_HASHING_BACKLOG = env.int('PASSWORD_HASHING_BACKLOG', default=32)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -106,7 +140,7 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.StatelessJWTAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -117,11 +151,14 @@ REST_FRAMEWORK = {
     # 'PAGE_SIZE': 5
 }
 
+# Refresh tokens are rotated: every refresh returns a new refresh token valid
+# for REFRESH_TOKEN_LIFETIME and blacklists the previous one, so active
+# clients never have to log in (and hash a password) again.
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
-    "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
-    "ROTATE_REFRESH_TOKENS": False,
-    "BLACKLIST_AFTER_ROTATION": False,
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=env.int('REFRESH_TOKEN_LIFETIME_DAYS', default=14)),
+    "ROTATE_REFRESH_TOKENS": True,
+    "BLACKLIST_AFTER_ROTATION": True,
     "UPDATE_LAST_LOGIN": False,
 
     "ALGORITHM": "HS256",
@@ -149,10 +186,92 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "accounts.tokens.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "accounts.tokens.TokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
+
+# Cache of the role of the users checked against the claims of the access
+# tokens (accounts.tokens), and how long an entry lives. Entries are dropped
+# when a user is saved, in this cache only: the timeout bounds the delay
+# before a password or permission change revokes the tokens in the processes
+# that don't share it, and for the changes made without CustomUser.save (e.g.
+# QuerySet.update). It must be a shared cache in production.
+AUTH_ROLE_CACHE = 'default'
+AUTH_ROLE_CACHE_TIMEOUT = 15
+
+# Cache of the resource versions behind the ETags of the user, chatroom,
+# admins and participants endpoints, and of their responses (api.etags).
+# Writes change the versions in this cache only, so it must be shared by all
+# the processes: with a per-process cache the others keep answering 304 until
+# the version expires after RESPONSE_VERSION_TIMEOUT.
+RESPONSE_CACHE = 'default'
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+RESPONSE_VERSION_TIMEOUT = 60 * 10
+
+# Fan-out layer used to push new chatroom messages to connected clients.
+# The in-memory broker only reaches clients served by the same process, so
+# production needs a broker shared by all the processes (e.g. Redis pub/sub);
+# `manage.py check --deploy` warns about it.
+CHATROOM_BROKER_BACKEND = 'api.broadcast.InMemoryBroker'
+
+# Maximum number of seconds a long-polling request waits for new messages
+CHATROOM_LONG_POLL_TIMEOUT = 25
+
+# Cache used for the chatroom participant/admin lookups and how long an entry
+# lives. Entries are dropped when the memberships change, in this cache only:
+# with a per-process cache the other processes keep the removed participants
+# and admins until the timeout, so it must be a shared cache in production.
+CHATROOM_MEMBERSHIP_CACHE = 'default'
+CHATROOM_MEMBERSHIP_TIMEOUT = 60
+
+# Maximum number of user ids of a bulk participant/admin change
+CHATROOM_MEMBERSHIP_BULK_MAX_SIZE = 10000
+
+# Text search configuration of the PostgreSQL full-text index on message
+# bodies. Migration 0009 builds the index with 'english', changing it requires
+# a migration rebuilding the index.
+MESSAGE_SEARCH_CONFIG = 'english'
+
+# Cache of the mutual friends and friend suggestions, and how long an entry
+# lives. Entries are dropped when the friends of either user change, in this
+# cache only: with a per-process cache the other processes serve stale
+# friends until the timeout, so it must be a shared cache in production.
+FRIENDS_CACHE = 'default'
+FRIENDS_CACHE_TIMEOUT = 60 * 10
+
+# Maximum number of user ids of a bulk friend change
+FRIENDS_BULK_MAX_SIZE = 1000
+
+# Maximum number of friend suggestions returned
+FRIEND_SUGGESTIONS_MAX_RESULTS = 50
+
+# Cache of the unread message counts of the users, and how long an entry
+# lives. Entries are dropped when a read cursor moves or a message of one of
+# the chatrooms of the user is written, in this cache only: with a
+# per-process cache the other processes serve stale counts until the
+# timeout, so it must be a shared cache in production.
+UNREAD_COUNTS_CACHE = 'default'
+UNREAD_COUNTS_TIMEOUT = 60 * 10
+
+# Hard cap on the number of users returned by a ?q= directory search
+USER_SEARCH_MAX_RESULTS = 50
+
+# Maximum number of messages accepted by one bulk ingestion request, and the
+# number of rows per INSERT statement
+MESSAGE_BULK_MAX_SIZE = 5000
+MESSAGE_BULK_BATCH_SIZE = 1000
+
+# When set (e.g. timedelta(days=31)), chatroom timelines look for a page of
+# messages within this window first. Combined with the monthly partitions of
+# the message_partitions command, most requests only touch recent partitions.
+MESSAGE_HOT_WINDOW = None
+
+# Messages older than MESSAGE_RETENTION (e.g. timedelta(days=365)) are moved by
+# the archive_messages command into compressed segments under
+# MESSAGE_ARCHIVE_ROOT, from which chatroom timelines keep reading them.
+MESSAGE_RETENTION = None
+MESSAGE_ARCHIVE_ROOT = BASE_DIR / 'archive' / 'messages'